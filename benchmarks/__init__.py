@@ -0,0 +1 @@
+"""Benchmarks with synthetic data and stored baselines."""
@@ -0,0 +1,123 @@
+"""Сравнение результатов бенчмарков с сохранённой базовой линией.
+
+Базовая линия — JSON ``{"meta": {...}, "results": {случай: {метрика: число}}}``.
+Метрики ``time_*`` сравниваются с допуском ``--time-tolerance``, ``peak_*`` —
+с ``--memory-tolerance``. Время случаев быстрее ``MIN_GATED_TIME`` мс и
+хвостовые перцентили только выводятся: на них шум планировщика ОС и
+единичные выбросы больше допуска. Время
+зависит от машины: базовую линию стоит обновлять на той же машине, где
+идёт сравнение.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+Results = Dict[str, Dict[str, float]]
+
+# Абсолютный запас, чтобы шум на быстрых случаях не считался регрессией
+_SLACK = {"time": 1.0, "peak": 4.0}
+# Время (мс) в базовой линии, начиная с которого оно проверяется
+MIN_GATED_TIME = 5.0
+# p95 по нескольким десяткам прогонов определяют один-два выброса
+_TAIL_METRICS = {"time_p95_ms"}
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="записать результаты как новую базовую линию",
+    )
+    parser.add_argument("--time-tolerance", type=float, default=0.5)
+    parser.add_argument("--memory-tolerance", type=float, default=0.25)
+
+
+def _meta(extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        **(extra or {}),
+    }
+
+
+def _tolerance(metric: str, args: argparse.Namespace) -> float:
+    return args.time_tolerance if metric.startswith("time") else args.memory_tolerance
+
+
+def report(
+    results: Results,
+    path: Path,
+    args: argparse.Namespace,
+    *,
+    meta: Optional[Dict[str, str]] = None,
+) -> int:
+    """Печатает таблицу сравнения; возвращает 1 при регрессии, иначе 0.
+
+    ``meta`` дополняет описание окружения (версия сервера, масштаб данных):
+    оно записывается в базовую линию и сверяется при сравнении.
+    """
+    meta = _meta(meta)
+    if args.update_baseline:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps(
+                {
+                    "meta": meta,
+                    "results": {
+                        case: {m: round(v, 3) for m, v in metrics.items()}
+                        for case, metrics in results.items()
+                    },
+                },
+                indent=2,
+                sort_keys=True,
+            )
+            + "\n",
+            encoding="utf-8",
+        )
+        for case, metrics in results.items():
+            print(case, "  ".join(f"{m}={v:.3f}" for m, v in metrics.items()))
+        print(f"Базовая линия записана: {path}")
+        return 0
+
+    stored = json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+    if stored is None:
+        print(f"Базовой линии нет ({path}), запустите с --update-baseline")
+    elif stored.get("meta") != meta:
+        print(
+            f"Внимание: базовая линия снята на {stored.get('meta')}, "
+            f"сейчас {meta}; сравнение времени может быть неточным"
+        )
+    base = stored["results"] if stored else {}
+
+    regressions = 0
+    for case, metrics in results.items():
+        cells = []
+        for metric, value in metrics.items():
+            expected = base.get(case, {}).get(metric)
+            if expected is None:
+                cells.append(f"{metric}={value:.3f}")
+                continue
+            limit = expected * (1 + _tolerance(metric, args))
+            limit += _SLACK[metric.split("_")[0]]
+            gated = not metric.startswith("time") or (
+                expected >= MIN_GATED_TIME and metric not in _TAIL_METRICS
+            )
+            mark = "" if gated else " ~"
+            if gated and value > limit:
+                mark = " REGRESSION"
+                regressions += 1
+            change = (value / expected - 1) * 100 if expected else 0.0
+            cells.append(f"{metric}={value:.3f} ({change:+.0f}%){mark}")
+        print(f"{case:<40} " + "  ".join(cells))
+
+    print(f"~ — время меньше {MIN_GATED_TIME} мс или p95, не проверяется")
+    if regressions:
+        print(f"Регрессий: {regressions}", file=sys.stderr)
+        return 1
+    return 0
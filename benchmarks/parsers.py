@@ -0,0 +1,164 @@
+"""Бенчмарк парсеров ``bot/parsers.py`` на синтетических сохранениях.
+
+Для каждого масштаба из ``benchmarks.savegame.SCALES`` замеряются время
+(медиана ``--repeat`` прогонов) и пиковая память (``tracemalloc``,
+отдельным прогоном) для ``parse_all``, каждого парсера и потоковых
+экстракторов. Кэш разобранных документов на время замеров отключается,
+иначе повторные прогоны мерили бы попадания в кэш.
+
+Результаты сравниваются с ``benchmarks/baselines/parsers.json``; при
+превышении допуска команда завершается с кодом 1::
+
+    python -m benchmarks.parsers                    # сравнить с базовой линией
+    python -m benchmarks.parsers --update-baseline  # перезаписать её
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from benchmarks import baseline
+from benchmarks.savegame import FARM_ID, SCALES, Savegame, generate
+from bot import parsers
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "parsers.json"
+STREAM_CHUNK = 64 * 1024
+
+
+@contextmanager
+def _cold_document_cache() -> Iterator[None]:
+    cache = parsers.document_cache
+    parsers.document_cache = parsers.DocumentCache(max_bytes=0, max_entries=0)
+    try:
+        yield
+    finally:
+        parsers.document_cache = cache
+
+
+def _stream(extractor_cls: type, text: str) -> Callable[[], Any]:
+    data = text.encode("utf-8")
+
+    def run() -> Any:
+        extractor = extractor_cls()
+        for i in range(0, len(data), STREAM_CHUNK):
+            extractor.feed(data[i : i + STREAM_CHUNK])
+        return extractor.close()
+
+    return run
+
+
+def _cases(sg: Savegame) -> Dict[str, Tuple[Callable[[], Any], Any]]:
+    """Замеряемые вызовы и ожидаемый результат каждого."""
+    exp = sg.expected
+    fields = (exp["fields_owned"], exp["fields_total"])
+    return {
+        "parse_all": (
+            lambda: parsers.parse_all(
+                server_stats=sg.server_stats,
+                vehicles_api=sg.vehicles,
+                career_savegame_ftp=sg.career_savegame,
+                farmland_ftp=sg.farmland,
+                farms_xml=sg.farms,
+                dedicated_server_stats=sg.server_stats,
+                farm_id=FARM_ID,
+            ),
+            exp,
+        ),
+        "parse_server_stats": (
+            lambda: parsers.parse_server_stats(sg.server_stats)[:4],
+            (exp["server_name"], exp["map_name"], exp["slots_used"], exp["slots_max"]),
+        ),
+        "parse_players_online": (
+            lambda: parsers.parse_players_online(sg.server_stats),
+            exp["players_online"],
+        ),
+        "parse_farm_money": (
+            lambda: parsers.parse_farm_money(sg.career_savegame),
+            exp["farm_money"],
+        ),
+        "count_vehicles": (
+            lambda: parsers._count_vehicles(sg.vehicles, FARM_ID),
+            exp["vehicles_owned"],
+        ),
+        "parse_farmland": (
+            lambda: parsers.parse_farmland(sg.farmland, FARM_ID),
+            fields,
+        ),
+        "parse_last_month_profit": (
+            lambda: parsers.parse_last_month_profit(sg.farms),
+            exp["last_month_profit"],
+        ),
+        "stream_farm_money": (
+            _stream(parsers.FarmMoneyExtractor, sg.career_savegame),
+            exp["farm_money"],
+        ),
+        "stream_vehicles": (
+            _stream(parsers.VehicleCountExtractor, sg.vehicles),
+            exp["vehicles_owned"],
+        ),
+        "stream_farmland": (
+            _stream(parsers.FarmlandExtractor, sg.farmland),
+            fields,
+        ),
+        "stream_last_month_profit": (
+            _stream(parsers.LastMonthProfitExtractor, sg.farms),
+            exp["last_month_profit"],
+        ),
+    }
+
+
+def _measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"time_ms": statistics.median(timings) * 1000, "peak_kib": peak / 1024}
+
+
+def run(scales: List[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    """Возвращает ``{"<масштаб>/<случай>": {"time_ms": ..., "peak_kib": ...}}``."""
+    results = {}
+    with _cold_document_cache():
+        for scale in scales:
+            sg = generate(SCALES[scale])
+            for case, (func, expected) in _cases(sg).items():
+                got = func()
+                if got != expected:
+                    raise AssertionError(
+                        f"{scale}/{case}: expected {expected!r}, got {got!r}"
+                    )
+                results[f"{scale}/{case}"] = _measure(func, repeat)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    baseline.add_arguments(parser)
+    parser.add_argument(
+        "--scale", action="append", choices=sorted(SCALES), help="по умолчанию все"
+    )
+    parser.add_argument("--repeat", type=int, default=15)
+    args = parser.parse_args()
+    results = run(args.scale or list(SCALES), args.repeat)
+    raise SystemExit(baseline.report(results, BASELINE_PATH, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,480 @@
+"""Бенчмарк горячих SQL-запросов на истории реального масштаба.
+
+Нужен отдельный PostgreSQL (``--dsn`` или ``BENCH_POSTGRES_URL``). Всё
+создаётся в схеме ``--schema`` (по умолчанию ``bench``) теми же миграциями,
+что и у бота; затем туда через COPY загружается синтетическая история:
+``--players`` игроков за ``--days`` дней со срезами каждые 15 минут, сводка
+по часам и сессии. Каждый запрос выполняется через реестр
+``utils.statements``, как в боте; печатаются p50/p95 задержки, а план
+(``EXPLAIN ANALYZE``) проверяется на отсечение партиций. Отдельно
+проверяется, что покрывающий индекс сводки и BRIN-индекс истории
+пригодны для своих запросов: на суточных партициях такого объёма
+планировщик обычно выбирает seq scan, поэтому план строится с
+``enable_seqscan = off``. Результаты
+сравниваются с ``benchmarks/baselines/queries.json``; регрессия или
+непрошедшая проверка плана дают код выхода 1::
+
+    python -m benchmarks.queries --dsn postgresql://localhost/fs25_bench
+    python -m benchmarks.queries --plans --update-baseline
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import asyncpg
+
+from benchmarks import baseline
+from config.config import (
+    ONLINE_HOURLY_TABLE,
+    ONLINE_MIN_SAMPLES_PER_HOUR,
+    ONLINE_MONTH_DAYS,
+    PARTITION_DAYS_AHEAD,
+    PLAYER_SESSIONS_TABLE,
+    TOTAL_TOP_LIMIT,
+    WEEKLY_TOP_LIMIT,
+    WEEKLY_TOP_MAX,
+    cleanup_history_days,
+)
+from storage.postgres import (
+    DAILY_ONLINE_COUNTS,
+    MONTH_ONLINE_COUNTS,
+    TOP_LAST_WEEK,
+    TOP_TOTAL,
+    PostgresStorage,
+)
+from utils import statements
+from utils.helpers import get_moscow_datetime
+from utils.migrations import run_migrations
+from utils.online_rollup import TOP_HOURS, write_online_rows
+from utils.partitions import (
+    HISTORY_TABLE,
+    HOURLY_TABLE,
+    create_partitions_for_days,
+    ensure_online_partitions,
+)
+from utils.players import player_registry
+from utils.sessions import (
+    SESSIONS_DAILY_COUNTS,
+    SESSIONS_HOURLY_COUNTS,
+    SESSIONS_SECONDS,
+    SESSIONS_TOP,
+)
+from utils.total_time_updater import (
+    TOTAL_HOURS_SINCE,
+    TOTAL_HOURS_WINDOW,
+    refresh_total_time,
+)
+from utils.weekly_top import _get_week_bounds
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "queries.json"
+# Параметры завершённой загрузки; без неё данные считаются неполными
+LOAD_MARKER_TABLE = "bench_load"
+SAMPLE_MINUTES = 15
+_HOURLY_PARTITION = re.compile(rf"{ONLINE_HOURLY_TABLE}_p\d{{8}}")
+
+
+@dataclass
+class Case:
+    """Замеряемый запрос или операция.
+
+    ``statement`` — имя из реестра для ``EXPLAIN``; ``max_partitions`` —
+    сколько партиций сводки допустимо прочитать плану.
+    """
+
+    name: str
+    run: Callable[[], Awaitable[Any]]
+    statement: Optional[str] = None
+    args: Tuple[Any, ...] = ()
+    max_partitions: Optional[int] = None
+
+
+@dataclass
+class IndexCheck:
+    """Запрос, который должен уметь обслуживаться индексом.
+
+    ``node`` — регулярное выражение для узла плана, например
+    ``Index Only Scan using <индекс партиции>``.
+    """
+
+    name: str
+    sql: str
+    args: Tuple[Any, ...]
+    node: str
+
+
+def _sessions(
+    player_ids: List[int], days: int, end: datetime, seed: int
+) -> List[Tuple[int, datetime, datetime]]:
+    """Игровые сессии: у каждого игрока своя вероятность зайти в день."""
+    rng = random.Random(seed)
+    first_day = (end - timedelta(days=days)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    sessions = []
+    for player_id in player_ids:
+        activity = rng.uniform(0.15, 0.9)
+        last_end = first_day
+        for day in range(days + 1):
+            if rng.random() > activity:
+                continue
+            started = first_day + timedelta(
+                days=day, minutes=rng.randrange(0, 24 * 60, SAMPLE_MINUTES)
+            )
+            ended = min(
+                started + timedelta(minutes=SAMPLE_MINUTES * rng.randint(2, 24)), end
+            )
+            # Сессии одного игрока не пересекаются, иначе срезы бы повторились
+            if last_end <= started < ended:
+                sessions.append((player_id, started, ended))
+                last_end = ended
+    return sessions
+
+
+def _samples(
+    sessions: List[Tuple[int, datetime, datetime]]
+) -> List[Tuple[int, datetime, Any, int, int]]:
+    """Срезы каждые 15 минут внутри сессий в формате строк истории."""
+    rows = []
+    step = timedelta(minutes=SAMPLE_MINUTES)
+    for player_id, started, ended in sessions:
+        check_time = started
+        while check_time < ended:
+            rows.append(
+                (
+                    player_id,
+                    check_time,
+                    check_time.date(),
+                    check_time.hour,
+                    check_time.isoweekday() % 7,
+                )
+            )
+            check_time += step
+    return rows
+
+
+async def _create_pool(dsn: str, schema: str) -> asyncpg.Pool:
+    return await asyncpg.create_pool(
+        dsn=dsn,
+        min_size=1,
+        max_size=2,
+        init=statements.init_connection,
+        server_settings={"search_path": schema},
+    )
+
+
+async def load(pool: asyncpg.Pool, args: argparse.Namespace, now: datetime) -> None:
+    """Создаёт схему миграциями и загружает синтетическую историю."""
+    await run_migrations(pool)
+    await pool.expire_connections()
+    await ensure_online_partitions(pool)
+
+    names = [f"bench_player_{i:04d}" for i in range(args.players)]
+    player_ids = await player_registry.ids_for(pool, names)
+    sessions = _sessions(player_ids, args.days, now, args.seed)
+    samples = _samples(sessions)
+    days = sorted({row[2] for row in samples})
+
+    started = time.perf_counter()
+    async with pool.acquire() as conn:
+        await create_partitions_for_days(conn, HISTORY_TABLE, days)
+        await create_partitions_for_days(conn, HOURLY_TABLE, days)
+        await conn.copy_records_to_table(
+            HISTORY_TABLE.name,
+            records=samples,
+            columns=["player_id", "check_time", "date", "hour", "dow"],
+        )
+        await conn.execute(
+            f"""
+            INSERT INTO {ONLINE_HOURLY_TABLE} (bucket, player_id, samples)
+            SELECT date_trunc('hour', check_time), player_id, COUNT(*)
+            FROM {HISTORY_TABLE.name}
+            GROUP BY date_trunc('hour', check_time), player_id
+            """
+        )
+        await conn.copy_records_to_table(
+            PLAYER_SESSIONS_TABLE,
+            records=sessions,
+            columns=["player_id", "started_at", "ended_at"],
+        )
+        # Как после autovacuum: карта видимости нужна для index-only scan
+        await conn.execute("VACUUM ANALYZE")
+        # Отметка пишется последней: прерванная загрузка её не оставляет
+        await conn.execute(
+            f"""
+            CREATE TABLE {LOAD_MARKER_TABLE} (
+                loaded_on DATE NOT NULL,
+                players INTEGER NOT NULL,
+                days INTEGER NOT NULL,
+                seed INTEGER NOT NULL
+            )
+            """
+        )
+        await conn.execute(
+            f"INSERT INTO {LOAD_MARKER_TABLE} VALUES ($1, $2, $3, $4)",
+            now.date(),
+            args.players,
+            args.days,
+            args.seed,
+        )
+    print(
+        f"Загружено: игроков {len(names)}, сессий {len(sessions)}, "
+        f"срезов {len(samples)} за {time.perf_counter() - started:.1f} с"
+    )
+
+
+async def _is_loaded(
+    pool: asyncpg.Pool, args: argparse.Namespace, now: datetime
+) -> bool:
+    """Данные загружены полностью, сегодня и с теми же параметрами.
+
+    История строится относительно момента загрузки, а окна запросов — от
+    текущего времени, поэтому данные прошлых дней не переиспользуются:
+    границы недели и месяца уже захватывают другой объём.
+    """
+    if await pool.fetchval("SELECT to_regclass($1)", LOAD_MARKER_TABLE) is None:
+        return False
+    row = await pool.fetchrow(
+        f"SELECT loaded_on, players, days, seed FROM {LOAD_MARKER_TABLE}"
+    )
+    return row is not None and tuple(row) == (
+        now.date(),
+        args.players,
+        args.days,
+        args.seed,
+    )
+
+
+def _cases(pool: asyncpg.Pool, now: datetime) -> List[Case]:
+    week_start, week_end = _get_week_bounds()
+    month_start = now - timedelta(days=cleanup_history_days)
+    day_start = now - timedelta(hours=24)
+    # Открытые справа диапазоны читают и заранее созданные будущие партиции
+    ahead = PARTITION_DAYS_AHEAD + 1
+    snapshot = [(f"bench_player_{i:04d}", now) for i in range(30)]
+
+    def statement_case(
+        name: str, statement: str, *args: Any, max_partitions: Optional[int] = None
+    ) -> Case:
+        return Case(
+            name,
+            lambda: statements.fetch(pool, statement, *args),
+            statement,
+            args,
+            max_partitions,
+        )
+
+    async def write_snapshot() -> None:
+        # Остальные случаи читают те же таблицы: срез откатывается, чтобы
+        # данные не менялись ни между случаями, ни между запусками
+        async with pool.acquire() as conn:
+            transaction = conn.transaction()
+            await transaction.start()
+            try:
+                await write_online_rows(conn, snapshot)
+            finally:
+                await transaction.rollback()
+
+    return [
+        statement_case(
+            "top7week",
+            TOP_HOURS,
+            week_start,
+            week_end,
+            WEEKLY_TOP_MAX,
+            ONLINE_MIN_SAMPLES_PER_HOUR,
+            max_partitions=8,
+        ),
+        statement_case("top7lastweek", TOP_LAST_WEEK, WEEKLY_TOP_LIMIT),
+        statement_case("top_total", TOP_TOTAL, TOTAL_TOP_LIMIT),
+        statement_case(
+            "online_month",
+            MONTH_ONLINE_COUNTS,
+            ONLINE_MONTH_DAYS,
+            max_partitions=ONLINE_MONTH_DAYS + 1 + ahead,
+        ),
+        statement_case(
+            "daily_graph", DAILY_ONLINE_COUNTS, day_start, max_partitions=2 + ahead
+        ),
+        statement_case(
+            "total_hours_window",
+            TOTAL_HOURS_WINDOW,
+            ONLINE_MIN_SAMPLES_PER_HOUR,
+            cleanup_history_days,
+            max_partitions=cleanup_history_days + 1 + ahead,
+        ),
+        statement_case(
+            "total_hours_since",
+            TOTAL_HOURS_SINCE,
+            None,
+            now.replace(minute=0, second=0, microsecond=0),
+            ONLINE_MIN_SAMPLES_PER_HOUR,
+        ),
+        Case("update_total_time", lambda: refresh_total_time(pool, "window")),
+        Case("write_snapshot", write_snapshot),
+        statement_case(
+            "sessions_top", SESSIONS_TOP, week_start, week_end, now, WEEKLY_TOP_MAX
+        ),
+        statement_case(
+            "sessions_hourly_counts", SESSIONS_HOURLY_COUNTS, day_start, now
+        ),
+        statement_case(
+            "sessions_daily_counts", SESSIONS_DAILY_COUNTS, ONLINE_MONTH_DAYS, now
+        ),
+        statement_case("sessions_seconds", SESSIONS_SECONDS, month_start, now, now),
+    ]
+
+
+def _index_checks(now: datetime) -> List[IndexCheck]:
+    week_start, week_end = _get_week_bounds()
+    return [
+        IndexCheck(
+            "top7week_covering",
+            statements.STATEMENTS[TOP_HOURS],
+            (week_start, week_end, WEEKLY_TOP_MAX, ONLINE_MIN_SAMPLES_PER_HOUR),
+            rf"Index Only Scan using {ONLINE_HOURLY_TABLE}_p\d{{8}}_bucket_\w+_idx",
+        ),
+        IndexCheck(
+            "history_check_time_brin",
+            f"SELECT COUNT(*) FROM {HISTORY_TABLE.name} "
+            "WHERE check_time >= $1 AND check_time < $2",
+            (now - timedelta(hours=6), now),
+            rf"Bitmap Index Scan on {HISTORY_TABLE.name}_p\d{{8}}_check_time_idx",
+        ),
+    ]
+
+
+async def _index_plan(pool: asyncpg.Pool, check: IndexCheck) -> List[str]:
+    async with pool.acquire() as conn:
+        transaction = conn.transaction()
+        await transaction.start()
+        try:
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            rows = await conn.fetch(
+                f"EXPLAIN (ANALYZE, BUFFERS) {check.sql}", *check.args
+            )
+        finally:
+            await transaction.rollback()
+    return [r[0] for r in rows]
+
+
+async def _plan(pool: asyncpg.Pool, case: Case) -> List[str]:
+    sql = statements.STATEMENTS[case.statement]
+    rows = await pool.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", *case.args)
+    return [r[0] for r in rows]
+
+
+def _percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(p * (len(ordered) - 1)))]
+
+
+async def run(
+    args: argparse.Namespace,
+) -> Tuple[Dict[str, Dict[str, float]], int, Dict[str, str]]:
+    """Возвращает результаты замеров, число непрошедших проверок плана и
+    описание окружения для базовой линии.
+    """
+    now = get_moscow_datetime()
+    pool = await _create_pool(args.dsn, args.schema)
+    try:
+        meta = {
+            "postgres": await pool.fetchval("SHOW server_version"),
+            "scale": f"{args.players} players x {args.days} days",
+        }
+        if args.reload or not await _is_loaded(pool, args, now):
+            await pool.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+            await pool.execute(f"CREATE SCHEMA {args.schema}")
+            await pool.expire_connections()
+            await load(pool, args, now)
+        storage = PostgresStorage()
+        storage.pool = pool
+        # Таблицы, которые бот заполняет фоновыми задачами
+        await refresh_total_time(pool, "window")
+        week_start, week_end = _get_week_bounds()
+        await storage.replace_weekly_top(
+            await storage.top_hours(
+                week_start - timedelta(days=7), week_start, WEEKLY_TOP_LIMIT
+            )
+        )
+
+        results: Dict[str, Dict[str, float]] = {}
+        plan_failures = 0
+        for case in _cases(pool, now):
+            for _ in range(args.warmup):
+                await case.run()
+            timings = []
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                await case.run()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[case.name] = {
+                "time_p50_ms": _percentile(timings, 0.5),
+                "time_p95_ms": _percentile(timings, 0.95),
+            }
+
+            if case.statement is None:
+                continue
+            plan = await _plan(pool, case)
+            partitions = len(set(_HOURLY_PARTITION.findall("\n".join(plan))))
+            if case.max_partitions is not None and partitions > case.max_partitions:
+                plan_failures += 1
+                print(
+                    f"{case.name}: план читает {partitions} партиций сводки "
+                    f"(допустимо {case.max_partitions})",
+                    file=sys.stderr,
+                )
+            if args.plans:
+                print(f"--- {case.name}")
+                print("\n".join(plan))
+
+        for check in _index_checks(now):
+            plan = await _index_plan(pool, check)
+            if not re.search(check.node, "\n".join(plan)):
+                plan_failures += 1
+                print(f"{check.name}: в плане нет узла {check.node!r}", file=sys.stderr)
+            if args.plans:
+                print(f"--- {check.name} (enable_seqscan = off)")
+                print("\n".join(plan))
+        return results, plan_failures, meta
+    finally:
+        await pool.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    baseline.add_arguments(parser)
+    parser.add_argument("--dsn", default=os.getenv("BENCH_POSTGRES_URL", ""))
+    parser.add_argument("--schema", default="bench")
+    parser.add_argument("--players", type=int, default=500)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=25)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument(
+        "--reload", action="store_true", help="пересоздать схему и данные"
+    )
+    parser.add_argument("--plans", action="store_true", help="печатать планы")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("нужен --dsn или BENCH_POSTGRES_URL")
+    if not re.fullmatch(r"[a-z_][a-z0-9_]*", args.schema):
+        parser.error("--schema должна быть простым именем")
+
+    results, plan_failures, meta = asyncio.run(run(args))
+    status = baseline.report(results, BASELINE_PATH, args, meta=meta)
+    raise SystemExit(1 if plan_failures else status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""Генератор синтетических файлов сохранения FS25 заданного масштаба.
+
+Файлы повторяют структуру настоящих: ``dedicated-server-stats.xml``,
+``vehicles.xml``, ``careerSavegame.xml``, ``farmland.xml`` и ``farms.xml``.
+Содержимое детерминировано (``seed``), а значения, которые должны извлечь
+парсеры, возвращаются в ``Savegame.expected``.
+
+Запись файлов на диск::
+
+    python -m benchmarks.savegame --scale large --out savegame_large
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List
+from xml.sax.saxutils import escape
+
+FARM_ID = "1"
+
+_BRANDS = ["fendt", "johnDeere", "claas", "newHolland", "caseIH", "kubota", "deutz"]
+_VEHICLE_KINDS = ["tractorsL", "tractorsM", "harvesters", "trailers", "cultivators"]
+# Объекты, которые парсер не считает техникой (см. _VEHICLE_EXCLUDE_KEYWORDS)
+_OBJECT_FILES = [
+    "data/objects/pallets/palletBig/palletBig.xml",
+    "data/objects/trees/treeSaplingPallet.xml",
+    "data/objects/woodPile/woodPile.xml",
+    "data/vehicles/trailers/trailerWood/trailerWood.xml",
+]
+_FINANCE_ITEMS = [
+    "newVehiclesCost",
+    "soldVehicles",
+    "newAnimalsCost",
+    "constructionCost",
+    "harvestIncome",
+    "soldProducts",
+    "purchaseFuel",
+    "purchaseSeeds",
+    "purchaseFertilizer",
+    "vehicleRunningCost",
+    "propertyMaintenance",
+    "wagePayment",
+    "loanInterest",
+    "other",
+]
+
+
+@dataclass(frozen=True)
+class Scale:
+    """Размер сохранения."""
+
+    slots: int
+    players: int
+    vehicles: int
+    fields: int
+    farms: int
+    mods: int
+    finance_days: int
+
+
+SCALES: Dict[str, Scale] = {
+    "small": Scale(
+        slots=8, players=3, vehicles=100, fields=60, farms=2, mods=20, finance_days=8
+    ),
+    "medium": Scale(
+        slots=16,
+        players=10,
+        vehicles=1000,
+        fields=250,
+        farms=6,
+        mods=120,
+        finance_days=24,
+    ),
+    "large": Scale(
+        slots=32,
+        players=28,
+        vehicles=5000,
+        fields=600,
+        farms=16,
+        mods=300,
+        finance_days=48,
+    ),
+}
+
+
+@dataclass
+class Savegame:
+    """Содержимое файлов и ожидаемый результат разбора."""
+
+    server_stats: str
+    vehicles: str
+    career_savegame: str
+    farmland: str
+    farms: str
+    expected: Dict[str, Any] = field(default_factory=dict)
+
+    FILENAMES = {
+        "server_stats": "dedicated-server-stats.xml",
+        "vehicles": "vehicles.xml",
+        "career_savegame": "careerSavegame.xml",
+        "farmland": "farmland.xml",
+        "farms": "farms.xml",
+    }
+
+    def write(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        for attr, filename in self.FILENAMES.items():
+            (directory / filename).write_text(getattr(self, attr), encoding="utf-8")
+
+
+_HEADER = '<?xml version="1.0" encoding="utf-8" standalone="no"?>\n'
+
+
+def _coords(rng: random.Random) -> str:
+    return (
+        f'x="{rng.uniform(-1024, 1024):.2f}" y="{rng.uniform(80, 120):.2f}" '
+        f'z="{rng.uniform(-1024, 1024):.2f}"'
+    )
+
+
+def _server_stats(rng: random.Random, scale: Scale, players: List[str]) -> str:
+    lines = [
+        _HEADER.rstrip(),
+        '<Server game="Farming Simulator 25" version="1.5.0.1" '
+        'name="Benchmark Farm Server" mapName="Riverbend Springs" '
+        'dayTime="43200000" mapOverviewFilename="data/maps/mapUS/overview.dds" '
+        'mapSize="2048">',
+        f'  <Slots capacity="{scale.slots}" numUsed="{len(players)}">',
+    ]
+    for name in players:
+        lines.append(
+            f'    <Player isUsed="true" isAdmin="false" '
+            f'uptime="{rng.randint(1, 600)}" {_coords(rng)}>{escape(name)}</Player>'
+        )
+    for _ in range(scale.slots - len(players)):
+        lines.append('    <Player isUsed="false">-</Player>')
+    lines.append("  </Slots>")
+    lines.append("  <Vehicles>")
+    for i in range(scale.vehicles // 10):
+        brand = rng.choice(_BRANDS)
+        lines.append(
+            f'    <Vehicle name="{brand} {i}" category="{rng.choice(_VEHICLE_KINDS)}" '
+            f'type="tractor" {_coords(rng)} fillTypes="DIESEL" '
+            f'fillLevels="{rng.randint(0, 600)}"/>'
+        )
+    lines.append("  </Vehicles>")
+    lines.append("  <Mods>")
+    for i in range(scale.mods):
+        lines.append(
+            f'    <Mod name="FS25_benchMod{i}" author="modder{i % 17}" '
+            f'version="1.0.{i % 9}.0" hash="{rng.getrandbits(128):032x}">'
+            f"Bench Mod {i}</Mod>"
+        )
+    lines.append("  </Mods>")
+    lines.append("  <Farmlands>")
+    for i in range(1, scale.fields + 1):
+        lines.append(
+            f'    <Farmland name="{i}" id="{i}" owner="{rng.randint(0, scale.farms)}" '
+            f'area="{rng.uniform(0.5, 30):.3f}" x="{rng.uniform(-1024, 1024):.1f}" '
+            f'z="{rng.uniform(-1024, 1024):.1f}"/>'
+        )
+    lines.append("  </Farmlands>")
+    lines.append("</Server>")
+    return "\n".join(lines) + "\n"
+
+
+def _vehicles(rng: random.Random, scale: Scale) -> tuple:
+    lines = [_HEADER + '<vehicles loadAnyFarmInSingleplayer="true">']
+    owned = 0
+    for i in range(scale.vehicles):
+        is_object = rng.random() < 0.15
+        farm_id = str(rng.randint(1, scale.farms))
+        if is_object:
+            filename = rng.choice(_OBJECT_FILES)
+        else:
+            brand = rng.choice(_BRANDS)
+            kind = rng.choice(_VEHICLE_KINDS)
+            filename = f"data/vehicles/{brand}/{kind}{i % 40}/{kind}{i % 40}.xml"
+            if farm_id == FARM_ID:
+                owned += 1
+        lines.append(
+            f'    <vehicle uniqueId="vehicle{rng.getrandbits(64):016x}" '
+            f'filename="{filename}" age="{rng.uniform(0, 60):.3f}" '
+            f'price="{rng.randint(1000, 900000)}" farmId="{farm_id}" '
+            f'propertyState="OWNED" operatingTime="{rng.uniform(0, 500000):.1f}">'
+        )
+        lines.append(
+            f'        <component index="1" position="{rng.uniform(-1024, 1024):.3f} '
+            f'{rng.uniform(80, 120):.3f} {rng.uniform(-1024, 1024):.3f}" '
+            f'rotation="0 {rng.uniform(-180, 180):.3f} 0"/>'
+        )
+        lines.append(
+            f'        <fillUnit><unit index="1" fillType="DIESEL" '
+            f'fillLevel="{rng.uniform(0, 600):.3f}"/></fillUnit>'
+        )
+        lines.append(
+            f'        <wearable damage="{rng.random():.5f}" wear="{rng.random():.5f}"/>'
+        )
+        lines.append("    </vehicle>")
+    lines.append("</vehicles>")
+    return "\n".join(lines) + "\n", owned
+
+
+def _career_savegame(rng: random.Random, scale: Scale, money: float) -> str:
+    lines = [
+        _HEADER + '<careerSavegame revision="2" valid="true">',
+        "    <settings>",
+        "        <savegameName>Benchmark</savegameName>",
+        "        <mapId>MapUS.MapUS</mapId>",
+        "        <mapTitle>Riverbend Springs</mapTitle>",
+        "        <saveDateFormatted>2025-06-01</saveDateFormatted>",
+        "        <economicDifficulty>NORMAL</economicDifficulty>",
+        "    </settings>",
+        "    <statistics>",
+        f"        <money>{money:.6f}</money>",
+        f"        <playTime>{rng.uniform(100, 100000):.3f}</playTime>",
+        "    </statistics>",
+        "    <mods>",
+    ]
+    for i in range(scale.mods):
+        lines.append(
+            f'        <mod modName="FS25_benchMod{i}" title="Bench Mod {i}" '
+            f'version="1.0.{i % 9}.0" required="true" '
+            f'fileHash="{rng.getrandbits(128):032x}"/>'
+        )
+    lines.append("    </mods>")
+    lines.append("</careerSavegame>")
+    return "\n".join(lines) + "\n"
+
+
+def _farmland(rng: random.Random, scale: Scale) -> tuple:
+    lines = [_HEADER + "<farmlands>"]
+    owned = 0
+    for i in range(1, scale.fields + 1):
+        farm_id = str(rng.randint(0, scale.farms))
+        if farm_id == FARM_ID:
+            owned += 1
+        lines.append(f'    <farmland id="{i}" farmId="{farm_id}"/>')
+    lines.append("</farmlands>")
+    return "\n".join(lines) + "\n", (owned, scale.fields)
+
+
+def _farms(rng: random.Random, scale: Scale, players: List[str]) -> tuple:
+    lines = [_HEADER + "<farms>"]
+    profit = None
+    for farm in range(1, scale.farms + 1):
+        lines.append(
+            f'    <farm farmId="{farm}" name="Farm {farm}" color="{farm}" '
+            f'loan="0.000000" money="{rng.uniform(0, 5e6):.6f}">'
+        )
+        lines.append("        <players>")
+        for name in players[farm - 1 :: scale.farms]:
+            lines.append(
+                f'            <player uniqueUserId="{rng.getrandbits(64):016x}" '
+                f'farmManager="false" lastNickname="{escape(name)}"/>'
+            )
+        lines.append("        </players>")
+        lines.append("        <finances>")
+        for day in range(scale.finance_days):
+            values = [rng.uniform(-50000, 80000) for _ in _FINANCE_ITEMS]
+            if str(farm) == FARM_ID and day == 4:
+                profit = round(sum(float(f"{v:.6f}") for v in values))
+            lines.append(f'            <stats day="{day}">')
+            for item, value in zip(_FINANCE_ITEMS, values):
+                lines.append(f"                <{item}>{value:.6f}</{item}>")
+            lines.append("            </stats>")
+        lines.append("        </finances>")
+        lines.append("    </farm>")
+    lines.append("</farms>")
+    return "\n".join(lines) + "\n", profit
+
+
+def generate(scale: Scale, *, seed: int = 25) -> Savegame:
+    """Строит сохранение масштаба ``scale``."""
+    rng = random.Random(seed)
+    players = [f"Farmer_{i:03d}" for i in range(scale.players)]
+    money = rng.uniform(0, 1e7)
+    vehicles, vehicles_owned = _vehicles(rng, scale)
+    farmland, fields = _farmland(rng, scale)
+    farms, profit = _farms(rng, scale, players)
+    return Savegame(
+        server_stats=_server_stats(rng, scale, players),
+        vehicles=vehicles,
+        career_savegame=_career_savegame(rng, scale, money),
+        farmland=farmland,
+        farms=farms,
+        expected={
+            "server_name": "Benchmark Farm Server",
+            "map_name": "Riverbend Springs",
+            "slots_used": len(players),
+            "slots_max": scale.slots,
+            "farm_money": int(float(f"{money:.6f}")),
+            "fields_owned": fields[0],
+            "fields_total": fields[1],
+            "vehicles_owned": vehicles_owned,
+            "last_month_profit": profit,
+            "players_online": players,
+        },
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="medium")
+    parser.add_argument("--seed", type=int, default=25)
+    parser.add_argument("--out", type=Path, required=True)
+    args = parser.parse_args()
+    savegame = generate(SCALES[args.scale], seed=args.seed)
+    savegame.write(args.out)
+    sizes = ", ".join(
+        f"{name}={len(getattr(savegame, attr)) // 1024} KiB"
+        for attr, name in Savegame.FILENAMES.items()
+    )
+    print(f"{args.out}: {sizes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,33 @@
 """Helpers for fetching files from the API."""
 
-from typing import Optional, Tuple
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
 from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import aiohttp
 
 from config.config import config
-from ftp.fetcher import fetch_file
-from utils.logger import log_debug
+from ftp.fetcher import fetch_file, fetch_file_parsed
+from utils.conditional_cache import CachedBody, ConditionalCache
+from utils.metrics import metrics
+from utils.snapshot_cache import SnapshotCache
+
+from .parsers import (
+    FarmlandExtractor,
+    FarmMoneyExtractor,
+    LastMonthProfitExtractor,
+    StreamExtractor,
+    VehicleCountExtractor,
+    parse_players_online,
+)
+
+logger = logging.getLogger(__name__)
+
+_http_cache = ConditionalCache()
+stats_snapshot: SnapshotCache[str] = SnapshotCache(ttl=config.stats_cache_ttl)
 
 
 def _mask_url_param(url: str, param: str = "code", mask: str = "***") -> str:
@@ -20,19 +40,88 @@ def _mask_url_param(url: str, param: str = "code", mask: str = "***") -> str:
     return urlunsplit(sanitized_parts)
 
 
+def _conditional_headers(cached: Optional[CachedBody]) -> Dict[str, str]:
+    """Build ``If-None-Match`` / ``If-Modified-Since`` from a cached response."""
+    headers: Dict[str, str] = {}
+    if cached is not None:
+        etag, last_modified = cached.validator
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def _response_validator(
+    resp: aiohttp.ClientResponse,
+) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    etag = resp.headers.get("ETag")
+    last_modified = resp.headers.get("Last-Modified")
+    return (etag, last_modified) if etag or last_modified else None
+
+
 async def _fetch(session: aiohttp.ClientSession, url: str, desc: str) -> Optional[str]:
-    """Fetch a file from the given ``url`` using the provided session."""
+    """Fetch a file from the given ``url`` using the provided session.
+
+    When ``conditional_fetch`` is enabled the request carries ``If-None-Match``
+    / ``If-Modified-Since`` from the previous response and a ``304`` answer is
+    served from the local cache.
+    """
     safe_url = _mask_url_param(url)
-    log_debug(f"[API] Загружаем {desc} по адресу: {safe_url}")
-    try:
-        async with session.get(url) as resp:
-            resp.raise_for_status()
-            data = await resp.text()
-            log_debug(f"[API] {desc} загружен успешно.")
-            return data
-    except Exception as e:
-        log_debug(f"[API] ❌ Ошибка загрузки {desc}: {e}")
-        return None
+    logger.debug("[API] Загружаем %s по адресу: %s", desc, safe_url)
+    cached = _http_cache.get(url) if config.conditional_fetch else None
+    with metrics.timer("api_fetch_seconds", file=desc, mode="body") as timing:
+        try:
+            async with session.get(url, headers=_conditional_headers(cached)) as resp:
+                if resp.status == 304 and cached is not None:
+                    timing["result"] = "not_modified"
+                    logger.debug("[API] %s не изменился, используем кэш.", desc)
+                    return cached.body
+                resp.raise_for_status()
+                data = await resp.text()
+                logger.debug("[API] %s загружен успешно.", desc)
+                if config.conditional_fetch:
+                    _http_cache.store(url, _response_validator(resp), data)
+                return data
+        except Exception as e:
+            timing["result"] = "error"
+            logger.error("[API] ❌ Ошибка загрузки %s: %s", desc, e)
+            return None
+
+
+async def _fetch_parsed(
+    session: aiohttp.ClientSession, url: str, desc: str, extractor: StreamExtractor
+) -> Any:
+    """Stream the response body from ``url`` into ``extractor``.
+
+    Returns the extractor result; ``extractor.finished`` tells a successful
+    parse from a failed download. Validators are handled like in :func:`_fetch`,
+    the cache keeps the extracted result instead of the body.
+    """
+    safe_url = _mask_url_param(url)
+    logger.debug("[API] Потоково загружаем %s по адресу: %s", desc, safe_url)
+    cache_key = f"{url}#{extractor.cache_key}"
+    cached = _http_cache.get(cache_key) if config.conditional_fetch else None
+    with metrics.timer("api_fetch_seconds", file=desc, mode="stream") as timing:
+        try:
+            async with session.get(url, headers=_conditional_headers(cached)) as resp:
+                if resp.status == 304 and cached is not None:
+                    timing["result"] = "not_modified"
+                    logger.debug("[API] %s не изменился, используем кэш.", desc)
+                    extractor.finished = True
+                    return cached.body
+                resp.raise_for_status()
+                async for chunk in resp.content.iter_chunked(65536):
+                    extractor.feed(chunk)
+                value = extractor.close()
+                logger.debug("[API] %s разобран в потоке.", desc)
+                if config.conditional_fetch:
+                    _http_cache.store(cache_key, _response_validator(resp), value)
+                return value
+        except Exception as e:
+            timing["result"] = "error"
+            logger.error("[API] ❌ Ошибка загрузки %s: %s", desc, e)
+            return None
 
 
 async def fetch_api_file(
@@ -43,8 +132,9 @@ async def fetch_api_file(
     return await _fetch(session, url, filename)
 
 
-async def fetch_dedicated_server_stats(session: aiohttp.ClientSession) -> Optional[str]:
-    """Download ``dedicated-server-stats.xml`` from the API feed."""
+async def _load_dedicated_server_stats(
+    session: aiohttp.ClientSession,
+) -> Optional[str]:
     url = (
         config.api_base_url.replace(
             "dedicated-server-savegame.html",
@@ -55,24 +145,153 @@ async def fetch_dedicated_server_stats(session: aiohttp.ClientSession) -> Option
     return await _fetch(session, url, "dedicated-server-stats.xml")
 
 
-async def fetch_required_files(session: aiohttp.ClientSession) -> Tuple[
-    Optional[str],
-    Optional[str],
-    Optional[str],
-    Optional[str],
-    Optional[str],
-]:
-    """Fetch all files required for building server stats using provided session."""
-    log_debug("[FTP] Получаем dedicated-server-stats.xml")
-    stats_xml = await fetch_dedicated_server_stats(session)
-    log_debug("[API] Получаем vehicles")
-    vehicles_xml = await fetch_api_file(session, "vehicles")
-
-    log_debug("[FTP] Получаем careerSavegame.xml")
-    career_ftp = await fetch_file("careerSavegame.xml")
-    log_debug("[FTP] Получаем farmland.xml")
-    farmland_ftp = await fetch_file("farmland.xml")
-    log_debug("[FTP] Получаем farms.xml")
-    farms_ftp = await fetch_file("farms.xml")
-
-    return stats_xml, vehicles_xml, career_ftp, farmland_ftp, farms_ftp
+async def fetch_dedicated_server_stats(
+    session: aiohttp.ClientSession, *, max_age: Optional[float] = None
+) -> Optional[str]:
+    """Return ``dedicated-server-stats.xml`` from the shared snapshot cache.
+
+    Concurrent callers share a single HTTP request; a snapshot younger than
+    ``max_age`` (``stats_cache_ttl`` by default) is returned without a request.
+    """
+    return await stats_snapshot.get(
+        lambda: _load_dedicated_server_stats(session), max_age=max_age
+    )
+
+
+async def fetch_players_online(session: aiohttp.ClientSession) -> List[str]:
+    """Return online players from the current stats snapshot, parsed once per snapshot."""
+    xml = await fetch_dedicated_server_stats(session)
+    if not xml:
+        return []
+    return stats_snapshot.derive("players_online", parse_players_online) or []
+
+
+_SOURCE_NAMES = ("stats_xml", "vehicles_xml", "career_ftp", "farmland_ftp", "farms_ftp")
+
+# Поле parse_all, которое заполняет источник в потоковом режиме
+_STREAM_FIELDS = {
+    "vehicles_xml": "vehicles_owned",
+    "career_ftp": "farm_money",
+    "farmland_ftp": "fields",
+    "farms_ftp": "last_month_profit",
+}
+
+
+@dataclass
+class FetchResult:
+    """Результат цикла загрузки: содержимое источников и время их получения."""
+
+    stats_xml: Optional[str] = None
+    vehicles_xml: Optional[str] = None
+    career_ftp: Optional[str] = None
+    farmland_ftp: Optional[str] = None
+    farms_ftp: Optional[str] = None
+    #: Значения, извлечённые на лету в потоковом режиме (``stream_parsing``)
+    extracted: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def arrived(self) -> Dict[str, bool]:
+        """Флаги получения для каждого источника."""
+        return {
+            name: getattr(self, name) is not None
+            or _STREAM_FIELDS.get(name) in self.extracted
+            for name in _SOURCE_NAMES
+        }
+
+    @property
+    def complete(self) -> bool:
+        """Все ли источники получены."""
+        return all(self.arrived.values())
+
+
+async def _fetch_source(
+    name: str, coro: Awaitable[Any], timeout: float
+) -> Tuple[str, Any, float]:
+    """Await a single source within its own timeout and measure the time spent."""
+    started = time.monotonic()
+    try:
+        data = await asyncio.wait_for(coro, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning("[FETCH] ⏱ %s: превышен таймаут %s с", name, timeout)
+        data = None
+    return name, data, time.monotonic() - started
+
+
+async def fetch_required_files(session: aiohttp.ClientSession) -> FetchResult:
+    """Fetch all files required for building server stats concurrently.
+
+    Each source is limited by ``fetch_source_timeout`` and the whole cycle by
+    ``fetch_cycle_deadline``; sources that did not make it are left as ``None``.
+    With ``stream_parsing`` the large files are parsed while downloading and
+    only the extracted values end up in ``FetchResult.extracted``.
+    """
+    extractors: Dict[str, StreamExtractor] = {}
+    if config.stream_parsing:
+        extractors = {
+            "vehicles_xml": VehicleCountExtractor(),
+            "career_ftp": FarmMoneyExtractor(),
+            "farmland_ftp": FarmlandExtractor(),
+            "farms_ftp": LastMonthProfitExtractor(),
+        }
+        vehicles_url = (
+            f"{config.api_base_url}?file=vehicles&code={config.api_secret_code}"
+        )
+        sources = {
+            "stats_xml": fetch_dedicated_server_stats(session),
+            "vehicles_xml": _fetch_parsed(
+                session, vehicles_url, "vehicles", extractors["vehicles_xml"]
+            ),
+            "career_ftp": fetch_file_parsed(
+                "careerSavegame.xml", extractors["career_ftp"]
+            ),
+            "farmland_ftp": fetch_file_parsed(
+                "farmland.xml", extractors["farmland_ftp"]
+            ),
+            "farms_ftp": fetch_file_parsed("farms.xml", extractors["farms_ftp"]),
+        }
+    else:
+        sources = {
+            "stats_xml": fetch_dedicated_server_stats(session),
+            "vehicles_xml": fetch_api_file(session, "vehicles"),
+            "career_ftp": fetch_file("careerSavegame.xml"),
+            "farmland_ftp": fetch_file("farmland.xml"),
+            "farms_ftp": fetch_file("farms.xml"),
+        }
+    started = time.monotonic()
+    tasks = [
+        asyncio.create_task(_fetch_source(name, coro, config.fetch_source_timeout))
+        for name, coro in sources.items()
+    ]
+    done, pending = await asyncio.wait(tasks, timeout=config.fetch_cycle_deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    finished = {}
+    for task in done:
+        name, data, elapsed = task.result()
+        finished[name] = (data, elapsed)
+
+    result = FetchResult()
+    deadline_elapsed = time.monotonic() - started
+    for name in sources:
+        if name not in finished:
+            logger.warning("[FETCH] ⏱ %s: не успел к дедлайну цикла", name)
+        data, elapsed = finished.get(name, (None, deadline_elapsed))
+        result.timings[name] = elapsed
+        extractor = extractors.get(name)
+        if extractor is None:
+            setattr(result, name, data)
+        elif name in finished and extractor.finished:
+            result.extracted[_STREAM_FIELDS[name]] = data
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "[FETCH] Время загрузки: %s",
+            ", ".join(
+                f"{name}={elapsed:.2f}s" for name, elapsed in result.timings.items()
+            ),
+        )
+    return result
@@ -1,15 +1,86 @@
+import hashlib
+import logging
+import threading
 import xml.etree.ElementTree as ET
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from typing import Any, Dict, Optional, Tuple
 
-from utils.logger import log_debug
+from config.config import config
+from utils.metrics import metrics
 
+logger = logging.getLogger(__name__)
 
+# Объекты, которые не считаются техникой фермы
+_VEHICLE_EXCLUDE_KEYWORDS = [
+    "pallet",
+    "tree",
+    "wood",
+    "object",
+    "trailerWood",
+    "camera",
+]
+
+
+class DocumentCache:
+    """LRU-кэш разобранных XML-документов по хэшу содержимого.
+
+    Один и тот же документ (например, dedicated-server-stats.xml, который
+    разбирается и для общей статистики, и для списка игроков) строится в
+    дерево один раз. Память ограничена приблизительной оценкой размера
+    дерева; документы крупнее лимита не кэшируются. Деревья общие, поэтому
+    парсеры не должны их изменять. В режиме пула процессов у каждого
+    воркера свой экземпляр кэша.
+    """
+
+    # Дерево ElementTree занимает в памяти в несколько раз больше исходного текста
+    TREE_COST_FACTOR = 8
+
+    def __init__(self, *, max_bytes: int, max_entries: int) -> None:
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[ET.Element, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def parse(self, xml_text: str) -> ET.Element:
+        key = hashlib.sha1(xml_text.encode("utf-8")).hexdigest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                metrics.inc("cache_requests_total", cache="document", result="hit")
+                return entry[0]
+        metrics.inc("cache_requests_total", cache="document", result="miss")
+
+        root = ET.fromstring(xml_text)
+        cost = len(xml_text) * self.TREE_COST_FACTOR
+        if cost > self.max_bytes or self.max_entries <= 0:
+            return root
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key][0]
+            self._entries[key] = (root, cost)
+            self._size += cost
+            while self._size > self.max_bytes or len(self._entries) > self.max_entries:
+                _, (_, evicted_cost) = self._entries.popitem(last=False)
+                self._size -= evicted_cost
+        return root
+
+
+document_cache = DocumentCache(
+    max_bytes=config.parse_cache_max_bytes,
+    max_entries=config.parse_cache_max_entries,
+)
+
+
+@metrics.timed("parse_seconds", parser="parse_server_stats")
 def parse_server_stats(
     xml_text: str,
 ) -> Tuple[Optional[str], Optional[str], Optional[int], Optional[int], Optional[str]]:
     """Извлекает общую информацию о сервере."""
     try:
-        root = ET.fromstring(xml_text)
+        root = document_cache.parse(xml_text)
         server_elem = root  # <Server> — корень
 
         server_name = server_elem.get("name")
@@ -39,14 +110,15 @@ def parse_server_stats(
 
         return server_name, map_name, slots_used, slots_max, last_updated
     except Exception as e:
-        log_debug(f"[ERROR] parse_server_stats: {e}")
+        logger.error("[ERROR] parse_server_stats: %s", e)
         return None, None, None, None, None
 
 
+@metrics.timed("parse_seconds", parser="parse_farm_money")
 def parse_farm_money(xml_text: str) -> Optional[int]:
     """Получает баланс фермы из careerSavegame.xml на FTP."""
     try:
-        root = ET.fromstring(xml_text)
+        root = document_cache.parse(xml_text)
         elem = root.find(".//statistics/money")
         if elem is not None and elem.text:
             try:
@@ -55,20 +127,19 @@ def parse_farm_money(xml_text: str) -> Optional[int]:
                 return None
         return None
     except Exception as e:
-        log_debug(f"[ERROR] parse_farm_money: {e}")
+        logger.error("[ERROR] parse_farm_money: %s", e)
         return None
 
 
+@metrics.timed("parse_seconds", parser="count_vehicles")
 def _count_vehicles(xml_text: str, farm_id: str) -> Optional[int]:
     """Подсчёт техники в файле vehicles."""
     try:
-        root = ET.fromstring(xml_text)
+        root = document_cache.parse(xml_text)
         vehicles = root.findall(".//vehicle")
         if not vehicles:
             return 0
 
-        keywords = ["pallet", "tree", "wood", "object", "trailerWood", "camera"]
-
         has_farmid = any(v.get("farmId") is not None for v in vehicles)
         if not has_farmid:
             return None
@@ -77,27 +148,29 @@ def _count_vehicles(xml_text: str, farm_id: str) -> Optional[int]:
         for v in vehicles:
             if v.get("farmId") == farm_id:
                 filename = v.get("filename", "")
-                if not any(k in filename for k in keywords):
+                if not any(k in filename for k in _VEHICLE_EXCLUDE_KEYWORDS):
                     count += 1
         return count
     except Exception as e:
-        log_debug(f"[ERROR] _count_vehicles: {e}")
+        logger.error("[ERROR] _count_vehicles: %s", e)
         return None
 
 
+@metrics.timed("parse_seconds", parser="parse_farmland")
 def parse_farmland(xml_text: str, farm_id: str) -> Tuple[int, int]:
     """Подсчитывает количество полей у фермы."""
     try:
-        root = ET.fromstring(xml_text)
+        root = document_cache.parse(xml_text)
         farmlands = root.findall(".//Farmland") or root.findall(".//farmland")
         total = len(farmlands)
         owned = len([f for f in farmlands if f.get("farmId") == farm_id])
         return owned, total
     except Exception as e:
-        log_debug(f"[ERROR] parse_farmland: {e}")
+        logger.error("[ERROR] parse_farmland: %s", e)
         return 0, 0
 
 
+@metrics.timed("parse_seconds", parser="parse_players_online")
 def parse_players_online(xml_text: str) -> list:
     """Возвращает список ников онлайн-игроков из dedicated-server-stats.xml.
 
@@ -107,7 +180,7 @@ def parse_players_online(xml_text: str) -> list:
       * нет ли ошибок в логах.
     """
     try:
-        root = ET.fromstring(xml_text)
+        root = document_cache.parse(xml_text)
         players = []
         slots = root.find(".//Slots")
         if slots is not None:
@@ -118,14 +191,15 @@ def parse_players_online(xml_text: str) -> list:
                         players.append(name)
         return players
     except Exception as e:
-        log_debug(f"[ERROR] parse_players_online: {e}")
+        logger.error("[ERROR] parse_players_online: %s", e)
         return []
 
 
+@metrics.timed("parse_seconds", parser="parse_last_month_profit")
 def parse_last_month_profit(xml_text: str) -> Optional[int]:
     """Возвращает округлённую прибыль за последний месяц (day=1) из farms.xml"""
     try:
-        root = ET.fromstring(xml_text)
+        root = document_cache.parse(xml_text)
         stats = root.find(".//farm[@farmId='1']/finances/stats[@day='4']")
         if stats is None:
             return None
@@ -139,40 +213,253 @@ def parse_last_month_profit(xml_text: str) -> Optional[int]:
 
         return round(profit)
     except Exception as e:
-        log_debug(f"[ERROR] parse_last_month_profit: {e}")
+        logger.error("[ERROR] parse_last_month_profit: %s", e)
         return None
 
 
+class StreamExtractor(ABC):
+    """Инкрементальный разбор XML по мере поступления байтов.
+
+    Документ целиком не строится: каждый элемент удаляется из дерева сразу
+    после события ``end``, а наследники достают из событий только нужные
+    атрибуты и текст.
+    """
+
+    #: Ключ для кэширования результата рядом с исходным файлом
+    cache_key = ""
+
+    def __init__(self) -> None:
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._stack: list = []
+        #: Разбор завершён без ошибок (или результат взят из кэша)
+        self.finished = False
+
+    def feed(self, chunk: bytes) -> None:
+        self._parser.feed(chunk)
+        self._drain()
+
+    def close(self) -> Any:
+        """Завершает разбор и возвращает результат."""
+        self._parser.close()
+        self._drain()
+        self.finished = True
+        return self.result()
+
+    def _drain(self) -> None:
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                self._stack.append(elem)
+                self.on_start(elem, len(self._stack) - 1)
+            else:
+                self._stack.pop()
+                self.on_end(elem, len(self._stack))
+                if self._stack:
+                    self._stack[-1].remove(elem)
+                elem.clear()
+
+    def parent(self, level: int = 1) -> Optional[ET.Element]:
+        """Возвращает предка текущего элемента (только внутри ``on_end``)."""
+        if len(self._stack) >= level:
+            return self._stack[-level]
+        return None
+
+    def on_start(self, elem: ET.Element, depth: int) -> None:
+        pass
+
+    def on_end(self, elem: ET.Element, depth: int) -> None:
+        pass
+
+    @abstractmethod
+    def result(self) -> Any:
+        """Результат разбора; вызывается из :meth:`close`."""
+
+
+class FarmMoneyExtractor(StreamExtractor):
+    """Потоковый аналог :func:`parse_farm_money`."""
+
+    cache_key = "farm_money"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._money: Optional[int] = None
+        self._found = False
+
+    def on_end(self, elem: ET.Element, depth: int) -> None:
+        if self._found or elem.tag != "money" or depth < 2:
+            return
+        parent = self.parent()
+        if parent is None or parent.tag != "statistics":
+            return
+        self._found = True
+        if elem.text:
+            try:
+                self._money = int(float(elem.text))
+            except (ValueError, TypeError):
+                pass
+
+    def result(self) -> Optional[int]:
+        return self._money
+
+
+class FarmlandExtractor(StreamExtractor):
+    """Потоковый аналог :func:`parse_farmland`."""
+
+    cache_key = "fields"
+
+    def __init__(self, farm_id: str = "1") -> None:
+        super().__init__()
+        self.farm_id = farm_id
+        self._counts = {"Farmland": [0, 0], "farmland": [0, 0]}
+
+    def on_start(self, elem: ET.Element, depth: int) -> None:
+        counts = self._counts.get(elem.tag)
+        if counts is None or depth == 0:
+            return
+        counts[1] += 1
+        if elem.get("farmId") == self.farm_id:
+            counts[0] += 1
+
+    def result(self) -> Tuple[int, int]:
+        owned, total = self._counts["Farmland"]
+        if not total:
+            owned, total = self._counts["farmland"]
+        return owned, total
+
+
+class VehicleCountExtractor(StreamExtractor):
+    """Потоковый аналог :func:`_count_vehicles`."""
+
+    cache_key = "vehicles_owned"
+
+    def __init__(self, farm_id: str = "1") -> None:
+        super().__init__()
+        self.farm_id = farm_id
+        self._total = 0
+        self._has_farmid = False
+        self._count = 0
+
+    def on_start(self, elem: ET.Element, depth: int) -> None:
+        if elem.tag != "vehicle" or depth == 0:
+            return
+        self._total += 1
+        farm_id = elem.get("farmId")
+        if farm_id is None:
+            return
+        self._has_farmid = True
+        if farm_id == self.farm_id:
+            filename = elem.get("filename", "")
+            if not any(k in filename for k in _VEHICLE_EXCLUDE_KEYWORDS):
+                self._count += 1
+
+    def result(self) -> Optional[int]:
+        if not self._total:
+            return 0
+        if not self._has_farmid:
+            return None
+        return self._count
+
+
+class LastMonthProfitExtractor(StreamExtractor):
+    """Потоковый аналог :func:`parse_last_month_profit`."""
+
+    cache_key = "last_month_profit"
+
+    def __init__(self, farm_id: str = "1", day: str = "4") -> None:
+        super().__init__()
+        self.farm_id = farm_id
+        self.day = day
+        self._profit = 0.0
+        self._found = False
+        self._done = False
+
+    def _is_target_stats(self, elem: ET.Element, depth: int) -> bool:
+        if elem.tag != "stats" or elem.get("day") != self.day or depth < 3:
+            return False
+        finances = self._stack[depth - 1]
+        farm = self._stack[depth - 2]
+        return (
+            finances.tag == "finances"
+            and farm.tag == "farm"
+            and farm.get("farmId") == self.farm_id
+        )
+
+    def on_end(self, elem: ET.Element, depth: int) -> None:
+        if self._done:
+            return
+        if self._is_target_stats(elem, depth):
+            self._found = True
+            self._done = True
+            return
+        stats = self.parent()
+        if stats is not None and self._is_target_stats(stats, depth - 1):
+            try:
+                self._profit += float(elem.text)
+            except (ValueError, TypeError):
+                pass
+
+    def result(self) -> Optional[int]:
+        return round(self._profit) if self._found else None
+
+
+@metrics.timed("parse_seconds", parser="parse_all")
 def parse_all(
     server_stats: str,
-    vehicles_api: str,
-    career_savegame_ftp: str,
-    farmland_ftp: str,
+    vehicles_api: Optional[str],
+    career_savegame_ftp: Optional[str],
+    farmland_ftp: Optional[str],
     vehicles_ftp: Optional[str] = None,
     farms_xml: Optional[str] = None,
     dedicated_server_stats: Optional[str] = None,
     farm_id: str = "1",
+    extracted: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
-    """Собирает все данные из разных источников и возвращает единую структуру."""
+    """Собирает все данные из разных источников и возвращает единую структуру.
+
+    Источники, которые не удалось получить (``None``), дают ``None`` в
+    соответствующих полях. ``extracted`` содержит значения, уже извлечённые
+    потоковыми парсерами (``farm_money``, ``fields``, ``vehicles_owned``,
+    ``last_month_profit``), — для них XML не разбирается повторно.
+    """
+    extracted = extracted or {}
     try:
         server_name, map_name, slots_used, slots_max, _ = parse_server_stats(
             server_stats
         )
 
-        farm_money = parse_farm_money(career_savegame_ftp)
-
-        fields_owned, fields_total = parse_farmland(farmland_ftp, farm_id)
-
-        vehicles_owned = _count_vehicles(vehicles_api, farm_id)
+        if "farm_money" in extracted:
+            farm_money = extracted["farm_money"]
+        elif career_savegame_ftp is not None:
+            farm_money = parse_farm_money(career_savegame_ftp)
+        else:
+            farm_money = None
+
+        if "fields" in extracted:
+            fields_owned, fields_total = extracted["fields"]
+        elif farmland_ftp is not None:
+            fields_owned, fields_total = parse_farmland(farmland_ftp, farm_id)
+        else:
+            fields_owned, fields_total = None, None
+
+        vehicles_known = "vehicles_owned" in extracted or vehicles_api is not None
+        if "vehicles_owned" in extracted:
+            vehicles_owned = extracted["vehicles_owned"]
+        elif vehicles_api is not None:
+            vehicles_owned = _count_vehicles(vehicles_api, farm_id)
+        else:
+            vehicles_owned = None
         if vehicles_owned is None and vehicles_ftp is not None:
             vehicles_owned = _count_vehicles(vehicles_ftp, farm_id)
-        vehicles_owned = vehicles_owned or 0
+        if vehicles_owned is None and (vehicles_known or vehicles_ftp is not None):
+            vehicles_owned = 0
 
-        log_debug(f"[PARSE_ALL] Сервер: {server_name}, Карта: {map_name}")
+        logger.debug("[PARSE_ALL] Сервер: %s, Карта: %s", server_name, map_name)
 
-        last_month_profit = (
-            parse_last_month_profit(farms_xml) if farms_xml is not None else None
-        )
+        if "last_month_profit" in extracted:
+            last_month_profit = extracted["last_month_profit"]
+        elif farms_xml is not None:
+            last_month_profit = parse_last_month_profit(farms_xml)
+        else:
+            last_month_profit = None
 
         players_online = []
         if dedicated_server_stats is not None:
@@ -191,5 +478,5 @@ def parse_all(
             "players_online": players_online,
         }
     except Exception as e:
-        log_debug(f"[ERROR] parse_all: {e}")
+        logger.error("[ERROR] parse_all: %s", e)
         return {}
@@ -0,0 +1,108 @@
+"""Сообщение со статусом сервера, которое редактируется на месте."""
+
+from __future__ import annotations
+
+import io
+import logging
+from typing import Optional
+
+import discord
+
+from config.config import config
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STATUS_MESSAGE_KEY = "status_message_id"
+
+
+class StatusMessage:
+    """Публикует embed со статусом в одном и том же сообщении.
+
+    ID сообщения хранится в состоянии бота (``Storage.set_state``), поэтому переживает
+    перезапуск. Если сообщение удалено или ещё не создано, старые сообщения
+    бота убираются одной bulk-очисткой и отправляется новое. В режиме
+    ``resend`` сохраняется прежнее поведение: удалить всё и отправить заново.
+    """
+
+    def __init__(self, bot: discord.Client, channel: discord.abc.Messageable) -> None:
+        self.bot = bot
+        self.channel = channel
+        self.mode = config.status_message_mode
+        self._message_id: Optional[int] = None
+        self._loaded = False
+
+    async def _load_id(self) -> Optional[int]:
+        if not self._loaded:
+            self._loaded = True
+            try:
+                value = await self.bot.storage.get_state(STATUS_MESSAGE_KEY)
+                if value is not None:
+                    self._message_id = int(value)
+            except Exception as e:
+                logger.error("[DB] Не удалось прочитать ID сообщения статуса: %s", e)
+        return self._message_id
+
+    async def _save_id(self, message_id: int) -> None:
+        self._message_id = message_id
+        try:
+            await self.bot.storage.set_state(STATUS_MESSAGE_KEY, str(message_id))
+        except Exception as e:
+            logger.error("[DB] Не удалось сохранить ID сообщения статуса: %s", e)
+
+    async def _cleanup(self) -> None:
+        """Удаляет старые сообщения бота, по возможности одним bulk-запросом."""
+
+        def is_own(msg: discord.Message) -> bool:
+            return msg.author == self.bot.user
+
+        try:
+            with metrics.timer("discord_request_seconds", call="purge"):
+                deleted = await self.channel.purge(limit=20, check=is_own)
+            logger.debug("[Discord] Удалено старых сообщений: %s", len(deleted))
+            return
+        except discord.Forbidden:
+            logger.warning("[Discord] Нет прав на bulk-удаление, удаляем по одному")
+        except Exception as e:
+            logger.error("[Discord] Не удалось очистить канал: %s", e)
+            return
+
+        async for msg in self.channel.history(limit=20):
+            if is_own(msg):
+                try:
+                    with metrics.timer("discord_request_seconds", call="delete"):
+                        await msg.delete()
+                except Exception as e:
+                    logger.error("[Discord] Не удалось удалить сообщение: %s", e)
+
+    async def publish(self, embed: discord.Embed, png: bytes, filename: str) -> None:
+        """Показывает ``embed`` с картинкой ``png`` в сообщении статуса."""
+        if self.mode == "edit":
+            message_id = await self._load_id()
+            if message_id is not None:
+                message = self.channel.get_partial_message(message_id)
+                try:
+                    with metrics.timer("discord_request_seconds", call="edit"):
+                        await message.edit(
+                            embed=embed,
+                            attachments=[
+                                discord.File(io.BytesIO(png), filename=filename)
+                            ],
+                        )
+                    logger.info("[Discord] ✅ Сообщение статуса обновлено.")
+                    return
+                except discord.NotFound:
+                    logger.warning(
+                        "[Discord] Сообщение статуса не найдено, отправляем новое"
+                    )
+
+        await self._cleanup()
+        logger.debug("[Discord] Отправляем сообщение")
+        with metrics.timer("discord_request_seconds", call="send"):
+            message = await self.channel.send(
+                embed=embed,
+                files=[discord.File(io.BytesIO(png), filename=filename)],
+            )
+        if self.mode == "edit":
+            await self._save_id(message.id)
+        logger.info("[Discord] ✅ Embed успешно отправлен.")
@@ -1,14 +1,16 @@
 from __future__ import annotations
 
-import os
+import io
+import logging
 
 import discord
 from discord import app_commands
 
-from config.config import ONLINE_MONTH_GRAPH_TITLE
-from utils.logger import log_debug
+from config.config import ONLINE_MONTH_GRAPH_FILENAME, ONLINE_MONTH_GRAPH_TITLE
 from utils.online_month_graph import generate_online_month_graph
 
+logger = logging.getLogger(__name__)
+
 
 def setup(tree: app_commands.CommandTree) -> None:
     @tree.command(
@@ -18,20 +20,22 @@ def setup(tree: app_commands.CommandTree) -> None:
     async def online_month_command(interaction: discord.Interaction) -> None:
         await interaction.response.defer()
         try:
-            path = await generate_online_month_graph(interaction.client.db_pool)
-            if not path:
+            png = await generate_online_month_graph(interaction.client.storage)
+            if not png:
                 await interaction.followup.send("Нет данных за последний месяц.")
                 return
             embed = discord.Embed(title=ONLINE_MONTH_GRAPH_TITLE)
-            embed.set_image(url=f"attachment://{os.path.basename(path)}")
+            embed.set_image(url=f"attachment://{ONLINE_MONTH_GRAPH_FILENAME}")
             await interaction.followup.send(
                 embed=embed,
-                file=discord.File(path, filename=os.path.basename(path)),
+                file=discord.File(
+                    io.BytesIO(png), filename=ONLINE_MONTH_GRAPH_FILENAME
+                ),
             )
         except Exception as e:
-            log_debug(f"[CMD] online_month error: {e}")
+            logger.error("[CMD] online_month error: %s", e)
             await interaction.followup.send(
                 "Ошибка при генерации графика.", ephemeral=True
             )
 
-    log_debug("[Slash] Команда /online_month зарегистрирована")
+    logger.debug("[Slash] Команда /online_month зарегистрирована")
@@ -1,43 +1,43 @@
 from __future__ import annotations
 
+import logging
+
 import discord
-from asyncpg import Pool
 from discord import app_commands
 
-from config.config import WEEKLY_TOP_LAST_TABLE, WEEKLY_TOP_LIMIT
-from utils.logger import log_debug
+from config.config import WEEKLY_TOP_LIMIT
+from storage.base import Storage
+from utils.query_cache import TOPIC_WEEKLY, query_cache
+
+logger = logging.getLogger(__name__)
 
 
 async def _fetch_last_week_top(
-    pool: Pool,
+    storage: Storage,
     *,
-    table_name: str = WEEKLY_TOP_LAST_TABLE,
     limit: int = WEEKLY_TOP_LIMIT,
 ) -> list[tuple[str, int]]:
     """Fetch archived weekly top rows."""
     try:
-        rows = await pool.fetch(
-            f"SELECT player_name, hours FROM {table_name} "
-            "ORDER BY hours DESC, player_name LIMIT $1",
-            limit,
+        return await query_cache.get(
+            TOPIC_WEEKLY,
+            ("top7lastweek", limit),
+            lambda: storage.top_last_week(limit),
         )
     except Exception as e:
-        log_debug(f"[DB] Error fetching last week top: {e}")
+        logger.error("[DB] Error fetching last week top: %s", e)
         raise
 
-    return [(r["player_name"], int(r["hours"])) for r in rows]
-
 
 async def _handle_command(
     interaction: discord.Interaction,
     *,
-    table_name: str = WEEKLY_TOP_LAST_TABLE,
     limit: int = WEEKLY_TOP_LIMIT,
 ) -> None:
     await interaction.response.defer()
-    pool: Pool = interaction.client.db_pool
+    storage: Storage = interaction.client.storage
     try:
-        rows = await _fetch_last_week_top(pool, table_name=table_name, limit=limit)
+        rows = await _fetch_last_week_top(storage, limit=limit)
     except Exception:
         await interaction.followup.send("Ошибка при получении топа.", ephemeral=True)
         return
@@ -57,11 +57,10 @@ async def _handle_command(
 def setup(
     tree: app_commands.CommandTree,
     *,
-    table_name: str = WEEKLY_TOP_LAST_TABLE,
     limit: int = WEEKLY_TOP_LIMIT,
 ) -> None:
     @tree.command(name="top7lastweek", description="Топ игроков прошлой недели")
     async def top7lastweek_command(interaction: discord.Interaction) -> None:
-        await _handle_command(interaction, table_name=table_name, limit=limit)
+        await _handle_command(interaction, limit=limit)
 
-    log_debug("[Slash] Команда /top7lastweek зарегистрирована")
+    logger.debug("[Slash] Команда /top7lastweek зарегистрирована")
@@ -1,56 +1,44 @@
 from __future__ import annotations
 
+import logging
+
 import discord
-from asyncpg import Pool
 from discord import app_commands
 
-from config.config import TOTAL_TOP_LIMIT, TOTAL_TOP_TABLE
-from utils.logger import log_debug
+from config.config import TOTAL_TOP_LIMIT
+from storage.base import Storage
+from utils.query_cache import TOPIC_TOTAL, query_cache
+
+logger = logging.getLogger(__name__)
 
 
 async def _fetch_top_total(
-    pool: Pool,
+    storage: Storage,
     *,
-    table_name: str = TOTAL_TOP_TABLE,
     limit: int = TOTAL_TOP_LIMIT,
 ) -> tuple[list[tuple[str, int]], int]:
     """Возвращает список игроков и общее количество записей."""
-    # Считаем часы игрока и общее число строк через оконную функцию
+    # Ответ берётся из кэша, пока update_total_time не перезапишет таблицу
     try:
-        rows = await pool.fetch(
-            f"""
-            SELECT player_name, total_hours,
-                   COUNT(*) OVER () AS total_count
-            FROM {table_name}
-            ORDER BY total_hours DESC, player_name
-            LIMIT $1
-            """,
-            limit,
+        return await query_cache.get(
+            TOPIC_TOTAL,
+            ("top_total", limit),
+            lambda: storage.top_total(limit),
         )
     except Exception as e:
-        log_debug(f"[DB] Error fetching total top: {e}")
+        logger.error("[DB] Error fetching total top: %s", e)
         raise
 
-    if not rows:
-        return ([], 0)
-
-    total = int(rows[0]["total_count"]) if rows else 0
-    return (
-        [(r["player_name"], int(r["total_hours"])) for r in rows],
-        total,
-    )
-
 
 async def _handle_command(
     interaction: discord.Interaction,
     *,
-    table_name: str = TOTAL_TOP_TABLE,
     limit: int = TOTAL_TOP_LIMIT,
 ) -> None:
     await interaction.response.defer()
-    pool: Pool = interaction.client.db_pool
+    storage: Storage = interaction.client.storage
     try:
-        rows, total = await _fetch_top_total(pool, table_name=table_name, limit=limit)
+        rows, total = await _fetch_top_total(storage, limit=limit)
     except Exception:
         await interaction.followup.send("Ошибка при получении топа.", ephemeral=True)
         return
@@ -72,11 +60,10 @@ async def _handle_command(
 def setup(
     tree: app_commands.CommandTree,
     *,
-    table_name: str = TOTAL_TOP_TABLE,
     limit: int = TOTAL_TOP_LIMIT,
 ) -> None:
     @tree.command(name="top_total", description="Топ игроков по общему времени")
     async def top_total_command(interaction: discord.Interaction) -> None:
-        await _handle_command(interaction, table_name=table_name, limit=limit)
+        await _handle_command(interaction, limit=limit)
 
-    log_debug("[Slash] Команда /top_total зарегистрирована")
+    logger.debug("[Slash] Команда /top_total зарегистрирована")
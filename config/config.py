@@ -17,18 +17,61 @@ class Config:
     channel_id: int = int(os.getenv("DISCORD_CHANNEL_ID", 0))
     api_base_url: str = os.getenv("API_BASE_URL", "")
     api_secret_code: str = os.getenv("API_SECRET_CODE", "")
-    api_poll_interval: int = int(os.getenv("API_POLL_INTERVAL", 900))
     ftp_poll_interval: int = int(os.getenv("FTP_POLL_INTERVAL", 1800))
     ftp_host: str = os.getenv("FTP_HOST", "")
     ftp_port: int = int(os.getenv("FTP_PORT", 21))
     ftp_user: str = os.getenv("FTP_USER", "")
     ftp_pass: str = os.getenv("FTP_PASS", "")
+    ftp_pool_size: int = int(os.getenv("FTP_POOL_SIZE", 3))
+    ftp_idle_timeout: int = int(os.getenv("FTP_IDLE_TIMEOUT", 600))
+    storage_backend: str = os.getenv("STORAGE_BACKEND", "postgres")
     postgres_url: str = os.getenv("POSTGRES_URL", "")
+    db_pool_min_size: int = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+    db_pool_max_size: int = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+    db_statement_cache_size: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+    db_conn_max_inactive: float = float(os.getenv("DB_CONN_MAX_INACTIVE", 300))
+    stats_cache_ttl: float = float(os.getenv("STATS_CACHE_TTL", 60))
+    conditional_fetch: bool = os.getenv("CONDITIONAL_FETCH", "true").lower() == "true"
+    stream_parsing: bool = os.getenv("STREAM_PARSING", "false").lower() == "true"
+    parse_cache_max_bytes: int = int(
+        os.getenv("PARSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+    parse_cache_max_entries: int = int(os.getenv("PARSE_CACHE_MAX_ENTRIES", 16))
+    executor_kind: str = os.getenv("EXECUTOR_KIND", "thread")
+    executor_workers: int = int(os.getenv("EXECUTOR_WORKERS", 2))
+    executor_queue_size: int = int(os.getenv("EXECUTOR_QUEUE_SIZE", 8))
+    graph_render_kind: str = os.getenv("GRAPH_RENDER_KIND", "process")
+    graph_cache_max_bytes: int = int(
+        os.getenv("GRAPH_CACHE_MAX_BYTES", 8 * 1024 * 1024)
+    )
+    status_message_mode: str = os.getenv("STATUS_MESSAGE_MODE", "edit")
+    query_cache_max_entries: int = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 64))
+    presence_model: str = os.getenv("PRESENCE_MODEL", "samples")
+    session_poll_interval: int = int(os.getenv("SESSION_POLL_INTERVAL", 60))
+    total_time_mode: str = os.getenv("TOTAL_TIME_MODE", "window")
+    fetch_source_timeout: float = float(os.getenv("FETCH_SOURCE_TIMEOUT", 30))
+    fetch_cycle_deadline: float = float(os.getenv("FETCH_CYCLE_DEADLINE", 60))
+    metrics_host: str = os.getenv("METRICS_HOST", "127.0.0.1")
+    metrics_port: int = int(os.getenv("METRICS_PORT", 0))
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_format: str = os.getenv("LOG_FORMAT", "text")
 
     ftp_profile_dir: str = os.getenv("FTP_PROFILE_DIR", "profile")
     ftp_savegame_dir: str = os.getenv("FTP_SAVEGAME_DIR", "savegame1")
     timezone_offset: int = int(os.getenv("TIMEZONE_OFFSET", 3))
     output_dir: Path = Path(os.getenv("OUTPUT_DIR", "output"))
+    sqlite_path: Path = Path(
+        os.getenv(
+            "SQLITE_PATH",
+            os.path.join(os.getenv("OUTPUT_DIR", "output"), "bot.sqlite3"),
+        )
+    )
+    online_spool_path: Path = Path(
+        os.getenv(
+            "ONLINE_SPOOL_PATH",
+            os.path.join(os.getenv("OUTPUT_DIR", "output"), "online_spool.jsonl"),
+        )
+    )
 
 
 config = Config()
@@ -36,6 +79,8 @@ config = Config()
 # Cleanup settings
 cleanup_history_days = 30
 cleanup_task_interval_seconds = 86400
+# На сколько дней вперёд заранее создаются суточные партиции истории
+PARTITION_DAYS_AHEAD = 7
 
 # Graph settings
 ONLINE_MONTH_DAYS = 30
@@ -44,8 +89,12 @@ ONLINE_DAILY_GRAPH_FILENAME = "online_daily_graph.png"
 ONLINE_MONTH_GRAPH_TITLE = "Онлайн по дням (последние 30 дней)"
 ONLINE_DAILY_GRAPH_TITLE = "Количество игроков по часам (сегодня)"
 
-ONLINE_MONTH_GRAPH_PATH = config.output_dir / ONLINE_MONTH_GRAPH_FILENAME
-ONLINE_DAILY_GRAPH_PATH = config.output_dir / ONLINE_DAILY_GRAPH_FILENAME
+# Online history settings
+ONLINE_HOURLY_TABLE = "player_online_hourly"
+PLAYERS_TABLE = "players"
+PLAYER_SESSIONS_TABLE = "player_sessions"
+# Сколько срезов за час нужно, чтобы час засчитался игроку
+ONLINE_MIN_SAMPLES_PER_HOUR = 3
 
 # Weekly top settings
 WEEKLY_TOP_LIMIT = int(os.getenv("WEEKLY_TOP_LIMIT", 7))
@@ -1,3 +0,0 @@
-def load_dotenv(*args, **kwargs):
-    pass
-
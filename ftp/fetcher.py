@@ -1,41 +1,215 @@
 """Utility for fetching files via FTP."""
 
-from typing import Optional
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, List, Optional, Tuple
 
 import aioftp
 
 from config.config import config
-from utils.logger import log_debug
+from utils.conditional_cache import ConditionalCache
+from utils.metrics import metrics
 
+if TYPE_CHECKING:
+    from bot.parsers import StreamExtractor
 
-async def fetch_file(file_name: str) -> Optional[str]:
-    """Download a file from the configured FTP server."""
-    log_debug(
-        f"[FTP] Connecting to {config.ftp_host}:{config.ftp_port} as {config.ftp_user}"
-    )
-    try:
-        async with aioftp.Client.context(
+logger = logging.getLogger(__name__)
+
+
+class FTPSessionPool:
+    """Пул авторизованных FTP-сессий, припаркованных в каталоге сохранения.
+
+    Логин и переход по каталогам выполняются один раз на соединение.
+    Перед повторным использованием простаивающая сессия проверяется
+    командой ``NOOP``; если сервер её уже закрыл, соединение прозрачно
+    пересоздаётся.
+    """
+
+    def __init__(self, *, max_size: int, idle_timeout: float) -> None:
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self._idle: List[Tuple[aioftp.Client, float]] = []
+        self._slots = asyncio.Semaphore(self.max_size)
+
+    async def _connect(self) -> aioftp.Client:
+        logger.debug(
+            "[FTP] Connecting to %s:%s as %s",
             config.ftp_host,
             config.ftp_port,
-            user=config.ftp_user,
-            password=config.ftp_pass,
-        ) as ftp_client:
-            log_debug(f"[FTP] Entering {config.ftp_profile_dir}...")
-            await ftp_client.change_directory(config.ftp_profile_dir)
-            log_debug(f"[FTP] Entering {config.ftp_savegame_dir}...")
-            await ftp_client.change_directory(config.ftp_savegame_dir)
-            log_debug(f"[FTP] Downloading file: {file_name}")
-            async with ftp_client.download_stream(file_name) as stream:
-                buffer = bytearray()
-                while True:
-                    chunk = await stream.read(8192)
-                    if not chunk:
-                        break
-                    buffer.extend(chunk)
-                log_debug(
-                    f"[FTP] File {file_name} downloaded. Size: {len(buffer)} bytes"
+            config.ftp_user,
+        )
+        client = aioftp.Client()
+        try:
+            await client.connect(config.ftp_host, config.ftp_port)
+            await client.login(config.ftp_user, config.ftp_pass)
+            logger.debug("[FTP] Entering %s...", config.ftp_profile_dir)
+            await client.change_directory(config.ftp_profile_dir)
+            logger.debug("[FTP] Entering %s...", config.ftp_savegame_dir)
+            await client.change_directory(config.ftp_savegame_dir)
+        except BaseException:
+            client.close()
+            raise
+        return client
+
+    async def _is_alive(self, client: aioftp.Client) -> bool:
+        try:
+            await client.command("NOOP", "2xx")
+            return True
+        except aioftp.StatusCodeError:
+            # Любой ответ сервера означает, что управляющее соединение живо
+            return True
+        except Exception as e:
+            logger.warning("[FTP] Сессия не отвечает на NOOP: %s", e)
+            return False
+
+    async def _take(self) -> aioftp.Client:
+        while self._idle:
+            client, parked_at = self._idle.pop()
+            if time.monotonic() - parked_at > self.idle_timeout:
+                client.close()
+                continue
+            if await self._is_alive(client):
+                return client
+            client.close()
+        return await self._connect()
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[aioftp.Client]:
+        """Выдаёт готовую к скачиванию сессию и возвращает её в пул."""
+        async with self._slots:
+            with metrics.timer("ftp_session_seconds"):
+                client = await self._take()
+            try:
+                yield client
+            except BaseException:
+                # Состояние соединения после ошибки неизвестно — не паркуем его
+                client.close()
+                raise
+            else:
+                self._idle.append((client, time.monotonic()))
+
+    async def close(self) -> None:
+        """Закрывает все простаивающие соединения."""
+        while self._idle:
+            client, _ = self._idle.pop()
+            try:
+                await asyncio.wait_for(client.quit(), timeout=5)
+            except Exception:
+                client.close()
+
+
+ftp_pool = FTPSessionPool(
+    max_size=config.ftp_pool_size,
+    idle_timeout=config.ftp_idle_timeout,
+)
+
+
+_file_cache = ConditionalCache()
+
+
+async def _remote_version(
+    ftp_client: aioftp.Client, file_name: str
+) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """Return ``(MDTM, SIZE)`` of the remote file or ``None`` if unsupported."""
+    values = []
+    for command in ("MDTM", "SIZE"):
+        try:
+            _, info = await ftp_client.command(f"{command} {file_name}", "213")
+            values.append(info[0].strip() if info else None)
+        except aioftp.StatusCodeError:
+            values.append(None)
+    if not any(values):
+        return None
+    return values[0], values[1]
+
+
+async def _fetch_conditional(ftp_client: aioftp.Client, file_name: str) -> str:
+    """Download ``file_name`` unless MDTM/SIZE show it has not changed."""
+    with metrics.timer("ftp_fetch_seconds", file=file_name, mode="body") as timing:
+        if not config.conditional_fetch:
+            return await _download(ftp_client, file_name)
+        version = await _remote_version(ftp_client, file_name)
+        cached = _file_cache.lookup(file_name, version)
+        if cached is not None:
+            timing["result"] = "not_modified"
+            logger.debug(
+                "[FTP] %s не изменился (%s), используем кэш", file_name, version
+            )
+            return cached
+        data = await _download(ftp_client, file_name)
+        _file_cache.store(file_name, version, data)
+        return data
+
+
+async def _download(ftp_client: aioftp.Client, file_name: str) -> str:
+    logger.debug("[FTP] Downloading file: %s", file_name)
+    async with ftp_client.download_stream(file_name) as stream:
+        buffer = bytearray()
+        while True:
+            chunk = await stream.read(8192)
+            if not chunk:
+                break
+            buffer.extend(chunk)
+    logger.debug("[FTP] File %s downloaded. Size: %s bytes", file_name, len(buffer))
+    return buffer.decode("utf-8")
+
+
+async def fetch_file_parsed(file_name: str, extractor: "StreamExtractor") -> Any:
+    """Stream ``file_name`` straight into ``extractor`` and return its result.
+
+    The file is never held in memory as a whole; with ``conditional_fetch``
+    an unchanged file returns the previously extracted result. Returns
+    ``None`` on download or parse errors.
+    """
+    cache_key = f"{file_name}#{extractor.cache_key}"
+    try:
+        async with ftp_pool.session() as ftp_client:
+            with metrics.timer(
+                "ftp_fetch_seconds", file=file_name, mode="stream"
+            ) as timing:
+                version = None
+                if config.conditional_fetch:
+                    version = await _remote_version(ftp_client, file_name)
+                    entry = _file_cache.get(cache_key)
+                    if entry is not None and version and entry.validator == version:
+                        logger.debug(
+                            "[FTP] %s не изменился (%s), используем кэш",
+                            file_name,
+                            version,
+                        )
+                        timing["result"] = "not_modified"
+                        extractor.finished = True
+                        return entry.body
+                logger.debug("[FTP] Streaming file: %s", file_name)
+                size = 0
+                async with ftp_client.download_stream(file_name) as stream:
+                    while True:
+                        chunk = await stream.read(65536)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        extractor.feed(chunk)
+                value = extractor.close()
+                logger.debug(
+                    "[FTP] File %s parsed on the fly. Size: %s bytes", file_name, size
                 )
-                return buffer.decode("utf-8")
+                if config.conditional_fetch:
+                    _file_cache.store(cache_key, version, value)
+                return value
+    except Exception as e:
+        logger.error("[FTP] ❌ Error streaming file '%s': %s", file_name, e)
+        return None
+
+
+async def fetch_file(file_name: str) -> Optional[str]:
+    """Download a file from the configured FTP server."""
+    try:
+        async with ftp_pool.session() as ftp_client:
+            return await _fetch_conditional(ftp_client, file_name)
     except Exception as e:
-        log_debug(f"[FTP] ❌ Error downloading file '{file_name}': {e}")
+        logger.error("[FTP] ❌ Error downloading file '%s': %s", file_name, e)
         return None
@@ -1,26 +1,31 @@
 """Entry point for launching the Discord bot."""
 
 import asyncio
+import logging
 
 import aiohttp
+from aiohttp import web
 import asyncpg
 import inspect
 import discord
 from discord import app_commands
 
-from bot.updater import (
-    api_polling_task,
-    cleanup_old_online_history_task,
-    ftp_polling_task,
-    save_online_history_task,
-)
+from bot.status_message import StatusMessage
+from bot.updater import schedule_background_jobs
 from commands.online_month import setup as setup_online_month
 from commands.top7lastweek import setup as setup_top7lastweek
 from commands.top7week import setup as setup_top7week
 from commands.top_total import setup as setup_top_total
 from config.config import config
-from utils.logger import log_debug
-from utils.total_time_updater import total_time_update_task
+from ftp.fetcher import ftp_pool
+from storage import Storage, create_storage
+from utils.executor import executor_stage
+from utils.graph_renderer import graph_renderer
+from utils.logger import setup_logging, stop_logging
+from utils.metrics import start_metrics_server
+from utils.scheduler import scheduler
+
+logger = logging.getLogger(__name__)
 
 
 def handle_task_exception(task: asyncio.Task) -> None:
@@ -28,7 +33,7 @@ def handle_task_exception(task: asyncio.Task) -> None:
     try:
         task.result()
     except Exception as e:
-        log_debug(f"[ERROR] Задача завершилась с ошибкой: {e}")
+        logger.error("[ERROR] Задача завершилась с ошибкой: %s", e)
 
 
 class MyBot(discord.Client):
@@ -38,17 +43,9 @@ class MyBot(discord.Client):
         super().__init__(intents=intents)
         self.tree = app_commands.CommandTree(self)
         self.tasks: list[asyncio.Task] = []
-        self.db_pool = None
+        self.storage: Storage | None = None
         self.http_session: aiohttp.ClientSession | None = None
-
-    async def _ensure_indexes(self) -> None:
-        """Create required database indexes if they do not exist."""
-        await self.db_pool.execute(
-            """
-            CREATE INDEX IF NOT EXISTS idx_online_name_date_hour
-            ON player_online_history (player_name, date, hour)
-            """
-        )
+        self.metrics_runner: web.AppRunner | None = None
 
     async def close(self) -> None:
         """Gracefully shutdown background tasks and resources."""
@@ -56,41 +53,37 @@ class MyBot(discord.Client):
             task.cancel()
         if self.tasks:
             await asyncio.gather(*self.tasks, return_exceptions=True)
-        if self.db_pool:
-            await self.db_pool.close()
+        if self.storage:
+            await self.storage.close()
         if self.http_session:
             await self.http_session.close()
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
+        await ftp_pool.close()
+        executor_stage.shutdown()
+        graph_renderer.shutdown()
         await super().close()
 
     async def setup_hook(self) -> None:
         """Called by discord.py when the client is ready."""
-        print("[DEBUG] asyncpg path:", inspect.getfile(asyncpg))
-        self.db_pool = await asyncpg.create_pool(dsn=config.postgres_url)
-        await self._ensure_indexes()
+        logger.debug("[DEBUG] asyncpg path: %s", inspect.getfile(asyncpg))
+        if config.metrics_port:
+            self.metrics_runner = await start_metrics_server(
+                config.metrics_host, config.metrics_port
+            )
+        self.storage = create_storage()
+        await self.storage.start()
+        logger.info("[DB] Хранилище: %s", self.storage.name)
+
+        graph_renderer.start()
 
         timeout = aiohttp.ClientTimeout(total=10)
         self.http_session = aiohttp.ClientSession(timeout=timeout)
 
-        task = asyncio.create_task(api_polling_task(self.http_session))
-        task.add_done_callback(handle_task_exception)
-        self.tasks.append(task)
-
-        task = asyncio.create_task(ftp_polling_task(self, self.http_session))
-        task.add_done_callback(handle_task_exception)
-        self.tasks.append(task)
-
-        task = asyncio.create_task(save_online_history_task(self, self.http_session))
-        task.add_done_callback(handle_task_exception)
-        self.tasks.append(task)
-
-        task = asyncio.create_task(cleanup_old_online_history_task(self))
-        task.add_done_callback(handle_task_exception)
-        self.tasks.append(task)
-
-        task = asyncio.create_task(total_time_update_task(self))
+        task = asyncio.create_task(self.run_scheduler())
         task.add_done_callback(handle_task_exception)
         self.tasks.append(task)
-        log_debug("[SETUP] Background tasks started")
+        logger.info("[SETUP] Background tasks started")
 
         setup_top7week(self.tree)
 
@@ -99,12 +92,26 @@ class MyBot(discord.Client):
         setup_top_total(self.tree)
         setup_online_month(self.tree)
         await self.tree.sync()
-        log_debug("[SYNC] Slash-команды успешно синхронизированы")
-        log_debug("[Slash] Команды синхронизированы")
+        logger.info("[SYNC] Slash-команды успешно синхронизированы")
+        logger.info("[Slash] Команды синхронизированы")
+
+    async def run_scheduler(self) -> None:
+        """Registers background jobs once the client is ready and runs them."""
+        await self.wait_until_ready()
+        status_message = None
+        try:
+            channel = await self.fetch_channel(config.channel_id)
+        except discord.DiscordException as e:
+            # Без канала не обновляется только сообщение со статистикой
+            logger.error("❌ Канал не найден или недоступен: %s", e)
+        else:
+            status_message = StatusMessage(self, channel)
+        schedule_background_jobs(scheduler, self, self.http_session, status_message)
+        await scheduler.run(self.storage)
 
     async def on_ready(self) -> None:
         """Log successful authorization."""
-        log_debug(f"Discord-бот авторизован как {self.user}")
+        logger.info("Discord-бот авторизован как %s", self.user)
 
     async def on_message(self, message: discord.Message) -> None:
         """Обрабатывает текстовые сообщения (команды больше не используются)."""
@@ -113,17 +120,20 @@ class MyBot(discord.Client):
 
 
 if __name__ == "__main__":
+    setup_logging()
     intents = discord.Intents.default()
     intents.messages = True
     intents.guilds = True
 
     bot = MyBot(intents=intents)
 
-    log_debug("Запускаем Discord-бота")
+    logger.info("Запускаем Discord-бота")
     try:
-        bot.run(config.discord_token)
+        # Вывод discord.py идёт через общий корневой логгер
+        bot.run(config.discord_token, log_handler=None)
     except KeyboardInterrupt:
-        log_debug("[MAIN] Прерывание, останавливаем бота")
+        logger.info("[MAIN] Прерывание, останавливаем бота")
         asyncio.run(bot.close())
     finally:
-        log_debug("Discord-бот остановлен")
+        logger.info("Discord-бот остановлен")
+        stop_logging()
@@ -0,0 +1,23 @@
+"""Storage engines for online history, tops and bot state."""
+
+from config.config import config
+from storage.base import Storage
+
+
+def create_storage() -> Storage:
+    """Возвращает движок хранилища, выбранный в ``STORAGE_BACKEND``."""
+    # Движки импортируются по требованию: они сами импортируют модули utils,
+    # которым нужен ``storage.base``
+    if config.storage_backend == "postgres":
+        from storage.postgres import PostgresStorage
+
+        return PostgresStorage()
+    if config.storage_backend == "sqlite":
+        if config.presence_model == "sessions":
+            raise ValueError(
+                "PRESENCE_MODEL=sessions requires STORAGE_BACKEND=postgres"
+            )
+        from storage.sqlite import SQLiteStorage
+
+        return SQLiteStorage(config.sqlite_path)
+    raise ValueError(f"Unknown STORAGE_BACKEND {config.storage_backend!r}")
@@ -0,0 +1,85 @@
+"""Интерфейс хранилища истории онлайна, топов и состояния бота."""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from typing import List, Optional, Sequence, Tuple
+
+# (имя игрока, часы)
+TopRows = List[Tuple[str, int]]
+
+
+class Storage(ABC):
+    """Всё, что бот читает и пишет в базу, за одним интерфейсом.
+
+    Кэширование ответов (``utils.query_cache``) и инвалидация остаются на
+    стороне вызывающего кода; движок отвечает только за данные.
+    """
+
+    name: str
+
+    @abstractmethod
+    async def start(self) -> None:
+        """Открывает соединения и приводит схему к актуальной версии."""
+
+    @abstractmethod
+    async def close(self) -> None:
+        ...
+
+    @abstractmethod
+    async def get_state(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set_state(self, key: str, value: str) -> None:
+        ...
+
+    @abstractmethod
+    async def write_online(self, rows: Sequence[Tuple[str, datetime]]) -> None:
+        """Записывает строки ``(игрок, время среза)``; повторы пропускаются."""
+
+    @abstractmethod
+    async def top_hours(self, start: datetime, end: datetime, limit: int) -> TopRows:
+        """Игроки с наибольшим числом активных часов в ``[start, end)``."""
+
+    @abstractmethod
+    async def hourly_counts(
+        self, start: datetime, now: datetime
+    ) -> List[Tuple[int, int]]:
+        """Уникальные игроки по часу суток ``(час, число)`` начиная со ``start``."""
+
+    @abstractmethod
+    async def daily_counts(self, days: int, now: datetime) -> List[Tuple[date, int]]:
+        """Уникальные игроки по дням ``(день, число)`` за последние ``days`` дней."""
+
+    @abstractmethod
+    async def update_total_time(self, mode: str) -> Optional[str]:
+        """Пересчитывает общее время; ``None`` — нет данных для обновления."""
+
+    @abstractmethod
+    async def top_total(self, limit: int) -> Tuple[TopRows, int]:
+        """Топ по общему времени и общее число игроков в таблице."""
+
+    @abstractmethod
+    async def replace_weekly_top(self, rows: TopRows) -> None:
+        """Заменяет архив топа прошлой недели."""
+
+    @abstractmethod
+    async def top_last_week(self, limit: int) -> TopRows:
+        ...
+
+    @abstractmethod
+    async def cleanup(self, now: datetime) -> None:
+        """Удаляет данные старше срока хранения."""
+
+    # Модель сессий (``PRESENCE_MODEL=sessions``) есть не у всех движков;
+    # ``create_storage`` не сочетает её с движками без поддержки
+
+    async def observe_sessions(self, players: Sequence[str], now: datetime) -> None:
+        """Открывает и закрывает сессии по списку игроков онлайн на ``now``."""
+        raise NotImplementedError(f"{self.name}: сессии не поддерживаются")
+
+    async def close_stale_sessions(self, now: datetime) -> None:
+        """Закрывает сессии, оставшиеся открытыми после перерыва в опросах."""
+        raise NotImplementedError(f"{self.name}: сессии не поддерживаются")
@@ -0,0 +1,185 @@
+"""Движок хранилища на PostgreSQL (asyncpg).
+
+Запросы к истории, сводке, сессиям и общему времени живут в своих модулях
+``utils``; здесь они собраны за интерфейсом ``Storage``. Здесь же
+зарегистрированы запросы команд и графиков.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime
+from typing import List, Optional, Sequence, Tuple
+
+from asyncpg import Pool
+
+from config.config import (
+    ONLINE_HOURLY_TABLE,
+    PLAYERS_TABLE,
+    TOTAL_TOP_TABLE,
+    WEEKLY_TOP_LAST_TABLE,
+    cleanup_history_days,
+    config,
+)
+from storage.base import Storage, TopRows
+from utils import bot_state, statements
+from utils.helpers import get_moscow_datetime
+from utils.migrations import run_migrations
+from utils.online_rollup import fetch_top_hours, write_online_rows
+from utils.partitions import ensure_online_partitions, maintain_online_partitions
+from utils.players import player_registry
+from utils.sessions import (
+    SESSIONS_CLEANUP,
+    SESSIONS_DAILY_COUNTS,
+    SESSIONS_HOURLY_COUNTS,
+    session_tracker,
+)
+from utils.total_time_updater import refresh_total_time
+
+logger = logging.getLogger(__name__)
+
+DAILY_ONLINE_COUNTS = statements.register(
+    "daily_online_counts",
+    f"""
+    SELECT EXTRACT(HOUR FROM bucket) AS hour,
+           COUNT(DISTINCT player_id) AS count
+    FROM {ONLINE_HOURLY_TABLE}
+    WHERE bucket >= date_trunc('hour', $1::timestamp)
+    GROUP BY EXTRACT(HOUR FROM bucket)
+    ORDER BY hour
+    """,
+)
+
+MONTH_ONLINE_COUNTS = statements.register(
+    "month_online_counts",
+    f"""
+    SELECT DATE(bucket) AS day,
+           COUNT(DISTINCT player_id) AS count
+    FROM {ONLINE_HOURLY_TABLE}
+    WHERE bucket >= date_trunc('hour', NOW() - make_interval(days => $1))
+    GROUP BY DATE(bucket)
+    ORDER BY day
+    """,
+)
+
+# Часы игрока и общее число строк считаются одним запросом через оконную функцию
+TOP_TOTAL = statements.register(
+    "top_total",
+    f"""
+    SELECT p.name AS player_name, t.total_hours,
+           COUNT(*) OVER () AS total_count
+    FROM {TOTAL_TOP_TABLE} t
+    JOIN {PLAYERS_TABLE} p ON p.id = t.player_id
+    ORDER BY t.total_hours DESC, p.name
+    LIMIT $1
+    """,
+)
+
+TOP_LAST_WEEK = statements.register(
+    "top_last_week",
+    f"SELECT p.name AS player_name, t.hours FROM {WEEKLY_TOP_LAST_TABLE} t "
+    f"JOIN {PLAYERS_TABLE} p ON p.id = t.player_id "
+    "ORDER BY t.hours DESC, p.name LIMIT $1",
+)
+
+WEEKLY_TOP_INSERT = statements.register(
+    "weekly_top_insert",
+    f"""
+    INSERT INTO {WEEKLY_TOP_LAST_TABLE} (player_id, hours)
+    SELECT p.id, t.hours
+    FROM unnest($1::text[], $2::int[]) AS t(name, hours)
+    JOIN {PLAYERS_TABLE} p ON p.name = t.name
+    ON CONFLICT (player_id) DO UPDATE
+    SET hours = EXCLUDED.hours
+    """,
+)
+
+
+class PostgresStorage(Storage):
+    """Хранилище в PostgreSQL: партиции, сводка, подготовленные запросы."""
+
+    name = "postgres"
+
+    def __init__(self) -> None:
+        self.pool: Optional[Pool] = None
+
+    async def start(self) -> None:
+        self.pool = await statements.create_pool()
+        applied = await run_migrations(self.pool)
+        if applied:
+            # Соединения, открытые до миграций, заново подготовят запросы
+            await self.pool.expire_connections()
+        await player_registry.warm(self.pool)
+        await ensure_online_partitions(self.pool)
+        if config.presence_model == "sessions":
+            await self.close_stale_sessions(get_moscow_datetime())
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+
+    async def get_state(self, key: str) -> Optional[str]:
+        return await bot_state.get_state(self.pool, key)
+
+    async def set_state(self, key: str, value: str) -> None:
+        await bot_state.set_state(self.pool, key, value)
+
+    async def write_online(self, rows: Sequence[Tuple[str, datetime]]) -> None:
+        await write_online_rows(self.pool, rows)
+
+    async def top_hours(self, start: datetime, end: datetime, limit: int) -> TopRows:
+        return await fetch_top_hours(self.pool, start, end, limit)
+
+    async def hourly_counts(
+        self, start: datetime, now: datetime
+    ) -> List[Tuple[int, int]]:
+        if config.presence_model == "sessions":
+            rows = await statements.fetch(self.pool, SESSIONS_HOURLY_COUNTS, start, now)
+        else:
+            rows = await statements.fetch(self.pool, DAILY_ONLINE_COUNTS, start)
+        return [(int(r["hour"]), int(r["count"])) for r in rows]
+
+    async def daily_counts(self, days: int, now: datetime) -> List[Tuple[date, int]]:
+        if config.presence_model == "sessions":
+            rows = await statements.fetch(self.pool, SESSIONS_DAILY_COUNTS, days, now)
+        else:
+            rows = await statements.fetch(self.pool, MONTH_ONLINE_COUNTS, days)
+        return [(r["day"], int(r["count"])) for r in rows]
+
+    async def update_total_time(self, mode: str) -> Optional[str]:
+        return await refresh_total_time(self.pool, mode)
+
+    async def top_total(self, limit: int) -> Tuple[TopRows, int]:
+        rows = await statements.fetch(self.pool, TOP_TOTAL, limit)
+        if not rows:
+            return ([], 0)
+        return (
+            [(r["player_name"], int(r["total_hours"])) for r in rows],
+            int(rows[0]["total_count"]),
+        )
+
+    async def replace_weekly_top(self, rows: TopRows) -> None:
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(f"TRUNCATE TABLE {WEEKLY_TOP_LAST_TABLE}")
+                await statements.execute(
+                    conn,
+                    WEEKLY_TOP_INSERT,
+                    [name for name, _ in rows],
+                    [hours for _, hours in rows],
+                )
+
+    async def top_last_week(self, limit: int) -> TopRows:
+        rows = await statements.fetch(self.pool, TOP_LAST_WEEK, limit)
+        return [(r["player_name"], int(r["hours"])) for r in rows]
+
+    async def cleanup(self, now: datetime) -> None:
+        logger.info("[DB] Обслуживаем партиции истории онлайна")
+        await maintain_online_partitions(self.pool)
+        await statements.execute(self.pool, SESSIONS_CLEANUP, now, cleanup_history_days)
+
+    async def observe_sessions(self, players: Sequence[str], now: datetime) -> None:
+        await session_tracker.observe(self.pool, players, now)
+
+    async def close_stale_sessions(self, now: datetime) -> None:
+        await session_tracker.close_stale(self.pool, now)
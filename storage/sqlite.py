@@ -0,0 +1,426 @@
+"""Встроенный движок хранилища на SQLite для небольших установок.
+
+База — один файл в режиме WAL: чтение не блокируется записью, а
+``synchronous=NORMAL`` не делает fsync на каждый коммит. Все обращения идут
+через единственный поток ``ExecutorStage``, поэтому event loop не ждёт диск,
+а соединение используется строго последовательно. Схема повторяет
+PostgreSQL-версию без партиций: срезы, почасовая сводка, общее время и
+архив недельного топа. Поддерживается только ``PRESENCE_MODEL=samples``.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from config.config import (
+    ONLINE_HOURLY_TABLE,
+    ONLINE_MIN_SAMPLES_PER_HOUR,
+    PLAYERS_TABLE,
+    TOTAL_TOP_TABLE,
+    WEEKLY_TOP_LAST_TABLE,
+    cleanup_history_days,
+    config,
+)
+from storage.base import Storage, TopRows
+from utils.bot_state import STATE_TABLE
+from utils.executor import ExecutorStage
+from utils.helpers import get_moscow_datetime
+from utils.query_cache import TOPIC_ONLINE, query_cache
+from utils.total_time_updater import TOTAL_TIME_MODE_KEY, TOTAL_TIME_WATERMARK_KEY
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TABLE = "player_online_history"
+SCHEMA_VERSION = 1
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {PLAYERS_TABLE} (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (
+    player_id INTEGER NOT NULL,
+    check_time TEXT NOT NULL,
+    PRIMARY KEY (player_id, check_time)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_history_check_time
+    ON {HISTORY_TABLE} (check_time);
+CREATE TABLE IF NOT EXISTS {ONLINE_HOURLY_TABLE} (
+    bucket TEXT NOT NULL,
+    player_id INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    PRIMARY KEY (bucket, player_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS {TOTAL_TOP_TABLE} (
+    player_id INTEGER PRIMARY KEY,
+    total_hours INTEGER NOT NULL DEFAULT 0,
+    total_seconds INTEGER,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_total_hours ON {TOTAL_TOP_TABLE} (total_hours DESC);
+CREATE TABLE IF NOT EXISTS {WEEKLY_TOP_LAST_TABLE} (
+    player_id INTEGER PRIMARY KEY,
+    hours INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _ts(moment: datetime) -> str:
+    """Время в текстовом виде, сравнимом как строка."""
+    return moment.isoformat(sep=" ", timespec="microseconds")
+
+
+def _hour(moment: datetime) -> str:
+    """Начало часа в формате колонки ``bucket``; им же задаются границы."""
+    return moment.replace(minute=0, second=0, microsecond=0).isoformat(sep=" ")
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _open(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        conn.executescript(
+            f"BEGIN; {SCHEMA} PRAGMA user_version={SCHEMA_VERSION}; COMMIT;"
+        )
+        logger.info("[SQLITE] Схема обновлена до версии %s", SCHEMA_VERSION)
+    return conn
+
+
+def _get_state(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row = conn.execute(
+        f"SELECT value FROM {STATE_TABLE} WHERE key = ?", (key,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _set_state(conn: sqlite3.Connection, key: str, value: str) -> None:
+    conn.execute(
+        f"""
+        INSERT INTO {STATE_TABLE} (key, value) VALUES (?, ?)
+        ON CONFLICT (key) DO UPDATE SET value = excluded.value
+        """,
+        (key, value),
+    )
+
+
+def _player_ids(conn: sqlite3.Connection, names: Sequence[str]) -> dict:
+    unique = list(dict.fromkeys(names))
+    conn.executemany(
+        f"INSERT OR IGNORE INTO {PLAYERS_TABLE} (name) VALUES (?)",
+        [(name,) for name in unique],
+    )
+    placeholders = ",".join("?" * len(unique))
+    return dict(
+        conn.execute(
+            f"SELECT name, id FROM {PLAYERS_TABLE} WHERE name IN ({placeholders})",
+            unique,
+        )
+    )
+
+
+def _write_online(
+    conn: sqlite3.Connection, rows: Sequence[Tuple[str, datetime]]
+) -> None:
+    # В сводку попадают только реально вставленные срезы, как в PostgreSQL
+    with _transaction(conn):
+        ids = _player_ids(conn, [name for name, _ in rows])
+        samples: Counter = Counter()
+        for name, check_time in rows:
+            cur = conn.execute(
+                f"INSERT OR IGNORE INTO {HISTORY_TABLE} (player_id, check_time) "
+                "VALUES (?, ?)",
+                (ids[name], _ts(check_time)),
+            )
+            if cur.rowcount:
+                samples[(_hour(check_time), ids[name])] += 1
+        conn.executemany(
+            f"""
+            INSERT INTO {ONLINE_HOURLY_TABLE} (bucket, player_id, samples)
+            VALUES (?, ?, ?)
+            ON CONFLICT (bucket, player_id) DO UPDATE
+                SET samples = samples + excluded.samples
+            """,
+            [(bucket, pid, count) for (bucket, pid), count in samples.items()],
+        )
+        if samples:
+            _rewind_total_time(conn, min(bucket for bucket, _ in samples))
+
+
+def _rewind_total_time(conn: sqlite3.Connection, hour: str) -> None:
+    # Запоздавшие срезы за уже учтённые часы: вычитаем эти часы из итогов
+    # и откатываем отметку, чтобы следующий прогон пересчитал их заново
+    if config.total_time_mode != "incremental":
+        return
+    watermark = _get_state(conn, TOTAL_TIME_WATERMARK_KEY)
+    if watermark is None or watermark <= hour:
+        return
+    conn.executemany(
+        f"""
+        UPDATE {TOTAL_TOP_TABLE} SET total_hours = total_hours - ?
+        WHERE player_id = ?
+        """,
+        [(hours, pid) for pid, hours in _hours_between(conn, hour, watermark)],
+    )
+    _set_state(conn, TOTAL_TIME_WATERMARK_KEY, hour)
+
+
+def _top_hours(
+    conn: sqlite3.Connection, start: datetime, end: datetime, limit: int
+) -> TopRows:
+    return conn.execute(
+        f"""
+        SELECT p.name, t.hours
+        FROM (
+            SELECT player_id, COUNT(*) AS hours
+            FROM {ONLINE_HOURLY_TABLE}
+            WHERE bucket >= ? AND bucket < ? AND samples >= ?
+            GROUP BY player_id
+        ) AS t
+        JOIN {PLAYERS_TABLE} p ON p.id = t.player_id
+        ORDER BY t.hours DESC, p.name
+        LIMIT ?
+        """,
+        (_hour(start), _hour(end), ONLINE_MIN_SAMPLES_PER_HOUR, limit),
+    ).fetchall()
+
+
+def _hourly_counts(conn: sqlite3.Connection, start: datetime) -> List[Tuple[int, int]]:
+    return conn.execute(
+        f"""
+        SELECT CAST(strftime('%H', bucket) AS INTEGER) AS hour,
+               COUNT(DISTINCT player_id)
+        FROM {ONLINE_HOURLY_TABLE}
+        WHERE bucket >= ?
+        GROUP BY hour
+        ORDER BY hour
+        """,
+        (_hour(start),),
+    ).fetchall()
+
+
+def _daily_counts(conn: sqlite3.Connection, start: datetime) -> List[Tuple[date, int]]:
+    rows = conn.execute(
+        f"""
+        SELECT date(bucket) AS day, COUNT(DISTINCT player_id)
+        FROM {ONLINE_HOURLY_TABLE}
+        WHERE bucket >= ?
+        GROUP BY day
+        ORDER BY day
+        """,
+        (_hour(start),),
+    ).fetchall()
+    return [(date.fromisoformat(day), count) for day, count in rows]
+
+
+def _hours_between(
+    conn: sqlite3.Connection, start: Optional[str], end: Optional[str]
+) -> List[Tuple[int, int]]:
+    return conn.execute(
+        f"""
+        SELECT player_id, COUNT(*)
+        FROM {ONLINE_HOURLY_TABLE}
+        WHERE (? IS NULL OR bucket >= ?) AND (? IS NULL OR bucket < ?)
+          AND samples >= ?
+        GROUP BY player_id
+        """,
+        (start, start, end, end, ONLINE_MIN_SAMPLES_PER_HOUR),
+    ).fetchall()
+
+
+def _update_total_time(
+    conn: sqlite3.Connection, mode: str, now: datetime
+) -> Optional[str]:
+    updated_at = _ts(now)
+    with _transaction(conn):
+        # Итоги окна перезаписали накопленные: начинаем отсчёт заново
+        if _get_state(conn, TOTAL_TIME_MODE_KEY) != mode:
+            conn.execute(
+                f"DELETE FROM {STATE_TABLE} WHERE key = ?", (TOTAL_TIME_WATERMARK_KEY,)
+            )
+            _set_state(conn, TOTAL_TIME_MODE_KEY, mode)
+        if mode == "incremental":
+            cutoff = _hour(now)
+            watermark = _get_state(conn, TOTAL_TIME_WATERMARK_KEY)
+            if watermark is not None and watermark >= cutoff:
+                return "UP TO DATE"
+            rows = _hours_between(conn, watermark, cutoff)
+            if watermark is None:
+                conn.execute(f"DELETE FROM {TOTAL_TOP_TABLE}")
+            cur = conn.executemany(
+                f"""
+                INSERT INTO {TOTAL_TOP_TABLE} (player_id, total_hours, updated_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT (player_id) DO UPDATE
+                    SET total_hours = total_hours + excluded.total_hours,
+                        updated_at = excluded.updated_at
+                """,
+                [(pid, hours, updated_at) for pid, hours in rows],
+            )
+            _set_state(conn, TOTAL_TIME_WATERMARK_KEY, cutoff)
+        else:
+            start = _hour(now - timedelta(days=cleanup_history_days))
+            rows = _hours_between(conn, start, None)
+            if not rows:
+                return None
+            cur = conn.executemany(
+                f"""
+                INSERT INTO {TOTAL_TOP_TABLE} (player_id, total_hours, updated_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT (player_id) DO UPDATE
+                    SET total_hours = excluded.total_hours,
+                        updated_at = excluded.updated_at
+                    WHERE total_hours IS NOT excluded.total_hours
+                """,
+                [(pid, hours, updated_at) for pid, hours in rows],
+            )
+        return f"UPSERT {cur.rowcount}"
+
+
+def _top_total(conn: sqlite3.Connection, limit: int) -> Tuple[TopRows, int]:
+    rows = conn.execute(
+        f"""
+        SELECT p.name, t.total_hours, COUNT(*) OVER ()
+        FROM {TOTAL_TOP_TABLE} t
+        JOIN {PLAYERS_TABLE} p ON p.id = t.player_id
+        ORDER BY t.total_hours DESC, p.name
+        LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+    if not rows:
+        return ([], 0)
+    return ([(name, hours) for name, hours, _ in rows], rows[0][2])
+
+
+def _replace_weekly_top(conn: sqlite3.Connection, rows: TopRows) -> None:
+    with _transaction(conn):
+        conn.execute(f"DELETE FROM {WEEKLY_TOP_LAST_TABLE}")
+        conn.executemany(
+            f"""
+            INSERT OR REPLACE INTO {WEEKLY_TOP_LAST_TABLE} (player_id, hours)
+            SELECT id, ? FROM {PLAYERS_TABLE} WHERE name = ?
+            """,
+            [(hours, name) for name, hours in rows],
+        )
+
+
+def _top_last_week(conn: sqlite3.Connection, limit: int) -> TopRows:
+    return conn.execute(
+        f"""
+        SELECT p.name, t.hours
+        FROM {WEEKLY_TOP_LAST_TABLE} t
+        JOIN {PLAYERS_TABLE} p ON p.id = t.player_id
+        ORDER BY t.hours DESC, p.name
+        LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+
+
+def _cleanup(conn: sqlite3.Connection, now: datetime) -> int:
+    # Граница по суткам, как при удалении суточных партиций в PostgreSQL
+    cutoff = (now - timedelta(days=cleanup_history_days)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    with _transaction(conn):
+        deleted = conn.execute(
+            f"DELETE FROM {HISTORY_TABLE} WHERE check_time < ?", (_ts(cutoff),)
+        ).rowcount
+        deleted += conn.execute(
+            f"DELETE FROM {ONLINE_HOURLY_TABLE} WHERE bucket < ?", (_hour(cutoff),)
+        ).rowcount
+    conn.execute("PRAGMA optimize")
+    return deleted
+
+
+class SQLiteStorage(Storage):
+    """Хранилище в локальном файле SQLite."""
+
+    name = "sqlite"
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        # Один поток: соединение SQLite не используется параллельно
+        self._stage = ExecutorStage(kind="thread", workers=1, queue_size=64)
+
+    async def _run(self, job: str, func: Callable[..., Any], *args: Any) -> Any:
+        return await self._stage.run(f"sqlite_{job}", func, self._conn, *args)
+
+    async def start(self) -> None:
+        self._conn = await self._stage.run("sqlite_open", _open, self.path)
+        logger.info("[SQLITE] База открыта: %s", self.path)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._run("close", sqlite3.Connection.close)
+            self._conn = None
+        self._stage.shutdown()
+
+    async def get_state(self, key: str) -> Optional[str]:
+        return await self._run("get_state", _get_state, key)
+
+    async def set_state(self, key: str, value: str) -> None:
+        await self._run("set_state", _set_state, key, value)
+
+    async def write_online(self, rows: Sequence[Tuple[str, datetime]]) -> None:
+        if rows:
+            await self._run("write_online", _write_online, list(rows))
+
+    async def top_hours(self, start: datetime, end: datetime, limit: int) -> TopRows:
+        return await self._run("top_hours", _top_hours, start, end, limit)
+
+    async def hourly_counts(
+        self, start: datetime, now: datetime
+    ) -> List[Tuple[int, int]]:
+        return await self._run("hourly_counts", _hourly_counts, start)
+
+    async def daily_counts(self, days: int, now: datetime) -> List[Tuple[date, int]]:
+        return await self._run(
+            "daily_counts", _daily_counts, now - timedelta(days=days)
+        )
+
+    async def update_total_time(self, mode: str) -> Optional[str]:
+        return await self._run(
+            "update_total_time", _update_total_time, mode, get_moscow_datetime()
+        )
+
+    async def top_total(self, limit: int) -> Tuple[TopRows, int]:
+        return await self._run("top_total", _top_total, limit)
+
+    async def replace_weekly_top(self, rows: TopRows) -> None:
+        await self._run("replace_weekly_top", _replace_weekly_top, list(rows))
+
+    async def top_last_week(self, limit: int) -> TopRows:
+        return await self._run("top_last_week", _top_last_week, limit)
+
+    async def cleanup(self, now: datetime) -> None:
+        deleted = await self._run("cleanup", _cleanup, now)
+        if deleted:
+            query_cache.invalidate(TOPIC_ONLINE)
+        logger.info("[SQLITE] Удалено старых строк: %s", deleted)
@@ -0,0 +1,73 @@
+import asyncio
+from datetime import timedelta
+
+import asyncpg
+
+from utils.helpers import get_moscow_datetime
+from utils.online_writer import OnlineWriteBuffer
+
+
+class FakeStorage:
+    def __init__(self):
+        self.rows = []
+        self.error = None
+        self.bad_times = set()
+
+    async def write_online(self, rows):
+        if self.error is not None:
+            raise self.error
+        if any(t in self.bad_times for _, t in rows):
+            raise ValueError("no partition of relation found for row")
+        self.rows.extend(rows)
+
+
+def test_unavailable_db_spools_and_replays(tmp_path):
+    buffer = OnlineWriteBuffer(spool_path=tmp_path / "spool.jsonl")
+    storage = FakeStorage()
+    now = get_moscow_datetime()
+
+    storage.error = asyncpg.PostgresConnectionError("down")
+    buffer.add(["a"], now)
+    assert asyncio.run(buffer.flush(storage)) is False
+    assert buffer.has_spool
+
+    storage.error = None
+    buffer.add(["b"], now + timedelta(minutes=15))
+    assert asyncio.run(buffer.flush(storage)) is True
+    assert sorted(name for name, _ in storage.rows) == ["a", "b"]
+    assert not buffer.has_spool
+
+
+def test_permanent_error_drops_only_the_bad_snapshot(tmp_path):
+    buffer = OnlineWriteBuffer(spool_path=tmp_path / "spool.jsonl")
+    storage = FakeStorage()
+    now = get_moscow_datetime()
+    bad = now - timedelta(days=1)
+    storage.bad_times.add(bad)
+
+    buffer.add(["old"], bad)
+    buffer.add(["a"], now)
+    assert asyncio.run(buffer.flush(storage)) is True
+    assert [name for name, _ in storage.rows] == ["a"]
+
+    # Следующие сбросы не блокируются
+    buffer.add(["b"], now + timedelta(minutes=15))
+    assert asyncio.run(buffer.flush(storage)) is True
+    assert [name for name, _ in storage.rows] == ["a", "b"]
+
+
+def test_malformed_spool_lines_are_skipped(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    now = get_moscow_datetime()
+    spool.write_text(
+        f'{{"check_time": "{now.isoformat()}"}}\n'
+        f'{{"check_time": "{now.isoformat()}", "players": "a"}}\n'
+        f'{{"check_time": "{now.isoformat()}", "players": ["a"]}}\n'
+        '{"check_time": "2026-',
+        encoding="utf-8",
+    )
+    buffer = OnlineWriteBuffer(spool_path=spool)
+    storage = FakeStorage()
+    assert asyncio.run(buffer.flush(storage)) is True
+    assert [name for name, _ in storage.rows] == ["a"]
+    assert not buffer.has_spool
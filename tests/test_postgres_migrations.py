@@ -0,0 +1,132 @@
+import asyncio
+import os
+import re
+import uuid
+from datetime import timedelta
+
+import asyncpg
+import pytest
+
+from config.config import ONLINE_HOURLY_TABLE, ONLINE_MIN_SAMPLES_PER_HOUR
+from utils import statements
+from utils.helpers import get_moscow_datetime
+from utils.migrations import MIGRATIONS, run_migrations
+from utils.online_rollup import TOP_HOURS, write_online_rows
+from utils.partitions import HISTORY_TABLE, ensure_online_partitions
+from utils.players import player_registry
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set"
+)
+
+ALL_VERSIONS = [m.version for m in MIGRATIONS]
+
+
+async def _with_schema(test):
+    # Каждый тест работает в своей схеме и убирает её за собой
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    admin = await asyncpg.connect(TEST_DATABASE_URL)
+    await admin.execute(f"CREATE SCHEMA {schema}")
+
+    async def create_pool():
+        return await asyncpg.create_pool(
+            TEST_DATABASE_URL,
+            min_size=1,
+            max_size=2,
+            init=statements.init_connection,
+            server_settings={"search_path": schema},
+        )
+
+    try:
+        await test(create_pool)
+    finally:
+        await admin.execute(f"DROP SCHEMA {schema} CASCADE")
+        await admin.close()
+
+
+def test_migrations_apply_once():
+    async def test(create_pool):
+        pool = await create_pool()
+        try:
+            assert await run_migrations(pool) == ALL_VERSIONS
+            # Повторный запуск ничего не меняет
+            assert await run_migrations(pool) == []
+            applied = await pool.fetch(
+                "SELECT version FROM schema_migrations ORDER BY version"
+            )
+            assert [r["version"] for r in applied] == ALL_VERSIONS
+        finally:
+            await pool.close()
+
+    asyncio.run(_with_schema(test))
+
+
+def test_concurrent_runs_are_serialized():
+    async def test(create_pool):
+        pools = [await create_pool(), await create_pool()]
+        try:
+            results = await asyncio.gather(*(run_migrations(p) for p in pools))
+        finally:
+            for pool in pools:
+                await pool.close()
+        # Advisory-блокировка: каждую миграцию применяет ровно один процесс
+        assert sorted(v for applied in results for v in applied) == ALL_VERSIONS
+
+    asyncio.run(_with_schema(test))
+
+
+async def _plan(pool, sql, *args):
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            rows = await conn.fetch(f"EXPLAIN {sql}", *args)
+    return "\n".join(r[0] for r in rows)
+
+
+def test_hot_queries_use_indexes():
+    async def test(create_pool):
+        pool = await create_pool()
+        try:
+            await run_migrations(pool)
+            await player_registry.warm(pool)
+            await ensure_online_partitions(pool)
+            now = get_moscow_datetime().replace(minute=0, second=0, microsecond=0)
+            rows = [
+                (f"player{p}", now - timedelta(hours=h, minutes=m))
+                for p in range(20)
+                for h in range(1, 12)
+                for m in (0, 15, 30, 45)
+            ]
+            await write_online_rows(pool, rows)
+            await pool.execute("VACUUM ANALYZE")
+
+            plan = await _plan(
+                pool,
+                statements.STATEMENTS[TOP_HOURS],
+                now - timedelta(days=1),
+                now,
+                10,
+                ONLINE_MIN_SAMPLES_PER_HOUR,
+            )
+            assert re.search(
+                rf"Index Only Scan using {ONLINE_HOURLY_TABLE}_p\d{{8}}_bucket_\w+_idx",
+                plan,
+            ), plan
+
+            plan = await _plan(
+                pool,
+                f"SELECT COUNT(*) FROM {HISTORY_TABLE.name} "
+                "WHERE check_time >= $1 AND check_time < $2",
+                now - timedelta(hours=6),
+                now,
+            )
+            assert re.search(
+                rf"Bitmap Index Scan on {HISTORY_TABLE.name}_p\d{{8}}_check_time_idx",
+                plan,
+            ), plan
+        finally:
+            await pool.close()
+
+    asyncio.run(_with_schema(test))
@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta
+
+from config.config import ONLINE_MIN_SAMPLES_PER_HOUR
+from storage.sqlite import _open, _top_hours, _write_online
+
+
+def _samples(name, hour):
+    return [
+        (name, hour + timedelta(minutes=m)) for m in range(ONLINE_MIN_SAMPLES_PER_HOUR)
+    ]
+
+
+def test_top_hours_bounds(tmp_path):
+    conn = _open(tmp_path / "bot.db")
+    start = datetime(2026, 10, 12, 18)
+    end = start + timedelta(days=7)
+    _write_online(conn, _samples("first", start) + _samples("after", end))
+
+    # Первый час недели учитывается, час на правой границе — нет
+    assert _top_hours(conn, start, end, 10) == [("first", 1)]
+    assert _top_hours(conn, end, end + timedelta(days=7), 10) == [("after", 1)]
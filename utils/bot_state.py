@@ -0,0 +1,31 @@
+"""Небольшое key-value хранилище состояния бота в базе данных.
+
+Таблица ``bot_state`` создаётся миграциями (``utils.migrations``).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Optional
+
+STATE_TABLE = "bot_state"
+
+
+async def get_state(db: Any, key: str) -> Optional[str]:
+    """Возвращает значение по ключу; ``db`` — пул или соединение."""
+    rows = await db.fetch(f"SELECT value FROM {STATE_TABLE} WHERE key = $1", key)
+    return rows[0]["value"] if rows else None
+
+
+async def set_state(db: Any, key: str, value: str) -> None:
+    await db.execute(
+        f"""
+        INSERT INTO {STATE_TABLE} (key, value) VALUES ($1, $2)
+        ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+        """,
+        key,
+        value,
+    )
+
+
+async def delete_state(db: Any, key: str) -> None:
+    await db.execute(f"DELETE FROM {STATE_TABLE} WHERE key = $1", key)
@@ -0,0 +1,41 @@
+"""Кэш последних успешно загруженных файлов с валидаторами изменений."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional
+
+
+@dataclass
+class CachedBody:
+    """Последнее полученное содержимое и валидатор, с которым оно пришло."""
+
+    validator: Hashable
+    body: Any
+
+
+class ConditionalCache:
+    """Хранит тело файла вместе с признаком версии (MDTM/SIZE, ETag и т.п.).
+
+    Если источник сообщает тот же валидатор, что и при прошлой загрузке,
+    вместо повторного скачивания отдаётся сохранённое тело.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, CachedBody] = {}
+
+    def get(self, key: str) -> Optional[CachedBody]:
+        return self._entries.get(key)
+
+    def lookup(self, key: str, validator: Hashable) -> Optional[Any]:
+        """Возвращает тело, если сохранённый валидатор совпадает с ``validator``."""
+        entry = self._entries.get(key)
+        if entry is None or validator is None or entry.validator != validator:
+            return None
+        return entry.body
+
+    def store(self, key: str, validator: Hashable, body: Any) -> None:
+        if validator is None:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = CachedBody(validator, body)
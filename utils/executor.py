@@ -0,0 +1,120 @@
+"""Вынос тяжёлых синхронных задач (парсинг, графики) из event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+from config.config import config
+from utils.logger import setup_worker_logging
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _timed_call(
+    func: Callable[..., Any], *args: Any, **kwargs: Any
+) -> Tuple[Any, float]:
+    """Выполняет ``func`` в воркере и возвращает результат вместе со временем работы."""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def _noop() -> None:
+    pass
+
+
+def _init_process_worker(initializer: Optional[Callable[[], None]]) -> None:
+    setup_worker_logging()
+    if initializer is not None:
+        initializer()
+
+
+class ExecutorStage:
+    """Пул потоков или процессов с ограниченной очередью задач.
+
+    ``run`` ждёт свободного места, если в работе и очереди уже
+    ``workers + queue_size`` задач, — так event loop не накапливает
+    неограниченный хвост. Для каждого вида задач считается время ожидания
+    и выполнения. В режиме ``process`` функция и аргументы должны
+    сериализоваться через pickle.
+    """
+
+    def __init__(
+        self,
+        *,
+        kind: str,
+        workers: int,
+        queue_size: int,
+        initializer: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.kind = kind if kind in ("thread", "process") else "thread"
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.initializer = initializer
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _ensure_started(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_process_worker,
+                    initargs=(self.initializer,),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="stage",
+                    initializer=self.initializer,
+                )
+            self._slots = asyncio.Semaphore(self.workers + self.queue_size)
+            logger.info(
+                "[EXEC] Запущен пул (%s): воркеров %s, очередь %s",
+                self.kind,
+                self.workers,
+                self.queue_size,
+            )
+        return self._executor
+
+    async def run(
+        self, job: str, func: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> Any:
+        """Выполняет ``func(*args, **kwargs)`` вне event loop и возвращает результат."""
+        executor = self._ensure_started()
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        async with self._slots:
+            call = functools.partial(_timed_call, func, *args, **kwargs)
+            result, run_time = await loop.run_in_executor(executor, call)
+        wait = max(0.0, time.perf_counter() - submitted - run_time)
+        metrics.observe("executor_wait_seconds", wait, job=job)
+        metrics.observe("executor_run_seconds", run_time, job=job)
+        logger.debug(
+            "[EXEC] %s: ожидание %.3f с, выполнение %.3f с", job, wait, run_time
+        )
+        return result
+
+    def start(self) -> None:
+        """Создаёт пул и сразу поднимает воркеры (вместе с ``initializer``)."""
+        executor = self._ensure_started()
+        for _ in range(self.workers):
+            executor.submit(_noop)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+executor_stage = ExecutorStage(
+    kind=config.executor_kind,
+    workers=config.executor_workers,
+    queue_size=config.executor_queue_size,
+)
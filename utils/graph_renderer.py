@@ -0,0 +1,204 @@
+"""Сервис отрисовки графиков онлайна в отдельном процессе.
+
+Фигуры matplotlib строятся один раз при старте воркера (шаблоны), а каждая
+отрисовка лишь меняет высоты столбцов и подписи и возвращает PNG из буфера
+в памяти — без pyplot и без записи на диск.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from matplotlib.figure import Figure
+
+from config.config import (
+    ONLINE_DAILY_GRAPH_TITLE,
+    ONLINE_MONTH_DAYS,
+    ONLINE_MONTH_GRAPH_TITLE,
+    config,
+)
+from utils.executor import ExecutorStage
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _BarTemplate:
+    """Заранее построенная столбчатая диаграмма с фиксированным числом столбцов."""
+
+    def __init__(
+        self,
+        *,
+        bars: int,
+        figsize: Tuple[float, float],
+        xlabel: str,
+        ylabel: str,
+        title: str,
+        label_sample: str,
+        rotate_labels: bool = False,
+    ) -> None:
+        self.bars = bars
+        self.rotate_labels = rotate_labels
+        self.fig = Figure(figsize=figsize)
+        self.ax = self.fig.add_subplot()
+        self.rects = self.ax.bar(range(bars), [0] * bars, color="tab:blue")
+        self.ax.set_xlim(-0.5, bars - 0.5)
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        self.ax.set_title(title)
+        self.ax.grid(axis="y", linestyle="--", alpha=0.5)
+        # Раскладка считается один раз по подписям типичной ширины
+        self._set_xlabels([label_sample] * bars)
+        self._set_yticks(0)
+        self.fig.tight_layout()
+
+    def _set_xlabels(self, labels: Sequence[str]) -> None:
+        if self.rotate_labels:
+            self.ax.set_xticks(range(self.bars), labels=labels, rotation=45, ha="right")
+        else:
+            self.ax.set_xticks(range(self.bars), labels=labels)
+
+    def _set_yticks(self, max_val: int) -> None:
+        tick_count = max(max_val + 1, 6)
+        self.ax.set_yticks(range(tick_count))
+        self.ax.set_ylim(0, (tick_count - 1) * 1.05)
+
+    def render(self, values: Sequence[int], labels: Sequence[str]) -> bytes:
+        for rect, value in zip(self.rects, values):
+            rect.set_height(value)
+        self._set_xlabels(labels)
+        self._set_yticks(max(values) if values else 0)
+        buffer = io.BytesIO()
+        self.fig.savefig(buffer, format="png")
+        return buffer.getvalue()
+
+
+# Шаблоны живут в процессе-воркере и переиспользуются между отрисовками
+_templates: Dict[str, _BarTemplate] = {}
+
+
+def _template(kind: str) -> _BarTemplate:
+    template = _templates.get(kind)
+    if template is None:
+        if kind == "daily":
+            template = _BarTemplate(
+                bars=24,
+                figsize=(10, 3),
+                xlabel="Час",
+                ylabel="Игроки",
+                title=ONLINE_DAILY_GRAPH_TITLE,
+                label_sample="00",
+            )
+        else:
+            template = _BarTemplate(
+                bars=ONLINE_MONTH_DAYS,
+                figsize=(10, 4),
+                xlabel="Дата",
+                ylabel="Уникальные игроки",
+                title=ONLINE_MONTH_GRAPH_TITLE,
+                label_sample="00.00",
+                rotate_labels=True,
+            )
+        _templates[kind] = template
+    return template
+
+
+def _warm_templates() -> None:
+    """Инициализатор воркера: строит шаблоны и прогревает кэши шрифтов/рендера."""
+    _template("daily").render([0] * 24, [""] * 24)
+    _template("monthly").render([0] * ONLINE_MONTH_DAYS, [""] * ONLINE_MONTH_DAYS)
+
+
+def render_daily_png(counts: List[int], now_hour: int) -> bytes:
+    """PNG суточного графика; последний столбец — текущий час."""
+    hours = list(range(now_hour + 1, 24)) + list(range(0, now_hour + 1))
+    rotated = counts[now_hour + 1 :] + counts[: now_hour + 1]
+    return _template("daily").render(rotated, [str(h) for h in hours])
+
+
+def render_monthly_png(dates: List[str], counts: List[int]) -> bytes:
+    """PNG графика уникальных игроков по дням."""
+    return _template("monthly").render(counts, dates)
+
+
+class RenderCache:
+    """LRU-кэш готовых PNG по хэшу входных рядов и параметров отрисовки."""
+
+    def __init__(self, *, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+
+    @staticmethod
+    def key(kind: str, *params: Any) -> str:
+        payload = json.dumps([kind, *params], ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        png = self._entries.get(key)
+        if png is None:
+            metrics.inc("cache_requests_total", cache="render", result="miss")
+            return None
+        self._entries.move_to_end(key)
+        metrics.inc("cache_requests_total", cache="render", result="hit")
+        return png
+
+    def put(self, key: str, png: bytes) -> None:
+        if len(png) > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = png
+        self._size += len(png)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+
+class GraphRenderer:
+    """Асинхронный фасад над воркером отрисовки.
+
+    Одинаковые данные с одинаковыми параметрами отдаются из ``cache`` без
+    обращения к воркеру.
+    """
+
+    def __init__(self, *, kind: str, cache_max_bytes: int) -> None:
+        # Один воркер: шаблоны не делятся между процессами и не нужны блокировки
+        self._stage = ExecutorStage(
+            kind=kind, workers=1, queue_size=4, initializer=_warm_templates
+        )
+        self.cache = RenderCache(max_bytes=cache_max_bytes)
+
+    async def _render(self, job: str, func: Any, *args: Any) -> bytes:
+        with metrics.timer("graph_render_seconds", graph=job) as timing:
+            key = RenderCache.key(job, *args)
+            png = self.cache.get(key)
+            if png is not None:
+                timing["result"] = "cached"
+                logger.debug("[GRAPH] %s: данные не изменились, PNG из кэша", job)
+            else:
+                png = await self._stage.run(job, func, *args)
+                self.cache.put(key, png)
+        return png
+
+    async def render_daily(self, counts: List[int], now_hour: int) -> bytes:
+        return await self._render("daily_graph", render_daily_png, counts, now_hour)
+
+    async def render_monthly(self, dates: List[str], counts: List[int]) -> bytes:
+        return await self._render("month_graph", render_monthly_png, dates, counts)
+
+    def start(self) -> None:
+        """Заранее поднимает воркер, чтобы шаблоны были готовы к первому запросу."""
+        self._stage.start()
+
+    def shutdown(self) -> None:
+        self._stage.shutdown()
+
+
+graph_renderer = GraphRenderer(
+    kind=config.graph_render_kind,
+    cache_max_bytes=config.graph_cache_max_bytes,
+)
@@ -1,14 +1,121 @@
-"""Простейший логгер для вывода сообщений."""
+"""Настройка логирования: уровни, вывод в фоновом потоке и JSON-формат.
 
+Модули пишут в собственный логгер ``logging.getLogger(__name__)`` и передают
+аргументы отдельно от шаблона::
+
+    logger.debug("[GRAPH] Данные за сутки: %s", rows)
+
+Сообщение форматируется, только если уровень включён (``LOG_LEVEL``), и уже
+в фоновом потоке: ``setup_logging`` ставит на корневой логгер
+``QueueHandler``, а запись в stderr выполняет ``QueueListener``, так что
+event loop не ждёт вывода. Поэтому объекты, переданные аргументами, нельзя
+изменять после вызова логгера. ``LOG_FORMAT=json`` выводит каждую запись
+одной строкой JSON вместе с полями из ``extra``.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
 import logging
-import os
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from config.config import config
+
+TEXT_FORMAT = "%(levelname)s %(name)s: %(message)s"
+
+# Стандартные атрибуты записи; остальные пришли через ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "taskName",
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись одной строкой JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            payload["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Кладёт запись в очередь как есть: форматирует её слушатель."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _level(name: str) -> int:
+    level = logging.getLevelName(name.upper())
+    return level if isinstance(level, int) else logging.INFO
+
+
+def _stream_handler(fmt: str) -> logging.Handler:
+    handler = logging.StreamHandler(sys.stderr)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+def setup_logging(*, level: Optional[str] = None, fmt: Optional[str] = None) -> None:
+    """Направляет корневой логгер в очередь и запускает поток вывода.
+
+    По умолчанию уровень и формат берутся из ``LOG_LEVEL`` и ``LOG_FORMAT``.
+    Повторный вызов ничего не меняет.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [_DeferredQueueHandler(log_queue)]
+    root.setLevel(_level(level or config.log_level))
+    _listener = logging.handlers.QueueListener(
+        log_queue, _stream_handler(fmt or config.log_format)
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Дописывает записи из очереди и останавливает поток вывода."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
-log_level = os.getenv("LOG_LEVEL", "INFO").upper()
-logging.basicConfig(
-    level=getattr(logging, log_level, logging.INFO), format="%(message)s"
-)
 
+def setup_worker_logging() -> None:
+    """Логирование в процессе-воркере пула: прямой вывод в stderr.
 
-def log_debug(message: str) -> None:
-    """Выводит отладочное сообщение."""
-    logging.info(message)
+    Унаследованный при ``fork`` ``QueueHandler`` писал бы в копию очереди,
+    которую в дочернем процессе никто не читает.
+    """
+    global _listener
+    # Поток слушателя в дочерний процесс не копируется, останавливать нечего
+    _listener = None
+    root = logging.getLogger()
+    root.handlers[:] = [_stream_handler(config.log_format)]
+    root.setLevel(_level(config.log_level))
@@ -0,0 +1,188 @@
+"""Счётчики и гистограммы задержек с выдачей в формате Prometheus.
+
+Метрики создаются при первом обращении по имени и набору меток, поэтому
+их не нужно объявлять заранее. Замеры потокобезопасны: парсеры и SQLite
+выполняются в пулах потоков. В режиме пула процессов замеры внутри
+воркеров остаются в их процессах; время задачи целиком всё равно видно
+по ``executor_run_seconds``.
+
+При ``METRICS_PORT`` отличном от нуля бот отдаёт метрики по
+``http://METRICS_HOST:METRICS_PORT/metrics``.
+"""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "fsbot_"
+
+# Границы корзин в секундах: от быстрых SQL-запросов до медленных FTP-загрузок
+LATENCY_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+@dataclass
+class Histogram:
+    """Распределение наблюдений по корзинам ``LATENCY_BUCKETS``."""
+
+    counts: List[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+    count: int = 0
+    total: float = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(LATENCY_BUCKETS, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.total += value
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricsRegistry:
+    """Хранилище счётчиков и гистограмм."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels: Any) -> None:
+        """Увеличивает счётчик ``name`` с метками ``labels``."""
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        """Добавляет наблюдение в гистограмму ``name``."""
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[Dict[str, Any]]:
+        """Замеряет время блока и записывает его в гистограмму ``name``.
+
+        К меткам добавляется ``result``: ``ok`` или ``error``, если блок
+        завершился исключением. Блок может сам выставить ``result`` (или
+        другие метки) в выданном словаре, например ``not_modified``.
+        """
+        started = time.perf_counter()
+        timing = dict(labels)
+        try:
+            yield timing
+        except BaseException:
+            timing["result"] = "error"
+            raise
+        finally:
+            timing.setdefault("result", "ok")
+            self.observe(name, time.perf_counter() - started, **timing)
+
+    def timed(self, name: str, **labels: Any) -> Callable[[Callable], Callable]:
+        """Декоратор синхронной функции: замер каждого вызова через :meth:`timer`."""
+
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def render(self) -> str:
+        """Текущие значения в текстовом формате Prometheus."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                for labels, value in series.items():
+                    lines.append(
+                        f"{PREFIX}{name}{_format_labels(labels)} {_format_value(value)}"
+                    )
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for labels, hist in series.items():
+                    cumulative = 0
+                    for bound, count in zip(LATENCY_BUCKETS, hist.counts):
+                        cumulative += count
+                        le = _format_labels(labels, ("le", str(bound)))
+                        lines.append(f"{PREFIX}{name}_bucket{le} {cumulative}")
+                    le = _format_labels(labels, ("le", "+Inf"))
+                    lines.append(f"{PREFIX}{name}_bucket{le} {hist.count}")
+                    lines.append(
+                        f"{PREFIX}{name}_sum{_format_labels(labels)} {hist.total!r}"
+                    )
+                    lines.append(
+                        f"{PREFIX}{name}_count{_format_labels(labels)} {hist.count}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        text=metrics.render(), content_type="text/plain", charset="utf-8"
+    )
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Поднимает HTTP-эндпоинт ``/metrics``; остановка — ``runner.cleanup()``."""
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("[METRICS] Метрики доступны на http://%s:%s/metrics", host, port)
+    return runner
@@ -0,0 +1,292 @@
+"""Версионированные миграции схемы базы данных.
+
+Все таблицы и индексы бота создаются здесь. Применённые версии
+записываются в ``schema_migrations``; при старте выполняются только новые
+миграции, каждая в своей транзакции. Миграции написаны идемпотентно
+(``IF NOT EXISTS``), поэтому на базе, созданной до их появления, они просто
+подхватывают существующие таблицы.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, List, Set
+
+from asyncpg import Pool
+
+from config.config import (
+    ONLINE_HOURLY_TABLE,
+    PLAYER_SESSIONS_TABLE,
+    PLAYERS_TABLE,
+    TOTAL_TOP_TABLE,
+    WEEKLY_TOP_LAST_TABLE,
+)
+from utils.bot_state import STATE_TABLE
+from utils.partitions import (
+    HISTORY_TABLE,
+    HOURLY_TABLE,
+    create_partitions_for_days,
+    ensure_partitioned,
+)
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_TABLE = "schema_migrations"
+# Ключ advisory-блокировки, чтобы два процесса не применяли миграции разом
+MIGRATIONS_LOCK_ID = 0x5F5E_0001
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable[[Any], Awaitable[None]]
+
+
+async def _online_history(conn: Any) -> None:
+    await ensure_partitioned(conn, HISTORY_TABLE)
+
+
+async def _online_hourly(conn: Any) -> None:
+    await ensure_partitioned(conn, HOURLY_TABLE)
+    rows = await conn.fetch(f"SELECT 1 FROM {ONLINE_HOURLY_TABLE} LIMIT 1")
+    if rows:
+        return
+    # Заполняем пустую сводку из уже накопленной истории
+    days = await conn.fetch(
+        "SELECT DISTINCT check_time::date AS day FROM player_online_history"
+    )
+    await create_partitions_for_days(conn, HOURLY_TABLE, [r["day"] for r in days])
+    await conn.execute(
+        f"""
+        INSERT INTO {ONLINE_HOURLY_TABLE} (bucket, player_name, samples)
+        SELECT date_trunc('hour', check_time), player_name, COUNT(*)
+        FROM player_online_history
+        GROUP BY date_trunc('hour', check_time), player_name
+        ON CONFLICT (bucket, player_name) DO NOTHING
+        """
+    )
+
+
+async def _total_time(conn: Any) -> None:
+    await conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {TOTAL_TOP_TABLE} (
+            player_name TEXT PRIMARY KEY,
+            total_hours INTEGER NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+
+
+async def _weekly_top_last(conn: Any) -> None:
+    await conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {WEEKLY_TOP_LAST_TABLE} (
+            player_name TEXT PRIMARY KEY,
+            hours INTEGER NOT NULL
+        )
+        """
+    )
+
+
+async def _bot_state(conn: Any) -> None:
+    await conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """
+    )
+
+
+async def _query_indexes(conn: Any) -> None:
+    # Диапазоны по check_time: BRIN почти ничего не весит на данных,
+    # которые пишутся в порядке времени
+    await conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_online_history_check_time
+        ON player_online_history USING BRIN (check_time)
+        """
+    )
+    # Топы и графики: диапазон по bucket, нужны только player_name и samples,
+    # поэтому запрос обходится index-only scan
+    await conn.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_online_hourly_bucket_cover
+        ON {ONLINE_HOURLY_TABLE} (bucket) INCLUDE (player_name, samples)
+        """
+    )
+    # /top_total: ORDER BY total_hours DESC, player_name LIMIT n
+    await conn.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_total_time_hours
+        ON {TOTAL_TOP_TABLE} (total_hours DESC, player_name)
+        """
+    )
+
+
+async def _replace_name_with_id(conn: Any, table: str) -> None:
+    await conn.execute(f"ALTER TABLE {table} ADD COLUMN player_id INTEGER")
+    await conn.execute(
+        f"""
+        UPDATE {table} t SET player_id = p.id
+        FROM {PLAYERS_TABLE} p WHERE p.name = t.player_name
+        """
+    )
+    await conn.execute(f"ALTER TABLE {table} ALTER COLUMN player_id SET NOT NULL")
+    # Ограничения и индексы с player_name удаляются вместе с колонкой
+    await conn.execute(f"ALTER TABLE {table} DROP COLUMN player_name")
+
+
+async def _player_ids(conn: Any) -> None:
+    """Справочник игроков; остальные таблицы хранят ``player_id`` вместо имени.
+
+    Уникальность истории меняется на один срез игрока — ``(player_id, date,
+    check_time)``: прежний ключ на час оставлял лишь одну запись в час, и
+    порог ``ONLINE_MIN_SAMPLES_PER_HOUR`` не мог выполниться.
+    """
+    await conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {PLAYERS_TABLE} (
+            id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        """
+    )
+    tables = [
+        HISTORY_TABLE.name,
+        ONLINE_HOURLY_TABLE,
+        TOTAL_TOP_TABLE,
+        WEEKLY_TOP_LAST_TABLE,
+    ]
+    await conn.execute(
+        f"""
+        INSERT INTO {PLAYERS_TABLE} (name)
+        {" UNION ".join(f"SELECT player_name FROM {t}" for t in tables)}
+        ON CONFLICT (name) DO NOTHING
+        """
+    )
+    for table in tables:
+        await _replace_name_with_id(conn, table)
+
+    await conn.execute(
+        f"""
+        ALTER TABLE {HISTORY_TABLE.name}
+        ADD UNIQUE (player_id, date, check_time)
+        """
+    )
+    await conn.execute(
+        f"ALTER TABLE {ONLINE_HOURLY_TABLE} ADD PRIMARY KEY (bucket, player_id)"
+    )
+    await conn.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_online_hourly_bucket_cover
+        ON {ONLINE_HOURLY_TABLE} (bucket) INCLUDE (player_id, samples)
+        """
+    )
+    await conn.execute(f"ALTER TABLE {TOTAL_TOP_TABLE} ADD PRIMARY KEY (player_id)")
+    await conn.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_total_time_hours
+        ON {TOTAL_TOP_TABLE} (total_hours DESC) INCLUDE (player_id)
+        """
+    )
+    await conn.execute(
+        f"ALTER TABLE {WEEKLY_TOP_LAST_TABLE} ADD PRIMARY KEY (player_id)"
+    )
+
+
+async def _player_sessions(conn: Any) -> None:
+    await conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {PLAYER_SESSIONS_TABLE} (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            player_id INTEGER NOT NULL,
+            started_at TIMESTAMP NOT NULL,
+            ended_at TIMESTAMP
+        )
+        """
+    )
+    # Не больше одной открытой сессии на игрока
+    await conn.execute(
+        f"""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_open
+        ON {PLAYER_SESSIONS_TABLE} (player_id) WHERE ended_at IS NULL
+        """
+    )
+    await conn.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_sessions_started
+        ON {PLAYER_SESSIONS_TABLE} (started_at) INCLUDE (ended_at, player_id)
+        """
+    )
+    # Секунды нужны, чтобы инкрементальный итог не терял неполные часы
+    await conn.execute(
+        f"""
+        ALTER TABLE {TOTAL_TOP_TABLE}
+        ADD COLUMN IF NOT EXISTS total_seconds BIGINT NOT NULL DEFAULT 0
+        """
+    )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "online_history_partitioned", _online_history),
+    Migration(2, "online_hourly_rollup", _online_hourly),
+    Migration(3, "player_total_time", _total_time),
+    Migration(4, "weekly_top_last", _weekly_top_last),
+    Migration(5, "bot_state", _bot_state),
+    Migration(6, "query_indexes", _query_indexes),
+    Migration(7, "player_ids", _player_ids),
+    Migration(8, "player_sessions", _player_sessions),
+]
+
+
+async def _applied_versions(conn: Any) -> Set[int]:
+    rows = await conn.fetch(f"SELECT version FROM {MIGRATIONS_TABLE}")
+    return {int(r["version"]) for r in rows}
+
+
+async def run_migrations(
+    db_pool: Pool, migrations: List[Migration] = MIGRATIONS
+) -> List[int]:
+    """Применяет ещё не выполненные миграции и возвращает их версии."""
+    applied_now = []
+    async with db_pool.acquire() as conn:
+        # Блокировка берётся до создания служебной таблицы: иначе два
+        # процесса, стартующие на пустой базе, создают её одновременно
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATIONS_LOCK_ID)
+        try:
+            await conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+                )
+                """
+            )
+            applied = await _applied_versions(conn)
+            for migration in sorted(migrations, key=lambda m: m.version):
+                if migration.version in applied:
+                    continue
+                logger.info(
+                    "[MIGRATE] Применяем %s: %s", migration.version, migration.name
+                )
+                async with conn.transaction():
+                    await migration.apply(conn)
+                    await conn.execute(
+                        f"INSERT INTO {MIGRATIONS_TABLE} (version, name) "
+                        "VALUES ($1, $2)",
+                        migration.version,
+                        migration.name,
+                    )
+                applied_now.append(migration.version)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATIONS_LOCK_ID)
+    if not applied_now:
+        logger.info("[MIGRATE] Схема актуальна")
+    return applied_now
@@ -1,72 +1,38 @@
 """Генерация суточного графика количества игроков."""
 
+import logging
 from datetime import timedelta
-from pathlib import Path
 from typing import List
 
-import matplotlib.pyplot as plt
-
-from config.config import ONLINE_DAILY_GRAPH_PATH, ONLINE_DAILY_GRAPH_TITLE
+from storage.base import Storage
+from utils.graph_renderer import graph_renderer
 from utils.helpers import get_moscow_datetime
-from utils.logger import log_debug
+
+logger = logging.getLogger(__name__)
 
 
-async def fetch_daily_online_counts(db_pool) -> List[int]:
+async def fetch_daily_online_counts(storage: Storage) -> List[int]:
     """Возвращает число уникальных игроков по часам за последние 24 часа."""
 
-    start = get_moscow_datetime() - timedelta(hours=24)
+    now = get_moscow_datetime()
+    start = now - timedelta(hours=24)
 
     try:
-        rows = await db_pool.fetch(
-            """
-            SELECT COALESCE(hour, EXTRACT(HOUR FROM check_time)) AS hour,
-                   COUNT(DISTINCT player_name) AS count
-            FROM player_online_history
-            WHERE check_time >= $1
-            GROUP BY COALESCE(hour, EXTRACT(HOUR FROM check_time))
-            ORDER BY hour
-            """,
-            start,
-        )
+        rows = await storage.hourly_counts(start, now)
     except Exception as e:
-        log_debug(f"[DB] Error fetching online day data: {e}")
+        logger.error("[DB] Error fetching online day data: %s", e)
         raise
 
-    log_debug(f"[GRAPH] Данные за сутки: {rows}")
+    logger.debug("[GRAPH] Данные за сутки: %s", rows)
 
     counts = [0] * 24
-    for row in rows:
-        counts[int(row["hour"])] = row["count"]
+    for hour, count in rows:
+        counts[hour] = count
 
     return counts
 
 
-def save_daily_online_graph(counts: List[int]) -> str:
-    """Сохраняет PNG-график количества игроков за последние 24 часа."""
-
+async def render_daily_online_graph(counts: List[int]) -> bytes:
+    """Возвращает PNG-график количества игроков за последние 24 часа."""
     now_hour = get_moscow_datetime().hour
-    hours = list(range(now_hour + 1, 24)) + list(range(0, now_hour + 1))
-    rotated = counts[now_hour + 1 :] + counts[: now_hour + 1]
-
-    plt.figure(figsize=(10, 3))
-    plt.bar(range(len(rotated)), rotated, color="tab:blue")
-
-    plt.xticks(ticks=range(len(hours)), labels=hours)
-    plt.xlim(-0.5, len(hours) - 0.5)
-
-    plt.xlabel("Час")
-    plt.ylabel("Игроки")
-    plt.title(ONLINE_DAILY_GRAPH_TITLE)
-
-    max_val = max(rotated) if rotated else 0
-    tick_count = max(max_val + 1, 6)
-    plt.yticks(range(tick_count))
-
-    plt.grid(axis="y", linestyle="--", alpha=0.5)
-    plt.tight_layout()
-
-    output_path = Path(ONLINE_DAILY_GRAPH_PATH)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    plt.savefig(output_path)
-    plt.close()
-    return str(output_path)
+    return await graph_renderer.render_daily(counts, now_hour)
@@ -2,80 +2,46 @@
 
 from __future__ import annotations
 
+import logging
 from datetime import datetime, timedelta
-from pathlib import Path
-from typing import List, Optional
+from typing import Optional
 
-import matplotlib.pyplot as plt
+from config.config import ONLINE_MONTH_DAYS
+from storage.base import Storage
+from utils.graph_renderer import graph_renderer
+from utils.helpers import get_moscow_datetime
+from utils.query_cache import TOPIC_ONLINE, query_cache
 
-from config.config import (
-    ONLINE_MONTH_DAYS,
-    ONLINE_MONTH_GRAPH_PATH,
-    ONLINE_MONTH_GRAPH_TITLE,
-)
-from utils.logger import log_debug
+logger = logging.getLogger(__name__)
 
 
-def save_monthly_online_graph(dates: List[str], counts: List[int]) -> str:
-    """Сохраняет PNG-график уникальных игроков по дням."""
-
-    plt.figure(figsize=(10, 4))
-    plt.bar(range(len(counts)), counts, color="tab:blue")
-
-    plt.xticks(ticks=range(len(dates)), labels=dates, rotation=45, ha="right")
-    plt.xlim(-0.5, len(dates) - 0.5)
-
-    plt.xlabel("Дата")
-    plt.ylabel("Уникальные игроки")
-    plt.title(ONLINE_MONTH_GRAPH_TITLE)
-
-    max_val = max(counts) if counts else 0
-    tick_count = max(max_val + 1, 6)
-    plt.yticks(range(tick_count))
-
-    plt.grid(axis="y", linestyle="--", alpha=0.5)
-    plt.tight_layout()
-
-    output_path = Path(ONLINE_MONTH_GRAPH_PATH)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    plt.savefig(output_path)
-    plt.close()
-
-    return str(output_path)
-
-
-async def generate_online_month_graph(db_pool) -> Optional[str]:
-    """Создаёт PNG-график уникальных игроков по дням."""
+async def generate_online_month_graph(storage: Storage) -> Optional[bytes]:
+    """Возвращает PNG-график уникальных игроков по дням или ``None`` без данных."""
+    today = datetime.utcnow().date()
     try:
-        rows = await db_pool.fetch(
-            f"""
-            SELECT COALESCE(date, DATE(check_time)) AS day,
-                   COUNT(DISTINCT player_name) AS count
-            FROM player_online_history
-            WHERE check_time >= NOW() - INTERVAL '{ONLINE_MONTH_DAYS} days'
-            GROUP BY COALESCE(date, DATE(check_time))
-            ORDER BY day
-            """
+        rows = await query_cache.get(
+            TOPIC_ONLINE,
+            ("online_month", today),
+            lambda: storage.daily_counts(ONLINE_MONTH_DAYS, get_moscow_datetime()),
         )
     except Exception as e:
-        log_debug(f"[DB] Error fetching online month data: {e}")
+        logger.error("[DB] Error fetching online month data: %s", e)
         raise
 
-    log_debug(f"[GRAPH] Месячные данные: {rows}")
+    logger.debug("[GRAPH] Месячные данные: %s", rows)
 
     if not rows:
         return None
 
-    counts = {row["day"]: row["count"] for row in rows}
+    counts = dict(rows)
 
-    today = datetime.utcnow().date()
     start_date = today - timedelta(days=ONLINE_MONTH_DAYS - 1)
     dates = [start_date + timedelta(days=i) for i in range(ONLINE_MONTH_DAYS)]
     values = [counts.get(d, 0) for d in dates]
 
     try:
         tick_labels = [d.strftime("%d.%m") for d in dates]
-        return save_monthly_online_graph(tick_labels, values)
+        return await graph_renderer.render_monthly(tick_labels, values)
     except Exception as e:
-        log_debug(f"[GRAPH] Error building online month graph: {e}")
+        logger.error("[GRAPH] Error building online month graph: %s", e)
         raise
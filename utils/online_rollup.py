@@ -0,0 +1,115 @@
+"""Почасовая сводка онлайна игроков, обновляемая при каждом срезе.
+
+Таблица ``player_online_hourly`` хранит по строке на игрока и час с числом
+срезов, в которые он был онлайн. Все топы и графики читают её вместо сырых
+записей ``player_online_history``, поэтому стоимость запросов зависит от
+числа игроков и часов, а не от числа срезов.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, List, Sequence, Tuple
+
+from asyncpg import Pool
+
+from config.config import (
+    ONLINE_HOURLY_TABLE,
+    ONLINE_MIN_SAMPLES_PER_HOUR,
+    PLAYERS_TABLE,
+    config,
+)
+from utils import statements
+from utils.helpers import get_moscow_datetime
+from utils.partitions import create_online_partitions_for
+from utils.players import player_registry
+from utils.sessions import fetch_session_top
+from utils.total_time_updater import rewind_total_time
+from utils.statements import ONLINE_STAGING_TABLE
+
+ONLINE_MERGE = statements.register(
+    "online_merge",
+    f"""
+    WITH inserted AS (
+        INSERT INTO player_online_history (
+            player_id, check_time, date, hour, dow
+        )
+        SELECT DISTINCT player_id, check_time, DATE(check_time),
+               EXTRACT(HOUR FROM check_time), EXTRACT(DOW FROM check_time)
+        FROM {ONLINE_STAGING_TABLE}
+        ON CONFLICT (player_id, date, check_time) DO NOTHING
+        RETURNING player_id, check_time
+    )
+    INSERT INTO {ONLINE_HOURLY_TABLE} (bucket, player_id, samples)
+    SELECT date_trunc('hour', check_time), player_id, COUNT(*)
+    FROM inserted
+    GROUP BY date_trunc('hour', check_time), player_id
+    ON CONFLICT (bucket, player_id) DO UPDATE
+        SET samples = {ONLINE_HOURLY_TABLE}.samples + EXCLUDED.samples
+    """,
+)
+
+TOP_HOURS = statements.register(
+    "top_hours",
+    f"""
+    SELECT p.name AS player_name, t.hours
+    FROM (
+        SELECT player_id, COUNT(*) AS hours
+        FROM {ONLINE_HOURLY_TABLE}
+        WHERE bucket >= $1 AND bucket < $2 AND samples >= $4
+        GROUP BY player_id
+    ) AS t
+    JOIN {PLAYERS_TABLE} p ON p.id = t.player_id
+    ORDER BY t.hours DESC, p.name
+    LIMIT $3
+    """,
+)
+
+
+async def _merge_online(conn: Any, records: List[Tuple[int, datetime]]) -> None:
+    async with conn.transaction():
+        await conn.copy_records_to_table(
+            ONLINE_STAGING_TABLE,
+            records=records,
+            columns=["player_id", "check_time"],
+        )
+        if records:
+            await rewind_total_time(conn, min(t for _, t in records))
+        await statements.execute(conn, ONLINE_MERGE)
+
+
+async def write_online_rows(db: Any, rows: Sequence[Tuple[str, datetime]]) -> None:
+    """Записывает строки ``(игрок, время среза)`` в историю и сводку.
+
+    Строки загружаются через COPY во временную staging-таблицу, а затем
+    переносятся одним запросом: в сводку попадают только строки, реально
+    вставленные в историю, так что ``samples`` всегда совпадает с числом
+    сырых записей за час, а повторная запись тех же срезов ничего не меняет.
+    Партиции под дни строк создаются перед переносом.
+    ``db`` — пул или соединение; на соединении запись становится частью его
+    текущей транзакции.
+    """
+    player_ids = await player_registry.ids_for(db, [name for name, _ in rows])
+    records = [(pid, check_time) for pid, (_, check_time) in zip(player_ids, rows)]
+    async with statements.connection(db) as conn:
+        await create_online_partitions_for(conn, (t for _, t in records))
+        await _merge_online(conn, records)
+
+
+async def fetch_top_hours(
+    db_pool: Pool, start: datetime, end: datetime, limit: int
+) -> List[Tuple[str, int]]:
+    """Игроки с наибольшим числом активных часов в интервале ``[start, end)``.
+
+    Час считается активным, если игрок попал в ``ONLINE_MIN_SAMPLES_PER_HOUR``
+    и более срезов за этот час. В модели сессий часы считаются по
+    пересечению сессий с интервалом.
+    """
+    if config.presence_model == "sessions":
+        return await fetch_session_top(
+            db_pool, start, end, limit, get_moscow_datetime()
+        )
+    rows = await statements.fetch(
+        db_pool, TOP_HOURS, start, end, limit, ONLINE_MIN_SAMPLES_PER_HOUR
+    )
+    return [(r["player_name"], int(r["hours"])) for r in rows]
@@ -0,0 +1,166 @@
+"""Отложенная запись срезов онлайна с локальным спулом на время сбоя БД."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import asyncpg
+
+from config.config import cleanup_history_days, config
+from storage.base import Storage
+from utils.helpers import get_moscow_datetime
+from utils.query_cache import TOPIC_ONLINE, query_cache
+
+logger = logging.getLogger(__name__)
+
+Snapshot = Tuple[datetime, List[str]]
+
+# База недоступна: срезы стоит сохранить и повторить позже. Остальные
+# ошибки повтор не исправит, такие срезы пропускаются
+UNAVAILABLE_ERRORS = (
+    OSError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+)
+
+
+class OnlineWriteBuffer:
+    """Копит срезы в памяти и сбрасывает их в базу одной пачкой.
+
+    Если база недоступна (``UNAVAILABLE_ERRORS``), срезы дописываются в
+    append-only JSONL-файл ``spool_path`` (одна строка на срез). При
+    следующем удачном сбросе спул проигрывается вместе с новыми срезами и
+    очищается. Повторная запись безопасна: уже сохранённые строки
+    пропускаются при слиянии. При другой ошибке пачка пишется по одному
+    срезу, и в журнал с пропуском попадают только срезы, которые не
+    записались. Файл спула читается и пишется в потоке, не блокируя цикл
+    событий.
+
+    Сбросы выполняются по одному: иначе сброс спула мог удалить файл, в
+    который параллельный сброс только что дописал срез.
+    """
+
+    def __init__(self, *, spool_path: Path) -> None:
+        self.spool_path = spool_path
+        self._pending: List[Snapshot] = []
+        self._lock = asyncio.Lock()
+
+    def add(self, players: Sequence[str], check_time: datetime) -> None:
+        self._pending.append((check_time, list(players)))
+
+    @property
+    def has_spool(self) -> bool:
+        return self.spool_path.exists() and self.spool_path.stat().st_size > 0
+
+    def _append_spool(self, snapshots: Sequence[Snapshot]) -> None:
+        self.spool_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.spool_path.open("a", encoding="utf-8") as f:
+            for check_time, players in snapshots:
+                f.write(
+                    json.dumps(
+                        {"check_time": check_time.isoformat(), "players": players},
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _replace_spool(self, snapshots: Sequence[Snapshot]) -> None:
+        self.spool_path.unlink(missing_ok=True)
+        if snapshots:
+            self._append_spool(snapshots)
+
+    def _read_spool(self) -> List[Snapshot]:
+        if not self.has_spool:
+            return []
+        # Срезы старше срока хранения уже некуда писать: партиции удалены
+        oldest = get_moscow_datetime() - timedelta(days=cleanup_history_days)
+        snapshots = []
+        with self.spool_path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                    check_time = datetime.fromisoformat(item["check_time"])
+                    players = item["players"]
+                    if not isinstance(players, list) or not all(
+                        isinstance(name, str) for name in players
+                    ):
+                        raise TypeError("players is not a list of names")
+                except (ValueError, KeyError, TypeError):
+                    # Оборванная последняя строка после аварийной остановки
+                    logger.warning("[SPOOL] Пропущена повреждённая строка спула")
+                    continue
+                if check_time >= oldest:
+                    snapshots.append((check_time, players))
+        return snapshots
+
+    async def flush(self, storage: Storage) -> bool:
+        """Пишет накопленные и заспуленные срезы; ``False`` — база недоступна."""
+        async with self._lock:
+            return await self._flush(storage)
+
+    async def _flush(self, storage: Storage) -> bool:
+        pending, self._pending = self._pending, []
+        spooled = await asyncio.to_thread(self._read_spool)
+        snapshots = spooled + pending
+        if not snapshots:
+            return True
+
+        try:
+            written = await _write(storage, snapshots)
+        except UNAVAILABLE_ERRORS as e:
+            logger.warning(
+                "[SPOOL] БД недоступна (%s), срезов в спул: %s", e, len(pending)
+            )
+            await asyncio.to_thread(self._append_spool, pending)
+            return False
+        except Exception as e:
+            logger.error("[SPOOL] Ошибка записи пачки (%s), пишем по одному срезу", e)
+            return await self._flush_each(storage, snapshots, spooled)
+
+        if written:
+            query_cache.invalidate(TOPIC_ONLINE)
+        if spooled:
+            await asyncio.to_thread(self.spool_path.unlink, missing_ok=True)
+            logger.info("[SPOOL] Проиграно срезов из спула: %s", len(spooled))
+        logger.debug("[ONLINE] Записано строк: %s", written)
+        return True
+
+    async def _flush_each(
+        self,
+        storage: Storage,
+        snapshots: List[Snapshot],
+        spooled: List[Snapshot],
+    ) -> bool:
+        written = 0
+        for index, snapshot in enumerate(snapshots):
+            try:
+                written += await _write(storage, [snapshot])
+            except UNAVAILABLE_ERRORS as e:
+                logger.warning("[SPOOL] БД недоступна (%s), срезы остаются в спуле", e)
+                await asyncio.to_thread(self._replace_spool, snapshots[index:])
+                return False
+            except Exception as e:
+                logger.error("[SPOOL] Срез %s пропущен: %s", snapshot[0], e)
+        if written:
+            query_cache.invalidate(TOPIC_ONLINE)
+        if spooled:
+            await asyncio.to_thread(self.spool_path.unlink, missing_ok=True)
+        return True
+
+
+async def _write(storage: Storage, snapshots: Sequence[Snapshot]) -> int:
+    rows = [(name, t) for t, players in snapshots for name in players]
+    if rows:
+        await storage.write_online(rows)
+    return len(rows)
+
+
+online_writer = OnlineWriteBuffer(spool_path=config.online_spool_path)
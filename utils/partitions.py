@@ -0,0 +1,270 @@
+"""Суточные партиции для истории онлайна и почасовой сводки.
+
+``player_online_history`` секционируется по ``date``, а
+``player_online_hourly`` — по ``bucket``. Партиции создаются заранее на
+``PARTITION_DAYS_AHEAD`` дней вперёд, а перед каждой записью — под дни
+самих строк, так что запоздавшие срезы тоже находят свою партицию.
+Устаревшие партиции отсоединяются через ``DETACH PARTITION ... CONCURRENTLY``
+(PostgreSQL 14+) и удаляются ``DROP TABLE`` вместо массового ``DELETE``.
+DEFAULT-партиции нет: с ней отсоединение без блокировки недоступно.
+Запросы с условием на ключ секционирования читают только нужные партиции.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable, List, Optional, Tuple
+
+from asyncpg import Pool
+
+from config.config import (
+    ONLINE_HOURLY_TABLE,
+    PARTITION_DAYS_AHEAD,
+    cleanup_history_days,
+)
+from utils.helpers import get_moscow_datetime
+from utils.query_cache import TOPIC_ONLINE, query_cache
+
+logger = logging.getLogger(__name__)
+
+PARTITION_SUFFIX_FORMAT = "%Y%m%d"
+
+
+@dataclass(frozen=True)
+class PartitionedTable:
+    """Описание таблицы, секционированной по суткам."""
+
+    name: str
+    key: str
+    columns: str
+    unique: str
+    # Колонки, которые вычисляются из других: (колонка, выражение).
+    # В старых строках они бывают NULL и заполняются при переносе.
+    derived: Tuple[Tuple[str, str], ...] = ()
+
+    def partition_name(self, day: date) -> str:
+        return f"{self.name}_p{day.strftime(PARTITION_SUFFIX_FORMAT)}"
+
+    def parse_day(self, partition: str) -> Optional[date]:
+        prefix = f"{self.name}_p"
+        if not partition.startswith(prefix):
+            return None
+        try:
+            return datetime.strptime(
+                partition[len(prefix) :], PARTITION_SUFFIX_FORMAT
+            ).date()
+        except ValueError:
+            return None
+
+
+HISTORY_TABLE = PartitionedTable(
+    name="player_online_history",
+    key="date",
+    columns="""
+        player_name TEXT NOT NULL,
+        check_time TIMESTAMP NOT NULL,
+        date DATE NOT NULL,
+        hour INTEGER NOT NULL,
+        dow INTEGER NOT NULL
+    """,
+    unique="player_name, date, hour",
+    derived=(
+        ("date", "check_time::date"),
+        ("hour", "EXTRACT(HOUR FROM check_time)"),
+        ("dow", "EXTRACT(DOW FROM check_time)"),
+    ),
+)
+
+HOURLY_TABLE = PartitionedTable(
+    name=ONLINE_HOURLY_TABLE,
+    key="bucket",
+    columns="""
+        bucket TIMESTAMP NOT NULL,
+        player_name TEXT NOT NULL,
+        samples INTEGER NOT NULL
+    """,
+    unique="bucket, player_name",
+)
+
+
+async def _relkind(db_pool: Pool, table: str) -> Optional[str]:
+    rows = await db_pool.fetch(
+        "SELECT relkind::text AS relkind FROM pg_class " "WHERE oid = to_regclass($1)",
+        table,
+    )
+    return rows[0]["relkind"] if rows else None
+
+
+async def _partitions(db_pool: Pool, table: PartitionedTable) -> List[Tuple[str, bool]]:
+    """Партиции таблицы и признак незавершённого отсоединения."""
+    rows = await db_pool.fetch(
+        """
+        SELECT c.relname, i.inhdetachpending
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass($1)
+        """,
+        table.name,
+    )
+    return [(r["relname"], r["inhdetachpending"]) for r in rows]
+
+
+async def _create_partition(db_pool: Pool, table: PartitionedTable, day: date) -> None:
+    await db_pool.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table.partition_name(day)}
+        PARTITION OF {table.name}
+        FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')
+        """
+    )
+
+
+async def create_partitions_for_days(
+    db_pool: Pool, table: PartitionedTable, days: Iterable[date]
+) -> None:
+    """Создаёт недостающие партиции под данные за указанные дни."""
+    for day in days:
+        await _create_partition(db_pool, table, day)
+
+
+async def create_online_partitions_for(
+    db: Any, check_times: Iterable[datetime]
+) -> None:
+    """Создаёт партиции истории и сводки под дни переданных срезов.
+
+    Вызывается перед каждой записью: срезы из файла-буфера и любые другие
+    запоздавшие строки могут выйти за окно, созданное заранее. Для уже
+    существующих партиций ``CREATE TABLE IF NOT EXISTS`` не блокирует
+    родительскую таблицу.
+    """
+    days = sorted({check_time.date() for check_time in check_times})
+    for table in (HISTORY_TABLE, HOURLY_TABLE):
+        await create_partitions_for_days(db, table, days)
+
+
+async def ensure_partitioned(conn: Any, table: PartitionedTable) -> None:
+    """Создаёт секционированную таблицу или переводит на неё обычную.
+
+    Существующая несекционированная таблица переименовывается, её строки
+    переносятся в партиции новой, после чего старая удаляется. Лишние
+    колонки старой таблицы сохраняются благодаря ``LIKE``. Пустые значения
+    колонок из ``table.derived`` (в том числе ключа секционирования)
+    вычисляются при переносе, а строки, совпавшие после этого по
+    ``table.unique``, переносятся один раз. Вызывается из миграции
+    внутри её транзакции.
+    """
+    kind = await _relkind(conn, table.name)
+    if kind == "p":
+        return
+
+    if kind is None:
+        logger.info("[PART] Создаём секционированную таблицу %s", table.name)
+        await conn.execute(
+            f"""
+            CREATE TABLE {table.name} ({table.columns},
+                UNIQUE ({table.unique})
+            ) PARTITION BY RANGE ({table.key})
+            """
+        )
+        return
+
+    legacy = f"{table.name}_legacy"
+    logger.info("[PART] Переводим %s на суточные партиции", table.name)
+    await conn.execute(f"ALTER TABLE {table.name} RENAME TO {legacy}")
+    await conn.execute(
+        f"""
+        CREATE TABLE {table.name} (
+            LIKE {legacy} INCLUDING DEFAULTS,
+            UNIQUE ({table.unique})
+        ) PARTITION BY RANGE ({table.key})
+        """
+    )
+    derived = dict(table.derived)
+
+    def value(column: str) -> str:
+        if column in derived:
+            return f"COALESCE({column}, {derived[column]})"
+        return column
+
+    columns = await conn.fetch(
+        """
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = to_regclass($1) AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+        """,
+        legacy,
+    )
+    select = ", ".join(value(r["attname"]) for r in columns)
+    rows = await conn.fetch(
+        f"SELECT DISTINCT ({value(table.key)})::date AS day FROM {legacy}"
+    )
+    await create_partitions_for_days(conn, table, [r["day"] for r in rows])
+    await conn.execute(
+        f"""
+        INSERT INTO {table.name}
+        SELECT {select} FROM {legacy}
+        ON CONFLICT DO NOTHING
+        """
+    )
+    await conn.execute(f"DROP TABLE {legacy}")
+
+
+async def create_future_partitions(
+    db_pool: Pool,
+    table: PartitionedTable,
+    *,
+    days_ahead: int = PARTITION_DAYS_AHEAD,
+) -> None:
+    """Создаёт партиции с сегодняшнего дня на ``days_ahead`` дней вперёд."""
+    today = get_moscow_datetime().date()
+    await create_partitions_for_days(
+        db_pool, table, (today + timedelta(days=d) for d in range(days_ahead + 1))
+    )
+
+
+async def drop_old_partitions(
+    db_pool: Pool,
+    table: PartitionedTable,
+    *,
+    keep_days: int = cleanup_history_days,
+) -> List[str]:
+    """Удаляет партиции, целиком лежащие старше ``keep_days`` дней.
+
+    Партиция сначала отсоединяется с ``CONCURRENTLY``, чтобы не брать
+    эксклюзивную блокировку родительской таблицы и не останавливать запись
+    и чтение, а уже затем удаляется. Отсоединение, прерванное в прошлый
+    раз, завершается через ``FINALIZE``. Оба запроса выполняются вне
+    транзакции, поэтому ``db_pool`` должен быть пулом, а не соединением
+    внутри транзакции.
+    """
+    cutoff = get_moscow_datetime().date() - timedelta(days=keep_days)
+    dropped = []
+    for partition, pending in sorted(await _partitions(db_pool, table)):
+        day = table.parse_day(partition)
+        if day is None or day >= cutoff:
+            continue
+        mode = "FINALIZE" if pending else "CONCURRENTLY"
+        await db_pool.execute(
+            f"ALTER TABLE {table.name} DETACH PARTITION {partition} {mode}"
+        )
+        await db_pool.execute(f"DROP TABLE IF EXISTS {partition}")
+        dropped.append(partition)
+    if dropped:
+        query_cache.invalidate(TOPIC_ONLINE)
+        logger.info("[PART] %s: удалены партиции %s", table.name, ", ".join(dropped))
+    return dropped
+
+
+async def ensure_online_partitions(db_pool: Pool) -> None:
+    """Создаёт партиции истории и сводки на ближайшие дни."""
+    for table in (HISTORY_TABLE, HOURLY_TABLE):
+        await create_future_partitions(db_pool, table)
+
+
+async def maintain_online_partitions(db_pool: Pool) -> None:
+    """Ежедневное обслуживание: новые партиции вперёд и удаление старых."""
+    for table in (HISTORY_TABLE, HOURLY_TABLE):
+        await create_future_partitions(db_pool, table)
+        await drop_old_partitions(db_pool, table)
@@ -0,0 +1,65 @@
+"""Справочник игроков: имя ↔ целочисленный ID.
+
+История, сводка и топы хранят ``player_id`` вместо имени, что уменьшает
+строки и индексы. Соответствие имён и ID кэшируется в процессе; кэш
+прогревается при старте, а новые игроки регистрируются одним запросом.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Sequence
+
+from config.config import PLAYERS_TABLE
+from utils import statements
+
+logger = logging.getLogger(__name__)
+
+PLAYERS_ALL = statements.register(
+    "players_all", f"SELECT id, name FROM {PLAYERS_TABLE}"
+)
+
+# Вставленные строки и уже существующие (добавленные другим процессом)
+# возвращаются одним запросом
+PLAYERS_UPSERT = statements.register(
+    "players_upsert",
+    f"""
+    WITH new AS (
+        INSERT INTO {PLAYERS_TABLE} (name)
+        SELECT unnest($1::text[])
+        ON CONFLICT (name) DO NOTHING
+        RETURNING id, name
+    )
+    SELECT id, name FROM new
+    UNION ALL
+    SELECT id, name FROM {PLAYERS_TABLE} WHERE name = ANY($1::text[])
+    """,
+)
+
+
+class PlayerRegistry:
+    """Кэш ``name → id`` поверх таблицы ``players``."""
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    async def warm(self, db: Any) -> None:
+        """Загружает весь справочник в кэш."""
+        rows = await statements.fetch(db, PLAYERS_ALL)
+        self._ids = {r["name"]: int(r["id"]) for r in rows}
+        logger.debug("[PLAYERS] В кэше игроков: %s", len(self._ids))
+
+    async def ids_for(self, db: Any, names: Sequence[str]) -> List[int]:
+        """Возвращает ID для ``names``, регистрируя новых игроков."""
+        missing = [n for n in dict.fromkeys(names) if n not in self._ids]
+        if missing:
+            rows = await statements.fetch(db, PLAYERS_UPSERT, missing)
+            for r in rows:
+                self._ids[r["name"]] = int(r["id"])
+        return [self._ids[n] for n in names]
+
+
+player_registry = PlayerRegistry()
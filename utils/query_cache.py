@@ -0,0 +1,83 @@
+"""Кэш результатов запросов слэш-команд, сбрасываемый при записи данных."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from config.config import config
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Темы кэша: какие данные изменились
+TOPIC_ONLINE = "online"
+TOPIC_TOTAL = "total"
+TOPIC_WEEKLY = "weekly"
+
+
+class QueryCache:
+    """LRU-кэш результатов чтения, сгруппированных по темам.
+
+    Данные в базе меняются только при записи среза, пересчёте общего времени
+    или архивации недели, поэтому результат живёт до ``invalidate`` своей
+    темы, а не по TTL. Одновременные промахи по одному ключу объединяются в
+    одну загрузку. Результат загрузки, начатой до сброса темы, не кэшируется.
+    """
+
+    def __init__(self, *, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[int, Any]]" = (
+            OrderedDict()
+        )
+        self._generations: Dict[str, int] = {}
+        self._inflight: Dict[Tuple[str, Hashable, int], asyncio.Task] = {}
+
+    def invalidate(self, *topics: str) -> None:
+        for topic in topics:
+            self._generations[topic] = self._generations.get(topic, 0) + 1
+            for key in [k for k in self._entries if k[0] == topic]:
+                del self._entries[key]
+        logger.debug("[QCACHE] Сброшены темы: %s", ", ".join(topics))
+
+    async def get(
+        self, topic: str, key: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Возвращает закэшированный результат или загружает его через ``loader``."""
+        generation = self._generations.get(topic, 0)
+        entry = self._entries.get((topic, key))
+        if entry is not None and entry[0] == generation:
+            self._entries.move_to_end((topic, key))
+            metrics.inc("query_cache_requests_total", topic=topic, result="hit")
+            return entry[1]
+
+        metrics.inc("query_cache_requests_total", topic=topic, result="miss")
+        flight = (topic, key, generation)
+        task = self._inflight.get(flight)
+        if task is None:
+            task = asyncio.create_task(self._load(topic, key, generation, loader))
+            self._inflight[flight] = task
+        return await asyncio.shield(task)
+
+    async def _load(
+        self,
+        topic: str,
+        key: Hashable,
+        generation: int,
+        loader: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        try:
+            value = await loader()
+            if self._generations.get(topic, 0) == generation:
+                self._entries[(topic, key)] = (generation, value)
+                self._entries.move_to_end((topic, key))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value
+        finally:
+            self._inflight.pop((topic, key, generation), None)
+
+
+query_cache = QueryCache(max_entries=config.query_cache_max_entries)
@@ -0,0 +1,223 @@
+"""Единый планировщик фоновых задач бота.
+
+Все периодические задачи регистрируются в ``Scheduler`` и запускаются из
+одной кучи таймеров. Следующий запуск считается от запланированного
+времени, а не от момента окончания, поэтому расписание не «уплывает».
+Задача не запускается повторно, пока не закончился предыдущий прогон, а
+задачи с ``catch_up`` после перезапуска бота догоняют пропущенный запуск
+по времени последнего успешного прогона, сохранённому в хранилище.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from storage.base import Storage
+from utils.helpers import get_moscow_datetime
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Как часто планировщик сверяется с часами даже без ближайших задач
+MAX_SLEEP_SECONDS = 60.0
+
+
+class Every:
+    """Запуск каждые ``seconds`` секунд.
+
+    С ``aligned=True`` моменты запуска кратны интервалу от полуночи
+    (например, ровно в :00, :15, :30, :45 для 900 секунд).
+    """
+
+    def __init__(self, seconds: float, *, aligned: bool = False) -> None:
+        self.seconds = seconds
+        self.aligned = aligned
+
+    def next_after(self, moment: datetime) -> datetime:
+        if not self.aligned:
+            return moment + timedelta(seconds=self.seconds)
+        midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        elapsed = (moment - midnight).total_seconds()
+        slots = int(elapsed // self.seconds) + 1
+        return midnight + timedelta(seconds=slots * self.seconds)
+
+    def __repr__(self) -> str:
+        suffix = ", aligned" if self.aligned else ""
+        return f"Every({self.seconds:g}s{suffix})"
+
+
+class Weekly:
+    """Запуск раз в неделю: день недели (0 — понедельник) и час."""
+
+    def __init__(self, weekday: int, hour: int) -> None:
+        self.weekday = weekday
+        self.hour = hour
+
+    def next_after(self, moment: datetime) -> datetime:
+        run = moment.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+        run += timedelta(days=(self.weekday - moment.weekday()) % 7)
+        if run <= moment:
+            run += timedelta(days=7)
+        return run
+
+    def __repr__(self) -> str:
+        return f"Weekly(weekday={self.weekday}, hour={self.hour})"
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Awaitable[Any]]
+    schedule: Any
+    run_at_start: bool = False
+    catch_up: bool = False
+    next_run: Optional[datetime] = None
+    task: Optional[asyncio.Task] = None
+
+    @property
+    def state_key(self) -> str:
+        return f"job_last_run:{self.name}"
+
+
+class Scheduler:
+    """Запускает зарегистрированные задачи по расписанию."""
+
+    def __init__(self, *, clock: Callable[[], datetime] = get_moscow_datetime) -> None:
+        self.clock = clock
+        self.jobs: Dict[str, Job] = {}
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._seq = 0
+        self._storage: Optional[Storage] = None
+        self._wakeup = asyncio.Event()
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        schedule: Any,
+        *,
+        run_at_start: bool = False,
+        catch_up: bool = False,
+    ) -> None:
+        """Регистрирует задачу ``func`` с расписанием ``schedule``."""
+        if name in self.jobs:
+            raise ValueError(f"Job {name!r} is already registered")
+        self.jobs[name] = Job(
+            name, func, schedule, run_at_start=run_at_start, catch_up=catch_up
+        )
+
+    def _push(self, job: Job, when: datetime) -> None:
+        job.next_run = when
+        self._seq += 1
+        heapq.heappush(self._heap, (when, self._seq, job.name))
+        self._wakeup.set()
+
+    async def _first_run(self, job: Job, now: datetime) -> datetime:
+        if job.run_at_start:
+            return now
+        if job.catch_up and self._storage is not None:
+            try:
+                last = await self._storage.get_state(job.state_key)
+            except Exception as e:
+                logger.error(
+                    "[SCHED] %s: не удалось прочитать прошлый запуск: %s", job.name, e
+                )
+                last = None
+            if last is not None:
+                due = job.schedule.next_after(datetime.fromisoformat(last))
+                if due <= now:
+                    logger.warning(
+                        "[SCHED] %s: пропущен запуск %s, догоняем", job.name, due
+                    )
+                    return now
+        return job.schedule.next_after(now)
+
+    async def _execute(self, job: Job, scheduled: datetime) -> None:
+        started_at = self.clock()
+        lag = max(0.0, (started_at - scheduled).total_seconds())
+        started = time.perf_counter()
+        result = "cancelled"
+        try:
+            await job.func()
+            result = "ok"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result = "error"
+            logger.error("[SCHED] %s: ошибка: %s", job.name, e)
+        else:
+            if job.catch_up and self._storage is not None:
+                try:
+                    await self._storage.set_state(job.state_key, started_at.isoformat())
+                except Exception as e:
+                    logger.error(
+                        "[SCHED] %s: не удалось сохранить запуск: %s", job.name, e
+                    )
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe("job_seconds", elapsed, job=job.name, result=result)
+            metrics.observe("job_lag_seconds", lag, job=job.name)
+            logger.debug(
+                "[SCHED] %s: задержка %.3f с, выполнение %.3f с",
+                job.name,
+                lag,
+                elapsed,
+            )
+
+    def _dispatch(self, job: Job, scheduled: datetime, now: datetime) -> None:
+        if job.task is not None and not job.task.done():
+            metrics.inc("job_skipped_total", job=job.name)
+            logger.warning(
+                "[SCHED] %s: предыдущий запуск ещё идёт, пропускаем", job.name
+            )
+        else:
+            job.task = asyncio.create_task(self._execute(job, scheduled))
+        following = job.schedule.next_after(scheduled)
+        if following <= now:
+            # Отстали больше чем на период: пропущенные запуски не копим
+            following = job.schedule.next_after(now)
+        self._push(job, following)
+
+    async def run(self, storage: Optional[Storage] = None) -> None:
+        """Основной цикл; ``storage`` нужен для задач с ``catch_up``."""
+        self._storage = storage
+        now = self.clock()
+        for job in self.jobs.values():
+            self._push(job, await self._first_run(job, now))
+            logger.info(
+                "[SCHED] %s: %r, первый запуск %s", job.name, job.schedule, job.next_run
+            )
+
+        try:
+            while True:
+                self._wakeup.clear()
+                now = self.clock()
+                while self._heap and self._heap[0][0] <= now:
+                    when, _, name = heapq.heappop(self._heap)
+                    job = self.jobs[name]
+                    if job.next_run == when:
+                        self._dispatch(job, when, now)
+                delay = MAX_SLEEP_SECONDS
+                if self._heap:
+                    delay = min(delay, (self._heap[0][0] - now).total_seconds())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            running = [
+                j.task for j in self.jobs.values() if j.task and not j.task.done()
+            ]
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+
+scheduler = Scheduler()
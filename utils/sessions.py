@@ -0,0 +1,228 @@
+"""Модель присутствия на интервалах: сессии игроков вместо точечных срезов.
+
+При каждом опросе статистики ``SessionTracker`` сравнивает список онлайн
+игроков с открытыми сессиями: вошедшим открывает сессию, вышедшим
+закрывает. В ``player_sessions`` хранится одна строка на сессию
+``(player_id, started_at, ended_at)``; у открытой сессии ``ended_at`` пуст.
+Игровое время, топы и графики считаются пересечением интервалов с
+нужным периодом, поэтому точность — интервал опроса, а не 15 минут.
+
+Используется при ``PRESENCE_MODEL=sessions``.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Sequence, Set, Tuple
+
+from asyncpg import Pool
+
+from config.config import PLAYER_SESSIONS_TABLE, PLAYERS_TABLE, config
+from utils import statements
+from utils.bot_state import get_state, set_state
+from utils.players import player_registry
+from utils.query_cache import TOPIC_ONLINE, query_cache
+
+logger = logging.getLogger(__name__)
+
+# Время последнего удачного опроса; по нему закрываются сессии после простоя
+SESSIONS_HEARTBEAT_KEY = "sessions_last_poll"
+
+# Длительность пересечения сессии с периодом [$1, $2); $3 — текущее время
+# для открытых сессий
+_OVERLAP = (
+    "EXTRACT(EPOCH FROM LEAST(COALESCE(ended_at, $3), $2) - GREATEST(started_at, $1))"
+)
+_OVERLAPS = "started_at < $2 AND COALESCE(ended_at, $3) > $1"
+
+SESSIONS_OPEN = statements.register(
+    "sessions_open",
+    f"SELECT player_id FROM {PLAYER_SESSIONS_TABLE} WHERE ended_at IS NULL",
+)
+
+SESSIONS_START = statements.register(
+    "sessions_start",
+    f"""
+    INSERT INTO {PLAYER_SESSIONS_TABLE} (player_id, started_at)
+    SELECT unnest($1::int[]), $2
+    ON CONFLICT (player_id) WHERE ended_at IS NULL DO NOTHING
+    """,
+)
+
+SESSIONS_END = statements.register(
+    "sessions_end",
+    f"""
+    UPDATE {PLAYER_SESSIONS_TABLE} SET ended_at = $2
+    WHERE ended_at IS NULL AND player_id = ANY($1::int[])
+    """,
+)
+
+SESSIONS_END_ALL = statements.register(
+    "sessions_end_all",
+    f"UPDATE {PLAYER_SESSIONS_TABLE} SET ended_at = $1 WHERE ended_at IS NULL",
+)
+
+SESSIONS_SECONDS = statements.register(
+    "sessions_seconds",
+    f"""
+    SELECT player_id, SUM({_OVERLAP})::bigint AS seconds
+    FROM {PLAYER_SESSIONS_TABLE}
+    WHERE {_OVERLAPS}
+    GROUP BY player_id
+    """,
+)
+
+SESSIONS_TOP = statements.register(
+    "sessions_top",
+    f"""
+    SELECT p.name AS player_name, t.seconds
+    FROM (
+        SELECT player_id, SUM({_OVERLAP}) AS seconds
+        FROM {PLAYER_SESSIONS_TABLE}
+        WHERE {_OVERLAPS}
+        GROUP BY player_id
+    ) AS t
+    JOIN {PLAYERS_TABLE} p ON p.id = t.player_id
+    ORDER BY t.seconds DESC, p.name
+    LIMIT $4
+    """,
+)
+
+# Уникальные игроки в каждом часе [$1, $2]
+SESSIONS_HOURLY_COUNTS = statements.register(
+    "sessions_hourly_counts",
+    f"""
+    SELECT EXTRACT(HOUR FROM h) AS hour, COUNT(DISTINCT s.player_id) AS count
+    FROM generate_series(
+        date_trunc('hour', $1::timestamp), $2::timestamp, INTERVAL '1 hour'
+    ) AS h
+    JOIN {PLAYER_SESSIONS_TABLE} s
+      ON s.started_at < h + INTERVAL '1 hour' AND COALESCE(s.ended_at, $2) > h
+    GROUP BY EXTRACT(HOUR FROM h)
+    ORDER BY hour
+    """,
+)
+
+# Уникальные игроки по дням за последние $1 дней до $2
+SESSIONS_DAILY_COUNTS = statements.register(
+    "sessions_daily_counts",
+    f"""
+    SELECT d::date AS day, COUNT(DISTINCT s.player_id) AS count
+    FROM generate_series(
+        date_trunc('day', $2::timestamp) - make_interval(days => $1 - 1),
+        $2::timestamp,
+        INTERVAL '1 day'
+    ) AS d
+    JOIN {PLAYER_SESSIONS_TABLE} s
+      ON s.started_at < d + INTERVAL '1 day' AND COALESCE(s.ended_at, $2) > d
+    GROUP BY d
+    ORDER BY day
+    """,
+)
+
+SESSIONS_CLEANUP = statements.register(
+    "sessions_cleanup",
+    f"""
+    DELETE FROM {PLAYER_SESSIONS_TABLE}
+    WHERE ended_at < $1::timestamp - make_interval(days => $2)
+    """,
+)
+
+
+async def fetch_session_seconds(
+    db: Any, start: datetime, end: datetime, now: datetime
+) -> List[Tuple[int, int]]:
+    """Секунды онлайна каждого игрока в периоде ``[start, end)``."""
+    rows = await statements.fetch(db, SESSIONS_SECONDS, start, end, now)
+    return [(int(r["player_id"]), int(r["seconds"])) for r in rows]
+
+
+async def fetch_session_top(
+    db: Any, start: datetime, end: datetime, limit: int, now: datetime
+) -> List[Tuple[str, int]]:
+    """Топ игроков по времени в периоде; часы округляются вниз."""
+    rows = await statements.fetch(db, SESSIONS_TOP, start, end, now, limit)
+    return [(r["player_name"], int(r["seconds"]) // 3600) for r in rows]
+
+
+class SessionTracker:
+    """Открывает и закрывает сессии по результатам опросов статистики.
+
+    Если опросов не было дольше ``gap`` (бот или сервер лежали), открытые
+    сессии закрываются временем последнего удачного опроса, а не текущим.
+    После перезапуска и при неудачных опросах это делает :meth:`close_stale`.
+    """
+
+    def __init__(self, *, gap: timedelta) -> None:
+        self.gap = gap
+        self._open: Optional[Set[int]] = None
+        self._last_poll: Optional[datetime] = None
+
+    async def _load(self, db: Pool) -> None:
+        rows = await statements.fetch(db, SESSIONS_OPEN)
+        self._open = {int(r["player_id"]) for r in rows}
+        heartbeat = await get_state(db, SESSIONS_HEARTBEAT_KEY)
+        self._last_poll = datetime.fromisoformat(heartbeat) if heartbeat else None
+        logger.debug("[SESSIONS] Открытых сессий: %s", len(self._open))
+
+    def _is_stale(self, now: datetime) -> bool:
+        return bool(self._open) and (
+            self._last_poll is None or now - self._last_poll > self.gap
+        )
+
+    async def _end_all(self, conn: Any, now: datetime) -> None:
+        closed_at = self._last_poll or now
+        logger.warning(
+            "[SESSIONS] Перерыв в опросах, закрываем сессии на %s", closed_at
+        )
+        await statements.execute(conn, SESSIONS_END_ALL, closed_at)
+
+    async def close_stale(self, db: Pool, now: datetime) -> None:
+        """Закрывает открытые сессии, если опросов не было дольше ``gap``.
+
+        Вызывается при старте хранилища, до фоновых задач и команд, и при
+        неудачном опросе: иначе простой считался бы игровым временем до
+        следующего удачного опроса.
+        """
+        if self._open is None:
+            await self._load(db)
+        if not self._is_stale(now):
+            return
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                await self._end_all(conn, now)
+        # Память меняется только после фиксации транзакции
+        self._open = set()
+
+    async def observe(self, db: Pool, players: Sequence[str], now: datetime) -> None:
+        """Применяет результат опроса: список игроков онлайн на момент ``now``."""
+        if self._open is None:
+            await self._load(db)
+        online = set(await player_registry.ids_for(db, players))
+        stale = self._is_stale(now)
+        still_open = set() if stale else self._open
+
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                if stale:
+                    await self._end_all(conn, now)
+                joined = sorted(online - still_open)
+                left = sorted(still_open - online)
+                if left:
+                    await statements.execute(conn, SESSIONS_END, left, now)
+                if joined:
+                    await statements.execute(conn, SESSIONS_START, joined, now)
+                await set_state(conn, SESSIONS_HEARTBEAT_KEY, now.isoformat())
+
+        self._open = online
+        self._last_poll = now
+        if joined or left:
+            logger.debug("[SESSIONS] Вошли: %s, вышли: %s", len(joined), len(left))
+        # Время открытых сессий растёт с каждым опросом
+        query_cache.invalidate(TOPIC_ONLINE)
+
+
+session_tracker = SessionTracker(
+    gap=timedelta(seconds=3 * config.session_poll_interval)
+)
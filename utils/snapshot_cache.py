@@ -0,0 +1,66 @@
+"""Общий снимок данных с TTL и объединением одновременных запросов."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SnapshotCache(Generic[T]):
+    """Хранит последний снимок источника не дольше ``ttl`` секунд.
+
+    Одновременные запросы при устаревшем снимке объединяются в одну загрузку
+    (single-flight): первый вызов запускает ``loader``, остальные ждут его
+    результат. Неудачная загрузка (``None``) не затирает предыдущий снимок.
+    Производные значения (результаты парсинга) считаются один раз на снимок.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._value: Optional[T] = None
+        self._fetched_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._derived: Dict[str, Any] = {}
+
+    def _is_fresh(self, max_age: float) -> bool:
+        return (
+            self._value is not None and time.monotonic() - self._fetched_at <= max_age
+        )
+
+    async def get(
+        self,
+        loader: Callable[[], Awaitable[Optional[T]]],
+        *,
+        max_age: Optional[float] = None,
+    ) -> Optional[T]:
+        """Возвращает свежий снимок, при необходимости загружая его один раз."""
+        if self._is_fresh(self.ttl if max_age is None else max_age):
+            return self._value
+        if self._inflight is None:
+            self._inflight = asyncio.create_task(self._refresh(loader))
+        # shield: отмена одного из ожидающих не прерывает общую загрузку
+        return await asyncio.shield(self._inflight)
+
+    async def _refresh(
+        self, loader: Callable[[], Awaitable[Optional[T]]]
+    ) -> Optional[T]:
+        try:
+            value = await loader()
+            if value is not None:
+                self._value = value
+                self._fetched_at = time.monotonic()
+                self._derived.clear()
+            return value
+        finally:
+            self._inflight = None
+
+    def derive(self, key: str, func: Callable[[T], Any]) -> Any:
+        """Возвращает ``func(снимок)``, вычисляя его один раз для каждого снимка."""
+        if self._value is None:
+            return None
+        if key not in self._derived:
+            self._derived[key] = func(self._value)
+        return self._derived[key]
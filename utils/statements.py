@@ -0,0 +1,98 @@
+"""Реестр горячих SQL-запросов и настройка пула asyncpg.
+
+Горячие запросы регистрируются через ``register`` при импорте модулей, а
+вызываются через ``fetch``/``execute`` по имени. Подготовку берёт на себя
+кэш запросов asyncpg на каждом соединении (``DB_STATEMENT_CACHE_SIZE``):
+запрос готовится при первом вызове на соединении, дальше переиспользуется,
+а после изменения схемы asyncpg сам готовит его заново. Задержки каждого
+запроса попадают в гистограмму ``db_query_seconds``.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List
+
+import asyncpg
+
+from config.config import config
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Временная таблица сеанса для COPY срезов онлайна; создаётся в ``init``
+ONLINE_STAGING_TABLE = "online_staging"
+
+STATEMENTS: Dict[str, str] = {}
+
+
+def register(name: str, sql: str) -> str:
+    """Добавляет запрос в реестр и возвращает его имя."""
+    if STATEMENTS.get(name, sql) != sql:
+        raise ValueError(f"Statement {name!r} is already registered")
+    STATEMENTS[name] = sql
+    return name
+
+
+async def init_connection(conn: asyncpg.Connection) -> None:
+    """Хук ``init`` пула: staging-таблица для COPY срезов онлайна."""
+    await conn.execute(
+        f"""
+        CREATE TEMP TABLE IF NOT EXISTS {ONLINE_STAGING_TABLE} (
+            player_id INTEGER NOT NULL,
+            check_time TIMESTAMP NOT NULL
+        ) ON COMMIT DELETE ROWS
+        """
+    )
+
+
+async def create_pool() -> asyncpg.Pool:
+    return await asyncpg.create_pool(
+        dsn=config.postgres_url,
+        min_size=config.db_pool_min_size,
+        max_size=config.db_pool_max_size,
+        statement_cache_size=config.db_statement_cache_size,
+        max_inactive_connection_lifetime=config.db_conn_max_inactive,
+        init=init_connection,
+    )
+
+
+@asynccontextmanager
+async def connection(db: Any) -> AsyncIterator[Any]:
+    """Соединение из пула ``db`` или само ``db``, если это уже соединение."""
+    if isinstance(db, asyncpg.Pool):
+        async with db.acquire() as conn:
+            yield conn
+    else:
+        yield db
+
+
+async def _call(conn: Any, name: str, status: bool, args: Any) -> Any:
+    if status:
+        return await conn.execute(STATEMENTS[name], *args)
+    return await conn.fetch(STATEMENTS[name], *args)
+
+
+async def _run(db: Any, name: str, args: Any, *, status: bool = False) -> Any:
+    started = time.perf_counter()
+    result = "error"
+    try:
+        async with connection(db) as conn:
+            rows = await _call(conn, name, status, args)
+        result = "ok"
+        return rows
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe("db_query_seconds", elapsed, statement=name, result=result)
+
+
+async def fetch(db: Any, name: str, *args: Any) -> List[Any]:
+    """Выполняет запрос ``name`` на пуле или соединении и возвращает строки."""
+    return await _run(db, name, args)
+
+
+async def execute(db: Any, name: str, *args: Any) -> str:
+    """Выполняет запрос ``name`` и возвращает статус команды (``INSERT 0 5``)."""
+    return await _run(db, name, args, status=True)
@@ -2,97 +2,273 @@
 
 from __future__ import annotations
 
-import asyncio
-from typing import List, Tuple
+import logging
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Tuple
 
 from asyncpg import Pool
 
-from config.config import cleanup_history_days
-from utils.logger import log_debug
-
-
-async def _fetch_total_hours(
-    db_pool: Pool,
-    *,
-    history_table: str = "player_online_history",
-) -> List[Tuple[str, int]]:
-    """Return total active hours for each player from history."""
-    # Собираем уникальные часовые интервалы с тремя и более отметками
-    query = f"""
-        SELECT player_name, COUNT(*) AS hours
-        FROM (
-            SELECT player_name, date, hour
-            FROM {history_table}
-            WHERE check_time >= NOW() - INTERVAL '{cleanup_history_days} days'
-            GROUP BY player_name, date, hour
-            HAVING COUNT(*) >= 3
-        ) AS t
-        GROUP BY player_name
-        ORDER BY player_name
-    """
+from config.config import (
+    ONLINE_HOURLY_TABLE,
+    ONLINE_MIN_SAMPLES_PER_HOUR,
+    TOTAL_TOP_TABLE,
+    cleanup_history_days,
+    config,
+)
+from storage.base import Storage
+from utils import statements
+from utils.bot_state import delete_state, get_state, set_state
+from utils.helpers import get_moscow_datetime
+from utils.query_cache import TOPIC_TOTAL, query_cache
+from utils.sessions import fetch_session_seconds
+
+logger = logging.getLogger(__name__)
+
+# Начало первого необработанного часа для инкрементального режима
+TOTAL_TIME_WATERMARK_KEY = "total_time_processed_until"
+# Режим, в котором итоги считались в прошлый раз: отметка действительна
+# только для инкрементального
+TOTAL_TIME_MODE_KEY = "total_time_mode"
+# Ключ advisory-блокировки: подсчёт и откат отметки не идут одновременно
+TOTAL_TIME_LOCK_ID = 0x5F5E_0002
+
+# Считаем часы, в которые игрок попал в достаточное число срезов
+TOTAL_HOURS_WINDOW = statements.register(
+    "total_hours_window",
+    f"""
+    SELECT player_id, COUNT(*) AS hours
+    FROM {ONLINE_HOURLY_TABLE}
+    WHERE bucket >= date_trunc('hour', NOW() - make_interval(days => $2))
+      AND samples >= $1
+    GROUP BY player_id
+    ORDER BY player_id
+    """,
+)
+
+TOTAL_HOURS_SINCE = statements.register(
+    "total_hours_since",
+    f"""
+    SELECT player_id, COUNT(*) AS hours
+    FROM {ONLINE_HOURLY_TABLE}
+    WHERE ($1::timestamp IS NULL OR bucket >= $1)
+      AND bucket < $2
+      AND samples >= $3
+    GROUP BY player_id
+    """,
+)
+
+# UPSERT обновляет время, только если оно изменилось
+TOTAL_SET = statements.register(
+    "total_set",
+    f"""
+    INSERT INTO {TOTAL_TOP_TABLE} (player_id, total_hours, updated_at)
+    SELECT id, hours, NOW()
+    FROM unnest($1::int[], $2::int[]) AS t(id, hours)
+    ON CONFLICT (player_id) DO UPDATE
+        SET total_hours = EXCLUDED.total_hours,
+            updated_at = EXCLUDED.updated_at
+        WHERE {TOTAL_TOP_TABLE}.total_hours IS DISTINCT FROM EXCLUDED.total_hours
+    """,
+)
+
+TOTAL_ADD = statements.register(
+    "total_add",
+    f"""
+    INSERT INTO {TOTAL_TOP_TABLE} (player_id, total_hours, updated_at)
+    SELECT id, hours, NOW()
+    FROM unnest($1::int[], $2::int[]) AS t(id, hours)
+    ON CONFLICT (player_id) DO UPDATE
+        SET total_hours = {TOTAL_TOP_TABLE}.total_hours + EXCLUDED.total_hours,
+            updated_at = EXCLUDED.updated_at
+    """,
+)
+
+
+# В модели сессий копятся секунды, а часы выводятся из них
+TOTAL_SET_SECONDS = statements.register(
+    "total_set_seconds",
+    f"""
+    INSERT INTO {TOTAL_TOP_TABLE} (player_id, total_seconds, total_hours, updated_at)
+    SELECT id, seconds, seconds / 3600, NOW()
+    FROM unnest($1::int[], $2::bigint[]) AS t(id, seconds)
+    ON CONFLICT (player_id) DO UPDATE
+        SET total_seconds = EXCLUDED.total_seconds,
+            total_hours = EXCLUDED.total_hours,
+            updated_at = EXCLUDED.updated_at
+        WHERE {TOTAL_TOP_TABLE}.total_seconds IS DISTINCT FROM EXCLUDED.total_seconds
+    """,
+)
+
+TOTAL_ADD_SECONDS = statements.register(
+    "total_add_seconds",
+    f"""
+    INSERT INTO {TOTAL_TOP_TABLE} (player_id, total_seconds, total_hours, updated_at)
+    SELECT id, seconds, seconds / 3600, NOW()
+    FROM unnest($1::int[], $2::bigint[]) AS t(id, seconds)
+    ON CONFLICT (player_id) DO UPDATE
+        SET total_seconds = {TOTAL_TOP_TABLE}.total_seconds + EXCLUDED.total_seconds,
+            total_hours = ({TOTAL_TOP_TABLE}.total_seconds + EXCLUDED.total_seconds)
+                / 3600,
+            updated_at = EXCLUDED.updated_at
+    """,
+)
+
+# Нижняя граница первого инкрементального прогона в модели сессий
+_SESSIONS_EPOCH = datetime(1970, 1, 1)
+
+
+async def _fetch_total_hours(db_pool: Pool) -> List[Tuple[int, int]]:
+    """Return ``(player_id, hours)`` for each player from the hourly rollup."""
     try:
-        rows = await db_pool.fetch(query)
+        rows = await statements.fetch(
+            db_pool,
+            TOTAL_HOURS_WINDOW,
+            ONLINE_MIN_SAMPLES_PER_HOUR,
+            cleanup_history_days,
+        )
     except Exception as e:
-        log_debug(f"[DB] Error fetching total hours: {e}")
+        logger.error("[DB] Error fetching total hours: %s", e)
         raise
 
-    return [(r["player_name"], int(r["hours"])) for r in rows]
+    return [(int(r["player_id"]), int(r["hours"])) for r in rows]
 
 
-async def update_total_time(
-    db_pool: Pool,
-    *,
-    history_table: str = "player_online_history",
-    total_table: str = "player_total_time",
-) -> None:
-    """Calculate total hours and update the total time table."""
-    rows = await _fetch_total_hours(db_pool, history_table=history_table)
+async def _fetch_total_seconds(db_pool: Pool) -> List[Tuple[int, int]]:
+    """Return ``(player_id, seconds)`` over the retention window from sessions."""
+    now = get_moscow_datetime()
+    start = now - timedelta(days=cleanup_history_days)
+    return await fetch_session_seconds(db_pool, start, now, now)
 
-    if not rows:
-        log_debug("[TOTAL] Нет данных для обновления")
+
+async def _upsert_window_totals(
+    db_pool: Pool, rows: List[Tuple[int, int]], *, statement: str = TOTAL_SET
+) -> str:
+    """Write window totals, touching only rows whose value actually changed."""
+    player_ids = [player_id for player_id, _ in rows]
+    values = [value for _, value in rows]
+    async with db_pool.acquire() as conn:
+        async with conn.transaction():
+            return await statements.execute(conn, statement, player_ids, values)
+
+
+async def rewind_total_time(conn: Any, since: datetime) -> None:
+    """Move the incremental watermark back to the hour of ``since``.
+
+    Called inside the transaction that writes late samples (e.g. replayed
+    from the spool) before they reach the rollup. Hours between ``since``
+    and the watermark are subtracted from the totals as counted so far, so
+    the next incremental run recounts them together with the late samples
+    instead of missing them. Does nothing unless ``TOTAL_TIME_MODE`` is
+    ``incremental`` and the watermark is past ``since``.
+    """
+    if config.total_time_mode != "incremental" or config.presence_model != "samples":
         return
+    hour = since.replace(minute=0, second=0, microsecond=0)
+    await conn.execute("SELECT pg_advisory_xact_lock($1)", TOTAL_TIME_LOCK_ID)
+    watermark = await get_state(conn, TOTAL_TIME_WATERMARK_KEY)
+    if watermark is None or datetime.fromisoformat(watermark) <= hour:
+        return
+    records = await statements.fetch(
+        conn,
+        TOTAL_HOURS_SINCE,
+        hour,
+        datetime.fromisoformat(watermark),
+        ONLINE_MIN_SAMPLES_PER_HOUR,
+    )
+    await statements.execute(
+        conn,
+        TOTAL_ADD,
+        [int(r["player_id"]) for r in records],
+        [-int(r["hours"]) for r in records],
+    )
+    await set_state(conn, TOTAL_TIME_WATERMARK_KEY, hour.isoformat())
+    logger.info("[TOTAL] Отметка откачена к %s из-за запоздавших срезов", hour)
 
-    try:
-        async with db_pool.acquire() as conn:
-            async with conn.transaction():
-                # UPSERT обновляет время, если игрок уже есть в таблице
-                await conn.executemany(
-                    f"""
-                    INSERT INTO {total_table} (player_name, total_hours, updated_at)
-                    VALUES ($1, $2, NOW())
-                    ON CONFLICT (player_name) DO UPDATE
-                        SET total_hours = EXCLUDED.total_hours,
-                            updated_at = EXCLUDED.updated_at
-                    """,
-                    rows,
+
+async def _update_total_time_incremental(db_pool: Pool) -> str:
+    """Add hours from buckets closed since the last run to lifetime totals.
+
+    The high-water mark (start of the first unprocessed hour) lives in
+    ``bot_state``. Only completed hours are processed, each exactly once, so
+    totals keep growing after old history is cleaned up; late samples for
+    processed hours move the mark back (see ``rewind_total_time``). The
+    first run replaces whatever the table held with the totals of the
+    retained rollup.
+    """
+    cutoff = get_moscow_datetime().replace(minute=0, second=0, microsecond=0)
+    async with db_pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", TOTAL_TIME_LOCK_ID)
+            watermark = await get_state(conn, TOTAL_TIME_WATERMARK_KEY)
+            processed_until = (
+                datetime.fromisoformat(watermark) if watermark is not None else None
+            )
+            if processed_until is not None and processed_until >= cutoff:
+                return "UP TO DATE"
+            if config.presence_model == "sessions":
+                rows = await fetch_session_seconds(
+                    conn, processed_until or _SESSIONS_EPOCH, cutoff, cutoff
                 )
-        log_debug(f"[TOTAL] Обновлено {len(rows)} записей")
-    except Exception as e:
-        log_debug(f"[DB] Error updating total time: {e}")
-        raise
+                statement = TOTAL_ADD_SECONDS
+            else:
+                records = await statements.fetch(
+                    conn,
+                    TOTAL_HOURS_SINCE,
+                    processed_until,
+                    cutoff,
+                    ONLINE_MIN_SAMPLES_PER_HOUR,
+                )
+                rows = [(int(r["player_id"]), int(r["hours"])) for r in records]
+                statement = TOTAL_ADD
+            if processed_until is None:
+                await conn.execute(f"DELETE FROM {TOTAL_TOP_TABLE}")
+            status = await statements.execute(
+                conn,
+                statement,
+                [player_id for player_id, _ in rows],
+                [value for _, value in rows],
+            )
+            await set_state(conn, TOTAL_TIME_WATERMARK_KEY, cutoff.isoformat())
+    return status
+
 
+async def refresh_total_time(db_pool: Pool, mode: str) -> Optional[str]:
+    """Postgres side of ``update_total_time``; ``None`` when there is no data.
 
-async def total_time_update_task(
-    bot,
-    *,
-    interval_seconds: int = 3600,
-    history_table: str = "player_online_history",
-    total_table: str = "player_total_time",
+    ``window`` recomputes hours over the retention window; ``incremental``
+    accumulates lifetime hours from a watermark. Switching modes drops the
+    watermark, so the next incremental run starts over from the rollup
+    instead of adding to totals the window mode has overwritten.
+    """
+    async with db_pool.acquire() as conn:
+        async with conn.transaction():
+            if await get_state(conn, TOTAL_TIME_MODE_KEY) != mode:
+                await delete_state(conn, TOTAL_TIME_WATERMARK_KEY)
+                await set_state(conn, TOTAL_TIME_MODE_KEY, mode)
+    if mode == "incremental":
+        return await _update_total_time_incremental(db_pool)
+    if config.presence_model == "sessions":
+        rows = await _fetch_total_seconds(db_pool)
+        if not rows:
+            return None
+        return await _upsert_window_totals(db_pool, rows, statement=TOTAL_SET_SECONDS)
+    rows = await _fetch_total_hours(db_pool)
+    if not rows:
+        return None
+    return await _upsert_window_totals(db_pool, rows)
+
+
+async def update_total_time(
+    storage: Storage, *, mode: str = config.total_time_mode
 ) -> None:
-    """Background task to periodically update player total time."""
-    log_debug("[TASK] Запущен total_time_update_task")
-    await bot.wait_until_ready()
-    while not bot.is_closed():
-        try:
-            await update_total_time(
-                bot.db_pool,
-                history_table=history_table,
-                total_table=total_table,
-            )
-            await asyncio.sleep(interval_seconds)
-        except asyncio.CancelledError:
-            log_debug("[TASK] total_time_update_task cancelled")
-            break
-        except Exception as e:
-            log_debug(f"[TASK] total_time_update_task error: {e}")
-            await asyncio.sleep(5)
+    """Calculate total hours and update the total time table."""
+    try:
+        status = await storage.update_total_time(mode)
+    except Exception as e:
+        logger.error("[DB] Error updating total time: %s", e)
+        raise
+    if status is None:
+        logger.debug("[TOTAL] Нет данных для обновления")
+        return
+    query_cache.invalidate(TOPIC_TOTAL)
+    logger.info("[TOTAL] Обновление (%s): %s", mode, status)
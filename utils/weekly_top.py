@@ -1,5 +1,6 @@
 """Логика для подсчёта недельного топа игроков."""
 
+import logging
 from datetime import datetime, timedelta
 from typing import List
 
@@ -9,8 +10,11 @@ from config.config import (
     WEEKLY_TOP_MAX,
     WEEKLY_TOP_WEEKDAY,
 )
+from storage.base import Storage
 from utils.helpers import get_moscow_datetime
-from utils.logger import log_debug
+from utils.query_cache import TOPIC_ONLINE, query_cache
+
+logger = logging.getLogger(__name__)
 
 
 def _get_week_bounds() -> tuple[datetime, datetime]:
@@ -30,31 +34,18 @@ def _get_week_bounds() -> tuple[datetime, datetime]:
     return start, end
 
 
-async def generate_weekly_top(db_pool) -> str:
+async def generate_weekly_top(storage: Storage) -> str:
     """Формирует текстовое сообщение с топом игроков за неделю."""
     start, end = _get_week_bounds()
-    log_debug(f"[TOP] Период с {start} по {end}")
+    logger.debug("[TOP] Период с %s по %s", start, end)
     try:
-        rows = await db_pool.fetch(
-            """
-            SELECT player_name, COUNT(*) AS hours
-            FROM (
-                SELECT player_name, date, hour
-                FROM player_online_history
-                WHERE check_time >= $1 AND check_time < $2
-                GROUP BY player_name, date, hour
-                HAVING COUNT(*) >= 3
-            ) AS t
-            GROUP BY player_name
-            ORDER BY hours DESC, player_name
-            LIMIT $3
-            """,
-            start,
-            end,
-            WEEKLY_TOP_MAX,
+        rows = await query_cache.get(
+            TOPIC_ONLINE,
+            ("top7week", start, end, WEEKLY_TOP_MAX),
+            lambda: storage.top_hours(start, end, WEEKLY_TOP_MAX),
         )
     except Exception as e:
-        log_debug(f"[DB] Error fetching weekly top: {e}")
+        logger.error("[DB] Error fetching weekly top: %s", e)
         raise
 
     if not rows:
@@ -62,7 +53,7 @@ async def generate_weekly_top(db_pool) -> str:
 
     limit = min(WEEKLY_TOP_LIMIT, len(rows))
     lines: List[str] = [f"\U0001f4ca ТОП {limit} игроков за неделю:"]
-    for idx, row in enumerate(rows[:limit], start=1):
-        lines.append(f"{idx}. {row['player_name']} — {row['hours']} ч")
+    for idx, (name, hours) in enumerate(rows[:limit], start=1):
+        lines.append(f"{idx}. {name} — {hours} ч")
 
     return "\n".join(lines)